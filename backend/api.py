@@ -1,27 +1,40 @@
 import os  # módulo de utilidades do sistema operacional
+import json  # serialização dos eventos transmitidos
 import uuid  # geração de identificadores únicos
 import logging  # gerenciamento de logs
 from datetime import datetime  # manipulação de datas e horas
+from typing import Literal  # valores aceitos em campos do corpo
 from fastapi import (
     FastAPI,
     HTTPException,
     Header,
     Depends,
+    Query,
     Response,
 )  # componentes principais do FastAPI
+from fastapi.responses import StreamingResponse  # stream de eventos (SSE)
 from pydantic import BaseModel  # base para modelos de dados
 from main import (  # funções de análise definidas no módulo principal
     executar_analise,  # inicia a análise principal
     consultar_software_alertas,  # consulta alertas de softwares
     cancelar_job,  # cancela um job específico
     cancelar_analise_atual,  # cancela a análise em execução
+    submeter_analise,  # enfileira um scan sem aguardar a fase de portas
+    eventos_do_job,  # progresso do scan em tempo real
     extrair_dominio,  # utilitário para extrair domínio
     salvar_relatorio_json,  # salva relatórios em disco
 )  # fim dos imports de main
 from modules.dehashed import (
+    fechar_cliente as fechar_cliente_dehashed,  # pool de conexões compartilhado
     verificar_vazamentos,
 )  # busca vazamentos em serviços externos
 from intelligence.scoring import calcular_score_leaks  # cálculo de score de vazamentos
+from intelligence.risk_mapper import PERFIL_TLS_PADRAO  # perfil TLS quando não informado
+from modules.cve_lookup import (
+    carregar_indice_cpe,  # mapeia o índice CPE compilado
+    garantir_indices_cve,  # índice do MongoDB usado nas consultas em lote
+    salvar_cache_banners,  # persiste o cache banner -> CPE
+)
 from modules.user_auth import (
     verify_user,
     create_user,
@@ -29,13 +42,17 @@ from modules.user_auth import (
     delete_user,
     set_admin_status,
 )
+from modules.cache import estatisticas_caches  # contadores dos caches do processo
+from modules.controle_naabu import CONTROLE_NAABU  # histórico das execuções do Naabu
+from modules.job_manager import GERENCIADOR_JOBS  # fila e estado dos scans
 from modules.temp_password import (
     create_temp_password,
     list_temp_passwords,
     use_temp_password,
 )  # gestão de senhas temporárias
 from database import AsyncSessionLocal  # sessão assíncrona com o banco
-from models import Report, Chamado  # modelos ORM utilizados
+from models import Report, Chamado, LeakedCredential  # modelos ORM utilizados
+from sqlalchemy import func, or_, tuple_  # contagem e paginação por chave
 from sqlalchemy.future import select  # utilitário de consultas assíncronas
 from sqlalchemy.exc import IntegrityError  # exceção de integridade do SQLAlchemy
 from fastapi.middleware.cors import CORSMiddleware  # middleware para habilitar CORS
@@ -93,6 +110,27 @@ async def ensure_initial_admin():
             await create_user(init_user, email, init_pass, True)
 
 
+@app.on_event("startup")
+async def preparar_busca_cves():
+    await carregar_indice_cpe()  # evita o custo no primeiro scan
+    await garantir_indices_cve()
+
+
+@app.on_event("shutdown")
+async def persistir_cache_banners():
+    salvar_cache_banners()  # próximo worker inicia com o cache aquecido
+
+
+@app.on_event("shutdown")
+async def concluir_historico_naabu():
+    await CONTROLE_NAABU.aguardar_gravacoes()  # execuções ainda não gravadas em naabu_runs
+
+
+@app.on_event("shutdown")
+async def encerrar_cliente_dehashed():
+    await fechar_cliente_dehashed()  # fecha o pool de conexões da API
+
+
 def require_token(authorization: str = Header(...)) -> dict:
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Token inválido")
@@ -121,6 +159,10 @@ app.add_middleware(  # registra middleware de CORS
 class AnaliseRequest(BaseModel):  # corpo da requisição para análise de portas
     alvo: str  # endereço ou domínio a ser analisado
     leak_analysis: bool = True  # se deve executar análise de vazamentos
+    tls_profile: Literal["quick", "standard", "deep"] = PERFIL_TLS_PADRAO  # profundidade da varredura TLS
+    incremental: bool = False  # reaproveita hosts inalterados desde o último relatório
+    refresh_dns: bool = False  # ignora o cache de subdomínios e registros A
+    refresh_leaks: bool = False  # busca vazamentos novos em vez de usar o cache
 
 
 class LoginRequest(BaseModel):
@@ -145,12 +187,84 @@ class TempPassRequest(BaseModel):  # geração de senha temporária
 @app.post("/api/port-analysis")
 async def iniciar(req: AnaliseRequest, user: dict = Depends(require_token)):
     return await executar_analise(
-        req.alvo, req.leak_analysis, user["username"]
+        req.alvo,
+        req.leak_analysis,
+        user["username"],
+        req.tls_profile,
+        req.incremental,
+        req.refresh_dns,
+        req.refresh_leaks,
     )  # delega para o módulo principal
 
 
+@app.post("/api/jobs")
+async def submeter(req: AnaliseRequest, user: dict = Depends(require_token)):
+    job = submeter_analise(
+        req.alvo,
+        req.leak_analysis,
+        user["username"],
+        req.tls_profile,
+        req.incremental,
+        req.refresh_dns,
+        req.refresh_leaks,
+    )
+    if job is None:
+        raise HTTPException(status_code=400, detail="Entrada inválida")
+    return await GERENCIADOR_JOBS.estado(job.id)  # inclui posição na fila
+
+
+async def estado_do_usuario(job_id: str, user: dict) -> dict:
+    """Estado do job se ele pertence a ``user`` (ou ``user`` é admin); 404 caso
+    contrário, sem revelar que o job existe."""
+    estado = await GERENCIADOR_JOBS.estado(job_id)
+    if estado is None or (estado["usuario"] != user["username"] and not user.get("is_admin")):
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return estado
+
+
+@app.get("/api/jobs/fila")
+async def profundidade_fila(user: dict = Depends(require_token)):
+    profundidade = GERENCIADOR_JOBS.profundidade()  # jobs na fila e em execução
+    por_usuario = profundidade.pop("por_usuario")
+    if user.get("is_admin"):
+        profundidade["por_usuario"] = por_usuario
+    else:  # demais usuários veem só os totais e a própria fila
+        profundidade["meus_na_fila"] = por_usuario.get(user["username"], 0)
+    return profundidade
+
+
+@app.get("/api/jobs/{job_id}")
+async def estado_job(job_id: str, user: dict = Depends(require_token)):
+    return await estado_do_usuario(job_id, user)
+
+
+@app.get("/api/jobs/{job_id}/eventos")
+async def eventos_job(
+    job_id: str,
+    last_event_id: int = Header(0),  # reconexão: retoma após o último evento recebido
+    user: dict = Depends(require_token),
+):
+    await estado_do_usuario(job_id, user)
+
+    async def transmitir():  # formato text/event-stream
+        async for evento in eventos_do_job(job_id, last_event_id):
+            if evento is None:
+                yield ": keep-alive\n\n"
+                continue
+            seq, tipo, dados = evento
+            corpo = json.dumps(dados, ensure_ascii=False, default=str)
+            yield f"id: {seq}\nevent: {tipo}\ndata: {corpo}\n\n"
+
+    return StreamingResponse(
+        transmitir(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/api/software-analysis/{job_id}")
-async def resultado(job_id: str):
+async def resultado(job_id: str, user: dict = Depends(require_token)):
+    await estado_do_usuario(job_id, user)  # mesmo controle de /api/jobs/{job_id}
     return await consultar_software_alertas(job_id)  # retorna os alertas processados
 
 
@@ -169,7 +283,7 @@ async def leak(req: AnaliseRequest, user: dict = Depends(require_token)):
             status_code=400, detail="Entrada inválida"
         )  # domínio ausente
     try:  # protege consulta externa
-        resultado = await verificar_vazamentos(dominio)  # consulta serviço DeHashed
+        resultado = await verificar_vazamentos(dominio, req.refresh_leaks)  # DeHashed ou cache
         leak_score = calcular_score_leaks(  # calcula score geral
             resultado.get("num_emails", 0),  # e-mails vazados
             resultado.get("num_passwords", 0),  # senhas vazadas
@@ -188,8 +302,9 @@ async def leak(req: AnaliseRequest, user: dict = Depends(require_token)):
 
 
 @app.post("/api/cancel/{job_id}")  # cancela um job específico
-async def cancelar(job_id: str):  # endpoint para cancelar job
-    if cancelar_job(job_id):  # tenta cancelar
+async def cancelar(job_id: str, user: dict = Depends(require_token)):  # endpoint para cancelar job
+    await estado_do_usuario(job_id, user)  # só o dono ou um admin cancela
+    if await cancelar_job(job_id):  # tenta cancelar
         return {"status": "cancelado"}  # operação bem-sucedida
     raise HTTPException(status_code=404, detail="Job não encontrado")  # job inexistente
 
@@ -225,43 +340,113 @@ async def obter_relatorio(alvo: str):  # carrega relatório do banco
             "num_emails": r.num_emails,  # e-mails vazados
             "num_passwords": r.num_passwords,  # senhas vazadas
             "num_hashes": r.num_hashes,  # hashes vazados
-            "leaked_data": r.leaked_data,  # dados sensíveis
             "final_score": r.final_score,  # score final do alvo
+            "subdominios_em": r.subdominios_em.isoformat() if r.subdominios_em else None,  # idade do cache de subdomínios
+            "resolucao_em": r.resolucao_em.isoformat() if r.resolucao_em else None,  # idade do cache DNS
+            "vazamentos_em": r.vazamentos_em.isoformat() if r.vazamentos_em else None,  # idade do cache de vazamentos
         }  # fim do dicionário de retorno
 
 
+@app.get("/api/cache/stats")
+async def estatisticas_cache(_: dict = Depends(require_admin)):
+    return estatisticas_caches()  # acertos/erros para dimensionar os caches
+
+
 @app.post("/api/cancel-current")  # cancela a análise em execução
-async def cancelar_atual():  # encerra análise em andamento
-    if cancelar_analise_atual():  # se havia análise, foi cancelada
+async def cancelar_atual(user: dict = Depends(require_token)):  # encerra análises do usuário
+    if await cancelar_analise_atual(user["username"]):  # se havia análise, foi cancelada
         return {"status": "cancelado"}  # confirmação
     return {"status": "nenhum"}  # nenhuma análise em andamento
 
 
+COLUNAS_LISTAGEM = (  # apenas o que a listagem exibe; detalhes em /api/reports/{dominio}
+    Report.id,
+    Report.dominio,
+    Report.timestamp,
+    Report.usuario,
+    Report.num_subdominios,
+    Report.num_ips,
+    Report.port_score,
+    Report.software_score,
+    Report.leak_score,
+    Report.num_emails,
+    Report.num_passwords,
+    Report.num_hashes,
+    Report.final_score,
+)
+
+
+def _ler_cursor(cursor: str) -> tuple[datetime | None, int]:
+    """``proximo`` de uma página anterior: ``<timestamp ISO>|<id>``."""
+    try:
+        ts, report_id = cursor.rsplit("|", 1)
+        return (datetime.fromisoformat(ts) if ts else None), int(report_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
 @app.get("/api/reports")
-async def listar_relatorios(_: dict = Depends(require_admin)):
+async def listar_relatorios(
+    cursor: str | None = None,  # ``proximo`` da página anterior
+    limite: int = Query(50, ge=1, le=500),
+    usuario: str | None = None,
+    score_min: float | None = None,  # faixa de final_score (0 a 1)
+    score_max: float | None = None,
+    desde: datetime | None = None,  # faixa de timestamp do relatório
+    ate: datetime | None = None,
+    _: dict = Depends(require_admin),
+):
+    """Relatórios do mais recente ao mais antigo, paginados por
+    ``(timestamp, id)``."""
+    consulta = select(*COLUNAS_LISTAGEM)
+    if usuario:
+        consulta = consulta.where(Report.usuario == usuario)
+    if score_min is not None:
+        consulta = consulta.where(Report.final_score >= score_min)
+    if score_max is not None:
+        consulta = consulta.where(Report.final_score <= score_max)
+    if desde:
+        consulta = consulta.where(Report.timestamp >= desde)
+    if ate:
+        consulta = consulta.where(Report.timestamp <= ate)
+    if cursor:
+        ts, report_id = _ler_cursor(cursor)
+        if ts is None:  # relatórios sem data vêm por último
+            consulta = consulta.where(Report.timestamp.is_(None), Report.id < report_id)
+        else:
+            consulta = consulta.where(
+                or_(
+                    tuple_(Report.timestamp, Report.id) < (ts, report_id),
+                    Report.timestamp.is_(None),
+                )
+            )
+    consulta = consulta.order_by(
+        Report.timestamp.desc().nulls_last(), Report.id.desc()
+    ).limit(limite)
     async with AsyncSessionLocal() as session:  # inicia sessão no banco
-        result = await session.execute(select(Report))  # busca todos
-        reports = result.scalars().all()  # converte resultado
-        retorno = {}  # dicionário a ser retornado
-        for r in reports:  # monta dicionário por domínio
-            retorno[r.dominio] = {  # adiciona item por domínio
-                "dominio": r.dominio,  # chave do domínio
-                "timestamp": r.timestamp.isoformat(),  # data da coleta
-                "num_subdominios": r.num_subdominios,  # total de subdomínios
-                "num_ips": r.num_ips,  # quantidade de IPs
-                "port_alertas": r.port_alertas,  # alertas em portas
-                "software_alertas": r.software_alertas,  # alertas de softwares
-                "port_score": r.port_score,  # score de portas
-                "software_score": r.software_score,  # score de softwares
-                "leak_score": r.leak_score,  # score de vazamentos
-                "num_emails": r.num_emails,  # e-mails vazados
-                "num_passwords": r.num_passwords,  # senhas vazadas
-                "num_hashes": r.num_hashes,  # hashes vazados
-                "leaked_data": r.leaked_data,  # dados encontrados
-                "final_score": r.final_score,  # nota final
-                "usuario": r.usuario,
-            }  # fim de cada relatório
-        return retorno  # envia todos os relatórios
+        rows = (await session.execute(consulta)).all()
+    itens = [
+        {
+            "dominio": r.dominio,  # chave do domínio
+            "timestamp": r.timestamp.isoformat() if r.timestamp else None,  # data da coleta
+            "usuario": r.usuario,
+            "num_subdominios": r.num_subdominios,  # total de subdomínios
+            "num_ips": r.num_ips,  # quantidade de IPs
+            "port_score": r.port_score,  # score de portas
+            "software_score": r.software_score,  # score de softwares
+            "leak_score": r.leak_score,  # score de vazamentos
+            "num_emails": r.num_emails,  # e-mails vazados
+            "num_passwords": r.num_passwords,  # senhas vazadas
+            "num_hashes": r.num_hashes,  # hashes vazados
+            "final_score": r.final_score,  # nota final
+        }
+        for r in rows
+    ]
+    proximo = None
+    if len(rows) == limite:
+        ultimo = rows[-1]
+        proximo = f"{ultimo.timestamp.isoformat() if ultimo.timestamp else ''}|{ultimo.id}"
+    return {"itens": itens, "proximo": proximo}
 
 
 @app.get("/api/reports/summary")
@@ -304,12 +489,52 @@ async def obter_relatorio(dominio: str, _: dict = Depends(require_admin)):
             "num_emails": r.num_emails,  # total de e-mails vazados
             "num_passwords": r.num_passwords,  # total de senhas vazadas
             "num_hashes": r.num_hashes,  # total de hashes vazados
-            "leaked_data": r.leaked_data,  # dados associados
             "final_score": r.final_score,  # avaliação final
             "usuario": r.usuario,
+            "subdominios_em": r.subdominios_em.isoformat() if r.subdominios_em else None,
+            "resolucao_em": r.resolucao_em.isoformat() if r.resolucao_em else None,
+            "vazamentos_em": r.vazamentos_em.isoformat() if r.vazamentos_em else None,
         }  # fim do retorno detalhado
 
 
+@app.get("/api/reports/{dominio}/leaks")
+async def listar_credenciais(
+    dominio: str,
+    apos: int = 0,  # id da última credencial recebida (paginação por chave)
+    limite: int = Query(100, ge=1, le=1000),
+    _: dict = Depends(require_admin),
+):
+    """Credenciais vazadas do relatório, em páginas ordenadas por id."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Report.id).where(Report.dominio == dominio))
+        report_id = result.scalar()
+        if report_id is None:
+            raise HTTPException(status_code=404, detail="Relatório não encontrado")
+        total = await session.scalar(
+            select(func.count()).where(LeakedCredential.report_id == report_id)
+        )
+        result = await session.execute(
+            select(
+                LeakedCredential.id,
+                LeakedCredential.email,
+                LeakedCredential.password,
+                LeakedCredential.hash,
+            )
+            .where(LeakedCredential.report_id == report_id, LeakedCredential.id > apos)
+            .order_by(LeakedCredential.id)
+            .limit(limite)
+        )
+        rows = result.all()
+    return {
+        "total": total,  # credenciais do relatório
+        "itens": [
+            {"email": email, "password": senha, "hash": hash_}
+            for _, email, senha, hash_ in rows
+        ],
+        "proximo": rows[-1].id if len(rows) == limite else None,  # valor de ``apos`` da próxima página
+    }
+
+
 @app.get("/api/reports/{dominio}/pdf")
 async def exportar_relatorio_pdf(dominio: str, _: dict = Depends(require_admin)):
     """Gera um PDF melhor formatado com os dados do relatório"""
@@ -391,28 +616,26 @@ async def exportar_relatorio_pdf(dominio: str, _: dict = Depends(require_admin))
         pdf.set_font("DejaVu", "B", size=12)
         pdf.cell(0, 10, "Dados Vazados:", ln=True)
         pdf.set_font("DejaVu", "", size=9)
-        if r.leaked_data:
-            pdf.set_fill_color(230, 230, 230)
-            pdf.cell(60, 8, "Email", border=1, fill=True)
-            pdf.cell(50, 8, "Senha texto", border=1, fill=True)
-            pdf.cell(75, 8, "Senha hash", border=1, ln=True, fill=True)
-
-            for row in r.leaked_data:
-                if isinstance(row, dict):
-                    email_val = row.get("email", "")
-                    pass_val = row.get("password", "")
-                    hash_val = row.get("hash", "")
-                elif isinstance(row, (list, tuple)):
-                    email_val, pass_val, hash_val = (list(row) + ["", "", ""])[:3]
-                else:
-                    email_val = pass_val = hash_val = str(row)
-
-                pdf.cell(60, 7, wrap_pdf_text(limpar_emojis(email_val), 25), border=1)
-                pdf.cell(50, 7, wrap_pdf_text(limpar_emojis(pass_val), 20), border=1)
-                pdf.cell(
-                    75, 7, wrap_pdf_text(limpar_emojis(hash_val), 30), border=1, ln=True
-                )
-        else:
+        credenciais = await session.stream(
+            select(LeakedCredential.email, LeakedCredential.password, LeakedCredential.hash)
+            .where(LeakedCredential.report_id == r.id)
+            .order_by(LeakedCredential.id)
+        )  # lidas aos poucos, sem carregar tudo de uma vez
+        vazio = True
+        async for email_val, pass_val, hash_val in credenciais:
+            if vazio:
+                vazio = False
+                pdf.set_fill_color(230, 230, 230)
+                pdf.cell(60, 8, "Email", border=1, fill=True)
+                pdf.cell(50, 8, "Senha texto", border=1, fill=True)
+                pdf.cell(75, 8, "Senha hash", border=1, ln=True, fill=True)
+
+            pdf.cell(60, 7, wrap_pdf_text(limpar_emojis(email_val), 25), border=1)
+            pdf.cell(50, 7, wrap_pdf_text(limpar_emojis(pass_val), 20), border=1)
+            pdf.cell(
+                75, 7, wrap_pdf_text(limpar_emojis(hash_val), 30), border=1, ln=True
+            )
+        if vazio:
             pdf.cell(0, 8, "Nenhum dado vazado.", ln=True)
 
         # Output
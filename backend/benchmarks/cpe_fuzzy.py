@@ -0,0 +1,88 @@
+# Benchmark da busca aproximada de CPE. Compara a varredura linear usada
+# antes do índice de trigramas com ``IndiceCPE.busca_aproximada``, falhando
+# se algum resultado divergir.
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.cpe_fuzzy [indice] [quantidade]
+
+import random  # amostragem de consultas
+import statistics  # média e percentis
+import sys  # argumentos da linha de comando
+import time  # medição de tempo
+
+from modules.cpe_index import CPE_INDEX_PATH, IndiceCPE
+
+VARIACOES = ["", "01", ".1", "p1", "-beta"]  # sufixos que forçam o fallback
+
+
+def busca_linear(entradas, tokens):
+    """Comportamento anterior de ``_find_cpe``: varredura de todas as entradas."""
+    for lower, full in entradas:
+        if all(t in lower for t in tokens):
+            return full
+    return None
+
+
+def gerar_consultas(indice: IndiceCPE, quantidade: int) -> list[list[str]]:
+    """Monta consultas no formato de ``_find_cpe`` a partir do próprio dicionário."""
+    rnd = random.Random(42)
+    consultas = []
+    while len(consultas) < quantidade:
+        parts = indice.nome(rnd.randrange(indice.total)).lower().split(":")
+        if len(parts) < 6:
+            continue
+        fabricante, produto, versao = parts[3:6]
+        versao = versao + rnd.choice(VARIACOES)
+        if rnd.random() < 0.5:
+            nomes = [fabricante, produto]
+        else:
+            nomes = [produto[: max(1, len(produto) // 2)]]  # nome parcial do banner
+        if rnd.random() < 0.1:
+            nomes = [f"naoexiste{len(consultas)}"]  # banner sem correspondência
+        consultas.append(nomes + [versao])
+    return consultas
+
+
+def medir(func, consultas):
+    tempos, resultados = [], []
+    for tokens in consultas:
+        inicio = time.perf_counter()
+        resultados.append(func(tokens))
+        tempos.append(time.perf_counter() - inicio)
+    return resultados, tempos
+
+
+def resumo(nome, tempos):
+    ordenados = sorted(tempos)
+    p95 = ordenados[int(len(ordenados) * 0.95) - 1]
+    print(
+        f"{nome:>10}: média {statistics.mean(tempos) * 1000:.3f} ms | "
+        f"p95 {p95 * 1000:.3f} ms | total {sum(tempos):.2f} s"
+    )
+
+
+def main():
+    caminho = sys.argv[1] if len(sys.argv) > 1 else CPE_INDEX_PATH
+    quantidade = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    indice = IndiceCPE(caminho)
+    consultas = gerar_consultas(indice, quantidade)
+
+    entradas = list(indice.entradas)  # lista em memória, como o antigo _cpe_entries
+    linear, t_linear = medir(lambda t: busca_linear(entradas, t), consultas)
+    trigramas, t_trigramas = medir(indice.busca_aproximada, consultas)
+
+    divergencias = [
+        (c, a, b) for c, a, b in zip(consultas, linear, trigramas) if a != b
+    ]
+    print(f"{indice.total} entradas, {len(consultas)} consultas")
+    resumo("linear", t_linear)
+    resumo("trigramas", t_trigramas)
+    if divergencias:
+        for consulta, esperado, obtido in divergencias[:10]:
+            print(f"[DIVERGÊNCIA] {consulta}: linear={esperado} trigramas={obtido}")
+        sys.exit(1)
+    print("[OK] Resultados idênticos à varredura linear")
+
+
+if __name__ == "__main__":
+    main()
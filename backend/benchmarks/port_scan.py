@@ -0,0 +1,110 @@
+# Benchmark dos motores de varredura de portas. Varre os mesmos alvos com o
+# Naabu (SYN scan, parâmetros fixos) e com ``escanear_connect``, mede IPs/s e
+# portas testadas/s e aponta divergências nas portas abertas encontradas.
+# Use uma rede de teste local (ex.: uma rede Docker ou VMs de laboratório):
+# alvos externos medem a internet, não o motor.
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.port_scan <alvos> [rodadas] [rate]
+#   alvos: CIDR (192.168.56.0/28) ou IPs separados por vírgula
+
+import asyncio  # execução dos dois motores
+import ipaddress  # expansão de CIDR
+import statistics  # média das rodadas
+import subprocess  # falhas do Naabu
+import sys  # argumentos da linha de comando
+import time  # medição de tempo
+
+from modules.connect_scan import escanear_connect
+from modules.naabu import NAABU_ARGS, PORTAS_PADRAO
+from modules.processo import stream_linhas
+from parsers.parse_naabu import parse_naabu
+
+
+def expandir_alvos(arg: str) -> list[str]:
+    if "/" in arg:
+        rede = ipaddress.ip_network(arg, strict=False)
+        return [str(ip) for ip in (rede.hosts() if rede.num_addresses > 1 else [rede.network_address])]
+    return [ip.strip() for ip in arg.split(",") if ip.strip()]
+
+
+async def naabu(ips, ports, rate):
+    """Naabu com parâmetros fixos, sem o controle adaptativo, para comparar
+    rodadas entre si."""
+    resultados = {}
+    try:
+        async for linha in stream_linhas(
+            [
+                "sudo", "naabu", "-silent", "-json", "-p", ",".join(ports), *NAABU_ARGS,
+                "-rate", str(rate), "-retries", "2", "-timeout", "2000",
+            ],
+            entrada=ips,
+        ):
+            par = parse_naabu(linha)
+            if par:
+                resultados.setdefault(par[0], set()).add(par[1])
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"[ERRO] Naabu indisponível: {e}")
+        return None
+    return resultados
+
+
+async def connect(ips, ports, rate):
+    abertas, _ = await escanear_connect(ips, ports)
+    return {ip: set(p) for ip, p in abertas.items()}
+
+
+async def medir(func, ips, ports, rate, rodadas):
+    tempos, resultado = [], None
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        resultado = await func(ips, ports, rate)
+        if resultado is None:
+            return None, []
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, tempos
+
+
+def resumo(nome, tempos, ips, ports):
+    media = statistics.mean(tempos)
+    print(
+        f"{nome:>8}: média {media:.2f} s | {len(ips) / media:.1f} IPs/s | "
+        f"{len(ips) * len(ports) / media:.0f} portas/s"
+    )
+
+
+async def executar(ips, rodadas, rate):
+    ports = PORTAS_PADRAO
+    print(f"{len(ips)} IPs x {len(ports)} portas, {rodadas} rodadas")
+    abertas_naabu, t_naabu = await medir(naabu, ips, ports, rate, rodadas)
+    abertas_connect, t_connect = await medir(connect, ips, ports, rate, rodadas)
+    if t_naabu:
+        resumo("naabu", t_naabu, ips, ports)
+    resumo("connect", t_connect, ips, ports)
+    if abertas_naabu is None:
+        return True
+    divergencias = [
+        (ip, sorted(abertas_naabu.get(ip, set())), sorted(abertas_connect.get(ip, set())))
+        for ip in ips
+        if abertas_naabu.get(ip, set()) != abertas_connect.get(ip, set())
+    ]
+    for ip, esperado, obtido in divergencias[:10]:
+        print(f"[DIVERGÊNCIA] {ip}: naabu={esperado} connect={obtido}")
+    if not divergencias:
+        print("[OK] Mesmas portas abertas nos dois motores")
+    return not divergencias
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("uso: python -m benchmarks.port_scan <alvos> [rodadas] [rate]")
+        sys.exit(2)
+    ips = expandir_alvos(sys.argv[1])
+    rodadas = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    rate = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    if not asyncio.run(executar(ips, rodadas, rate)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,52 @@ AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=F
 
 Base = declarative_base()
 
+INIT_DB_LOCK = 0x54444231  # chave do pg_advisory_xact_lock que serializa init_db entre processos
+
 
 async def init_db() -> None:
     async with engine.begin() as conn:
+        # Réplicas iniciando juntas esperam umas pelas outras até o commit:
+        # a migração abaixo não pode ler o mesmo leaked_data em duas transações
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": INIT_DB_LOCK})
         await conn.run_sync(Base.metadata.create_all)
         await conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS timestamp TIMESTAMP"))
         await conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS usuario VARCHAR"))
+        await conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS snapshot JSONB"))
+        await conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS subdominios_em TIMESTAMP"))
+        await conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS resolucao_em TIMESTAMP"))
+        await conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS vazamentos_em TIMESTAMP"))
+        # Credenciais guardadas no JSONB leaked_data passam para leaked_credentials
+        # (migração única: depois dela não resta leaked_data e o passo é pulado)
+        pendente = await conn.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM reports WHERE leaked_data IS NOT NULL)"
+        ))
+        if pendente:
+            await conn.execute(text(
+                """
+                INSERT INTO leaked_credentials (report_id, email, password, hash)
+                SELECT r.id,
+                       COALESCE(e->>'email', e->>0, ''),
+                       COALESCE(e->>'password', e->>1, ''),
+                       COALESCE(e->>'hash', e->>2, '')
+                FROM reports r, jsonb_array_elements(r.leaked_data) e
+                WHERE jsonb_typeof(r.leaked_data) = 'array'
+                """
+            ))
+            await conn.execute(text("UPDATE reports SET leaked_data = NULL WHERE leaked_data IS NOT NULL"))
+        # Snapshots de vazamentos antigos guardavam a lista de credenciais no cache
+        await conn.execute(text(
+            "DELETE FROM cache_entries WHERE namespace = 'vazamentos' AND valor ? 'leaked_data'"
+        ))
+        # Paginação de /api/reports por (timestamp, id), com e sem filtro de usuário
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_timestamp_id "
+            "ON reports (timestamp DESC NULLS LAST, id DESC)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_usuario_timestamp_id "
+            "ON reports (usuario, timestamp DESC NULLS LAST, id DESC)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_final_score ON reports (final_score)"
+        ))
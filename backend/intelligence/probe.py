@@ -0,0 +1,136 @@
+"""Sonda de serviços com uma única conexão por (ip, porta).
+
+Cada porta é contactada uma vez e os bytes capturados (banner, linha de
+status HTTP, cabeçalhos, destino de redirecionamento e, na 443, a impressão
+digital TLS) alimentam todas as verificações de ``risk_mapper`` que precisam
+deles, em vez de cada verificação abrir seu próprio socket.
+"""
+
+import asyncio  # conexões assíncronas
+import os  # parâmetros via variáveis de ambiente
+import re  # normalização do banner para a assinatura
+
+from intelligence.tls_scanner import CTX_HANDSHAKE, impressao_sessao  # handshake permissivo
+
+PROBE_CONNECT_TIMEOUT = float(os.getenv("PROBE_CONNECT_TIMEOUT", "10"))  # segundos
+PROBE_READ_TIMEOUT = float(os.getenv("PROBE_READ_TIMEOUT", "5"))  # segundos
+PROBE_MAX_BYTES = 16384  # limite lido da resposta HTTP (status + cabeçalhos)
+
+PORTAS_HTTP = {80: False, 443: True}  # porta -> usa TLS
+
+_MESES_DIAS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|mon|tue|wed|thu|fri|sat|sun)"
+VOLATEIS_RE = re.compile(  # trechos do banner que mudam a cada conexão
+    r"\b\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?\b"  # horários
+    r"|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b"  # datas numéricas
+    rf"|\b\d{{1,2}}\s+{_MESES_DIAS}\b|\b{_MESES_DIAS}\b"  # datas por extenso (RFC 2822)
+    r"|(?<![\w.])[+-]?\d{4,}(?![\w.])"  # anos, fusos, PIDs e contadores
+    r"|\b[0-9a-f]{8,}\b",  # ids de sessão em hexadecimal
+    re.IGNORECASE,
+)
+BINARIO_RE = re.compile(r"\d+\.\d+[\w.\-]*|[a-z]+(?:_[a-z]+)+")  # versão e plugins em banners binários
+
+
+def normalizar_banner(banner: str) -> str:
+    """Banner sem datas, horários, contadores e ids de sessão, preservando
+    versões (``OpenSSH_8.2p1``, ``3.0.3``) e códigos de resposta (``220``).
+    Em protocolos binários (ex.: handshake do MySQL, com salt aleatório)
+    restam só as versões e nomes de plugin."""
+    if "\x00" in banner:
+        return " ".join(BINARIO_RE.findall(banner))
+    return " ".join(VOLATEIS_RE.sub(" ", banner).split())
+
+
+class Captura:
+    """Bytes e metadados obtidos na conexão com um serviço."""
+
+    __slots__ = ("ip", "porta", "conectou", "banner", "status", "cabecalhos", "impressao_tls")
+
+    def __init__(self, ip: str, porta: int):
+        self.ip = ip
+        self.porta = porta
+        self.conectou = False  # conexão TCP (e TLS, na 443) estabelecida
+        self.banner = ""  # primeiros bytes enviados pelo serviço
+        self.status: int | None = None  # código da resposta HTTP
+        self.cabecalhos: dict[str, str] = {}  # nomes em minúsculas
+        self.impressao_tls: str | None = None  # sha256:versão:cifra
+
+    @property
+    def servidor(self) -> str | None:
+        return self.cabecalhos.get("server", "").strip() or None
+
+    @property
+    def location(self) -> str | None:
+        return self.cabecalhos.get("location")
+
+    @property
+    def assinatura(self) -> str:
+        """Resumo do que as verificações usam; muda quando o serviço muda,
+        mas não com a data ou a sessão presentes no banner."""
+        hsts = "hsts" if "strict-transport-security" in self.cabecalhos else ""
+        return "|".join(
+            (normalizar_banner(self.banner), self.servidor or "", self.impressao_tls or "", str(self.status or ""), hsts)
+        )
+
+
+def _interpretar_http(captura: Captura, dados: bytes) -> None:
+    """Preenche status e cabeçalhos a partir do início da resposta."""
+    cabecalho = dados.split(b"\r\n\r\n", 1)[0].decode("iso-8859-1")
+    linhas = cabecalho.split("\r\n")
+    captura.banner = linhas[0]
+    partes = linhas[0].split(" ", 2)
+    if len(partes) >= 2 and partes[0].startswith("HTTP/") and partes[1].isdigit():
+        captura.status = int(partes[1])
+    for linha in linhas[1:]:
+        nome, sep, valor = linha.partition(":")
+        if sep:
+            captura.cabecalhos[nome.strip().lower()] = valor.strip()
+
+
+async def _ler_cabecalhos(reader: asyncio.StreamReader) -> bytes:
+    """Lê até o fim dos cabeçalhos HTTP, EOF ou ``PROBE_MAX_BYTES``."""
+    dados = b""
+    while b"\r\n\r\n" not in dados and len(dados) < PROBE_MAX_BYTES:
+        bloco = await asyncio.wait_for(reader.read(4096), timeout=PROBE_READ_TIMEOUT)
+        if not bloco:
+            break
+        dados += bloco
+    return dados
+
+
+async def sondar(ip: str, porta: int) -> Captura:
+    """Abre uma conexão com ``ip:porta`` e captura o que o serviço revela.
+
+    Nas portas HTTP envia um ``GET /`` mínimo (sem seguir redirecionamentos);
+    nas demais apenas aguarda o banner. Falhas resultam em uma captura vazia.
+    """
+    captura = Captura(ip, porta)
+    usa_tls = PORTAS_HTTP.get(porta)
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, porta, ssl=CTX_HANDSHAKE if usa_tls else None),
+            timeout=PROBE_CONNECT_TIMEOUT,
+        )
+    except Exception:
+        return captura
+    captura.conectou = True
+    try:
+        if usa_tls:
+            captura.impressao_tls = impressao_sessao(writer.get_extra_info("ssl_object"))
+        if usa_tls is None:  # serviço fala primeiro (SSH, FTP, SMTP...)
+            dados = await asyncio.wait_for(reader.read(1024), timeout=PROBE_READ_TIMEOUT)
+            captura.banner = dados.decode(errors="ignore").strip()
+        else:
+            writer.write(
+                b"GET / HTTP/1.1\r\nHost: %b\r\nConnection: close\r\n\r\n" % ip.encode()
+            )
+            await writer.drain()
+            _interpretar_http(captura, await _ler_cabecalhos(reader))
+    except Exception:
+        pass  # mantém o que foi capturado até o erro
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+    return captura
@@ -10,41 +10,41 @@ import asyncio  # biblioteca de suporte a operações assíncronas
 import os  # acesso a variáveis de ambiente e funções do sistema
 import re  # expressões regulares utilizadas na análise de banners
 import time  # mensuração de tempo de execução das funções
-import httpx  # cliente HTTP assíncrono utilizado nas requisições
 from datetime import datetime  # datas para verificação de certificados
+from contextvars import ContextVar  # softwares detectados por chamada
 from typing import List
 from modules.cve_lookup import buscar_cves_para_softwares  # busca CVEs para softwares detectados
-from puresnmp import Client, credentials, ObjectIdentifier  # biblioteca para consultas SNMP
-from puresnmp.api.pythonic import PyWrapper  # interface Pythonic para o puresnmp
-from puresnmp.exc import ErrorResponse  # exceção tratada em consultas SNMP
-from sslyze.server_setting import ServerNetworkLocation
-from sslyze.scanner.scanner import Scanner, ServerScanRequest
+from modules.job_manager import reservar  # orçamento do job somado aos limites globais
+from modules.snmp import comunidade_aceita  # GET SNMP v2c em socket UDP compartilhado
+from intelligence.tls_scanner import MOTOR_TLS, impressao_tls  # varredura TLS em lote compartilhada
+from intelligence.probe import Captura, sondar  # uma conexão por (ip, porta)
+from modules.eventos import publicar  # progresso do scan para quem acompanha o job
+from modules.cache import (  # alertas TLS por impressão digital do certificado
+    CACHE_BACKEND,
+    TTLCache,
+    gravar_compartilhado,
+    ler_compartilhado,
+)
 from sslyze.plugins.scan_commands import ScanCommand
 from sslyze.scanner.models import ServerScanStatusEnum
 from sslyze.plugins.robot.implementation import RobotScanResultEnum
 from sslyze.plugins.session_resumption.implementation import TlsResumptionSupportEnum
 
 
-HTTP_CLIENT: httpx.AsyncClient | None = None  # cliente HTTP reutilizado entre as chamadas
 CONNECTION_SEM = asyncio.Semaphore(int(os.getenv("CONNECTION_LIMIT", "50")))  # limita o número de conexões simultâneas
 IP_SEM = asyncio.Semaphore(int(os.getenv("IP_LIMIT", "20")))  # controla quantos IPs são avaliados ao mesmo tempo
+TLS_ADIADO_SEM = asyncio.Semaphore(int(os.getenv("TLS_DEFERRED_LIMIT", "4")))  # IPs na fase TLS adiada, separado de IP_SEM
 
 TLS_SCAN_TIMEOUT = int(os.getenv("TLS_SCAN_TIMEOUT", "20"))  # segundos
-
-def get_http_client() -> httpx.AsyncClient:  # obtém o cliente HTTP global
-    """Retorna o cliente HTTP, recriando se estiver fechado."""
-    global HTTP_CLIENT  # indica que usaremos a variável global
-    if HTTP_CLIENT is None or HTTP_CLIENT.is_closed:  # cria um novo cliente se necessário
-        HTTP_CLIENT = httpx.AsyncClient(timeout=10)  # timeout padrão de 10s
-    return HTTP_CLIENT  # retorna a instância para uso
-
-
-async def close_http_client() -> None:  # encerra o cliente HTTP global
-    """Fecha o cliente HTTP global e libera o objeto."""
-    global HTTP_CLIENT  # referência à variável global
-    if HTTP_CLIENT and not HTTP_CLIENT.is_closed:  # verifica se existe e está aberto
-        await HTTP_CLIENT.aclose()  # fecha a conexão
-    HTTP_CLIENT = None  # limpa a variável
+TLS_DEEP_TIMEOUT = int(os.getenv("TLS_DEEP_TIMEOUT", "300"))  # segundos, fase adiada do perfil "deep"
+INCREMENTAL_MAX_AGE = int(os.getenv("INCREMENTAL_MAX_AGE", "604800"))  # segundos até reanalisar um host inalterado
+TLS_FINGERPRINT_TTL = int(os.getenv("TLS_FINGERPRINT_TTL", "3600"))  # segundos
+TLS_CACHE = TTLCache("tls_fingerprint", int(os.getenv("TLS_CACHE_SIZE", "10000")), TLS_FINGERPRINT_TTL)
+_tls_em_andamento: dict[str, asyncio.Task] = {}  # impressão -> varredura completa em curso
+HOST_RESULT_TTL = int(os.getenv("HOST_RESULT_TTL", "600"))  # segundos, análise de um IP reaproveitada entre scans
+HOSTS_CACHE = TTLCache("hosts", int(os.getenv("HOST_CACHE_SIZE", "10000")), HOST_RESULT_TTL)
+_hosts_em_andamento: dict[str, asyncio.Task] = {}  # perfil|ip|portas -> análise em curso
+_gravacoes: set[asyncio.Task] = set()  # gravações no cache compartilhado ainda em curso
 
 ESMTP_RE = re.compile(r"ESMTP\s+([\w\-\./]+)", re.IGNORECASE)  # extrai nome do servidor SMTP
 MYSQL_RE = re.compile(r"([Mm]\s*\d+\.\d+(?:\.\d+)?(?:-[^\s]+)?)")  # captura versão do MySQL
@@ -71,7 +71,14 @@ PORTAS_CRITICAS = [  # lista de portas mais comuns a serem verificadas
     1723,
     1521,
 ]
-softwares_detectados = []  # lista global de (ip, porta, software) detectados
+PORTAS_SONDADAS = {21, 22, 25, 80, 110, 143, 443, 465, 587, 1433, 1521, 3306, 5432}  # banner/HTTP capturados
+ALERTA_SEM_HSTS = "⚠️ Ausência de HSTS - facilita SSL-strip"
+_softwares_detectados: ContextVar[list] = ContextVar("softwares_detectados")  # (ip, porta, software) da chamada atual
+
+
+def registrar_software(ip, porta, software) -> None:  # acumula na lista da chamada de avaliar_portas
+    """Registra um software detectado; análises simultâneas não se misturam."""
+    _softwares_detectados.get().append((ip, porta, software))
 
 def medir_tempo_execucao_async(func):  # decorador para medir desempenho de chamadas
     """Envolve uma função assíncrona para medir e reportar seu tempo de execução."""
@@ -109,148 +116,198 @@ def parse_banner(ip, porta, banner):  # interpreta o texto retornado pelo servi
     return banner[:60]  # valor genérico limitado a 60 caracteres
 
 @medir_tempo_execucao_async
-async def obter_server_header(ip, protocolo):  # obtém cabeçalho Server de HTTP/HTTPS
-    """Consulta a URL e retorna o valor do cabeçalho `Server`."""
-    try:
-        url = f"{protocolo}://{ip}"  # monta a URL alvo
-        async with CONNECTION_SEM:  # respeita o limite de conexões
-            client = get_http_client()  # cliente HTTP reutilizado
-            response = await client.head(url, follow_redirects=True)  # faz requisição HEAD
-        server = response.headers.get("Server", "").strip()  # extrai cabeçalho
-        if server:
-            softwares_detectados.append(
-                (ip, 443 if protocolo == "https" else 80, server)
-            )  # registra software do webserver
-        return server if server else None
-    except Exception:
-        return None  # qualquer erro resulta em None
+async def sondar_servico(ip, porta) -> Captura:  # única conexão com o serviço
+    """Captura banner/resposta HTTP da porta respeitando o limite de conexões."""
+    async with reservar("conexoes", CONNECTION_SEM):
+        return await sondar(ip, porta)
 
-@medir_tempo_execucao_async
-async def verificar_http_sem_redirect(ip):  # checa se o HTTP responde sem redirecionar
-    """Verifica se a porta 80 retorna 200 OK sem redirecionar para HTTPS."""
-    try:
-        async with CONNECTION_SEM:  # controla número de sockets abertos
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(ip, 80), timeout=15
-            )  # abre conexão com timeout
-            request = (
-                b"GET / HTTP/1.1\r\nHost: %b\r\nConnection: close\r\n\r\n" % ip.encode()
-            )  # requisição mínima
-            writer.write(request)  # envia ao servidor
-            await writer.drain()  # garante que os bytes saíram
-            data = await reader.read(1024)  # lê início da resposta
-            writer.close()  # encerra a conexão TCP
-            await writer.wait_closed()
-        return b"HTTP/1.1 200 OK" in data  # true se não houve redirecionamento
-    except Exception:
-        return False  # falha ou timeout
 
-@medir_tempo_execucao_async
-async def obter_banner(ip, porta, palavras_chave):  # captura o banner do serviço
-    """Tenta ler o banner e identificar palavras que revelem o software."""
-    try:
-        async with CONNECTION_SEM:  # respeita o limite de conexões
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(ip, porta), timeout=30
-            )  # abre socket TCP
-            banner = await reader.read(1024)  # captura os primeiros bytes
-            banner = banner.decode(errors="ignore").strip()  # converte para texto
-            writer.close()  # finaliza comunicação
-            await writer.wait_closed()
-        for palavra in palavras_chave:  # percorre palavras que indicam o software
-            if palavra.lower() in banner.lower():  # banner contém a palavra?
-                parsed = parse_banner(ip, porta, banner)  # identifica nome/versão
-                if parsed:
-                    softwares_detectados.append((ip, porta, parsed))  # registra
-                return True, parsed  # software reconhecido
-        return False, None  # banner não confirmou nenhum software
-    except Exception:
-        return False, None  # em caso de erro retorna falso
+async def sondar_portas(ip, portas) -> dict:  # capturas das portas sondadas de um IP
+    alvos = [p for p in portas if p in PORTAS_SONDADAS]
+    capturas = await asyncio.gather(*(sondar_servico(ip, p) for p in alvos))
+    return dict(zip(alvos, capturas))
 
-@medir_tempo_execucao_async
-async def verificar_smtp(ip, porta):  # verifica resposta do servidor SMTP
-    """Envia comando básico e detecta se o servidor exige autenticação."""
-    try:
-        async with CONNECTION_SEM:  # usa semáforo para limitar conexões
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(ip, porta), timeout=10
-            )  # conecta à porta SMTP
-            banner = await asyncio.wait_for(reader.read(1024), timeout=5)  # lê banner inicial
-            banner = banner.decode(errors="ignore").strip()  # converte para texto
-            writer.close()  # encerra sessão SMTP
-            await writer.wait_closed()
-        if "220" in banner:  # código "Service ready" indica ausência de autenticação
-            software = parse_banner(ip, porta, banner)  # obtém nome do servidor
-            if software:
-                softwares_detectados.append((ip, porta, software))  # registra software
-            return "⚠️ SMTP responde sem autenticação inicial", software
-        return "autenticado", None  # banner não indica acesso anônimo
-    except Exception:
+
+def assinar(capturas: dict) -> dict:  # porta -> assinatura, no formato guardado no snapshot
+    return {str(porta): captura.assinatura for porta, captura in capturas.items()}
+
+
+def reaproveitavel(anterior: dict | None, portas, perfil_tls, assinatura: dict) -> bool:
+    """Indica se o registro do último scan ainda vale para o host: mesmas
+    portas abertas, mesmo perfil TLS, mesmos banners/impressões TLS e idade
+    dentro de ``INCREMENTAL_MAX_AGE``."""
+    if not anterior or anterior.get("perfil_tls") != perfil_tls:
+        return False
+    if anterior.get("portas") != sorted(portas) or anterior.get("assinatura") != assinatura:
+        return False
+    return time.time() - anterior.get("verificado_em", 0) <= INCREMENTAL_MAX_AGE
+
+
+def registrar_server_header(ip, porta, captura: Captura):  # cabeçalho Server de HTTP/HTTPS
+    """Registra o valor do cabeçalho `Server` capturado como software."""
+    server = captura.servidor
+    if server:
+        registrar_software(ip, porta, server)  # registra software do webserver
+    return server
+
+
+def http_sem_redirect(captura: Captura) -> bool:  # checa se o HTTP responde sem redirecionar
+    """Verifica se a porta 80 retornou 200 OK em vez de redirecionar para HTTPS."""
+    return captura.status == 200
+
+
+def https_sem_hsts(captura: Captura) -> bool:  # checa o cabeçalho HSTS da resposta HTTPS
+    """Verifica se a resposta HTTPS veio sem ``Strict-Transport-Security``.
+    Redirecionamentos (3xx) não contam: a sonda não os segue e o cabeçalho
+    costuma vir só na resposta final."""
+    if captura.status is None or 300 <= captura.status < 400:
+        return False
+    return "strict-transport-security" not in captura.cabecalhos
+
+
+def identificar_banner(ip, porta, captura: Captura, palavras_chave):  # interpreta o banner do serviço
+    """Procura no banner palavras que revelem o software."""
+    banner = captura.banner
+    for palavra in palavras_chave:  # percorre palavras que indicam o software
+        if palavra.lower() in banner.lower():  # banner contém a palavra?
+            parsed = parse_banner(ip, porta, banner)  # identifica nome/versão
+            if parsed:
+                registrar_software(ip, porta, parsed)  # registra
+            return True, parsed  # software reconhecido
+    return False, None  # banner não confirmou nenhum software
+
+
+def verificar_smtp(ip, porta, captura: Captura):  # verifica resposta do servidor SMTP
+    """Detecta pelo banner se o servidor exige autenticação."""
+    if not captura.conectou or not captura.banner:
         return "falha", None  # erro na comunicação
+    banner = captura.banner
+    if "220" in banner:  # código "Service ready" indica ausência de autenticação
+        software = parse_banner(ip, porta, banner)  # obtém nome do servidor
+        if software:
+            registrar_software(ip, porta, software)  # registra software
+        return "⚠️ SMTP responde sem autenticação inicial", software
+    return "autenticado", None  # banner não indica acesso anônimo
 
-OID_SYS_DESCR = ObjectIdentifier("1.3.6.1.2.1.1.1.0")  # sysDescr
 @medir_tempo_execucao_async
 async def verificar_snmp_public(ip: str, porta: int = 161, comunidade: str = "public") -> bool:
     """Testa se é possível ler o sysDescr usando a community pública."""
-    def sync_task():  # função síncrona executada em thread
-        client = Client(ip, credentials.V2C(comunidade), port=porta)  # cria cliente SNMP v2c
-        wrapped = PyWrapper(client)  # interface de alto nível
-        try:
-            retorno = asyncio.get_event_loop().run_until_complete(
-                wrapped.get(OID_SYS_DESCR)
-            )  # solicita o sysDescr
-            return retorno is not None  # resposta obtida?
-        except ErrorResponse:
-            return False  # community incorreta
-        except Exception:
-            return False  # outros erros
-
-    return await asyncio.to_thread(sync_task)  # executa blocking I/O em thread
-def _run_tls_scan_sync(ip: str):  # executa a varredura TLS de forma síncrona
-    scanner = Scanner()
-    request = ServerScanRequest(
-        server_location=ServerNetworkLocation(ip, 443),
-        scan_commands={
-            ScanCommand.CERTIFICATE_INFO,
-            ScanCommand.TLS_1_0_CIPHER_SUITES,
-            ScanCommand.TLS_1_1_CIPHER_SUITES,
-            ScanCommand.TLS_1_2_CIPHER_SUITES,
-            ScanCommand.TLS_1_3_CIPHER_SUITES,
-            ScanCommand.TLS_COMPRESSION,
-            ScanCommand.HEARTBLEED,
-            ScanCommand.ROBOT,
-            ScanCommand.HTTP_HEADERS,
-            ScanCommand.SESSION_RESUMPTION,
-            ScanCommand.SESSION_RENEGOTIATION,
-            ScanCommand.TLS_1_3_EARLY_DATA,
-            ScanCommand.OPENSSL_CCS_INJECTION,
-            ScanCommand.TLS_FALLBACK_SCSV,
-            ScanCommand.ELLIPTIC_CURVES,
-            ScanCommand.TLS_EXTENDED_MASTER_SECRET,
-        },
-    )
-    scanner.queue_scans([request])
-    return next(scanner.get_results())
-
-
-async def scan_tls(ip: str) -> List[str]:
+    return await comunidade_aceita(ip, comunidade, porta)  # consulta multiplexada, sem thread
+
+
+_COMANDOS_RAPIDOS = {
+    ScanCommand.CERTIFICATE_INFO,
+    ScanCommand.TLS_1_0_CIPHER_SUITES,
+    ScanCommand.TLS_1_1_CIPHER_SUITES,
+    ScanCommand.HEARTBLEED,
+}  # validade do certificado, TLS 1.0/1.1 e Heartbleed (HSTS vem da sonda HTTPS)
+_COMANDOS_PADRAO = _COMANDOS_RAPIDOS | {
+    ScanCommand.TLS_COMPRESSION,
+    ScanCommand.SESSION_RENEGOTIATION,
+    ScanCommand.OPENSSL_CCS_INJECTION,
+    ScanCommand.TLS_FALLBACK_SCSV,
+    ScanCommand.TLS_EXTENDED_MASTER_SECRET,
+}  # verificações rápidas que geram alertas
+_COMANDOS_LENTOS = {
+    ScanCommand.ROBOT,
+    ScanCommand.TLS_1_2_CIPHER_SUITES,
+    ScanCommand.TLS_1_3_CIPHER_SUITES,
+    ScanCommand.ELLIPTIC_CURVES,
+    ScanCommand.SESSION_RESUMPTION,
+    ScanCommand.TLS_1_3_EARLY_DATA,
+}  # dominam o tempo de varredura; no perfil "deep" rodam em segundo plano
+
+PERFIS_TLS = {  # comandos executados durante a análise de portas
+    "quick": frozenset(_COMANDOS_RAPIDOS),
+    "standard": frozenset(_COMANDOS_PADRAO),
+    "deep": frozenset(_COMANDOS_PADRAO),
+}
+COMANDOS_TLS_ADIADOS = frozenset(_COMANDOS_LENTOS)  # fase posterior do perfil "deep"
+PERFIL_TLS_PADRAO = os.getenv("TLS_PROFILE", "standard")
+
+
+async def scan_tls(
+    ip: str,
+    perfil: str = PERFIL_TLS_PADRAO,
+    comandos: frozenset | None = None,
+    timeout: int = TLS_SCAN_TIMEOUT,
+    impressao: str | None = None,
+) -> List[str]:
+    """Executa os comandos do ``perfil`` uma única vez por certificado/configuração.
+    IPs irmãos (mesma impressão digital) aguardam a mesma varredura ou
+    reaproveitam os alertas guardados de scans anteriores. ``impressao``
+    evita um novo handshake quando a sonda da porta já a capturou."""
+    if comandos is None:
+        comandos = PERFIS_TLS.get(perfil, PERFIS_TLS[PERFIL_TLS_PADRAO])
+    if impressao is None:
+        async with reservar("conexoes", CONNECTION_SEM):
+            impressao = await impressao_tls(ip)
+    if impressao is None:  # sem handshake não há como agrupar
+        return await _scan_tls_completo(ip, comandos, timeout) or []
+    impressao = f"{perfil}|{impressao}"  # cada perfil produz um conjunto de alertas
+
+    alerts = TLS_CACHE.get(impressao)
+    if alerts is None and CACHE_BACKEND == "postgres":
+        alerts = (await ler_compartilhado("tls", [impressao])).get(impressao)
+        if alerts is not None:
+            TLS_CACHE.set(impressao, alerts)
+    if alerts is not None:
+        return list(alerts)
+
+    tarefa = _tls_em_andamento.get(impressao)
+    if tarefa is None:  # primeiro IP com esta impressão executa a suíte
+        tarefa = asyncio.create_task(_scan_tls_completo(ip, comandos, timeout))
+        _tls_em_andamento[impressao] = tarefa
+        tarefa.add_done_callback(lambda _: _tls_em_andamento.pop(impressao, None))
+        tarefa.add_done_callback(lambda t: _guardar_alertas_tls(impressao, t))
+    alerts = await asyncio.shield(tarefa)  # o timeout de um IP não cancela os irmãos
+    return list(alerts) if alerts is not None else []
+
+
+def _guardar_alertas_tls(impressao: str, tarefa: asyncio.Task) -> None:
+    """Guarda os alertas de varreduras bem-sucedidas no cache."""
+    if tarefa.cancelled() or tarefa.exception() or tarefa.result() is None:
+        return
+    TLS_CACHE.set(impressao, tarefa.result())
+    if CACHE_BACKEND == "postgres":
+        _em_segundo_plano(_gravar_alertas_tls(impressao, tarefa.result()))
+
+
+def _em_segundo_plano(corrotina) -> None:
+    """Agenda uma gravação mantendo a referência até ela terminar."""
+    tarefa = asyncio.create_task(corrotina)
+    _gravacoes.add(tarefa)
+    tarefa.add_done_callback(_gravacoes.discard)
+
+
+async def _gravar_alertas_tls(impressao: str, alerts: List[str]) -> None:
+    try:
+        await gravar_compartilhado("tls", {impressao: alerts}, TLS_FINGERPRINT_TTL)
+    except Exception as exc:
+        print(f"[ERRO] Falha ao gravar cache TLS: {exc}")
+
+
+async def _scan_tls_completo(ip: str, comandos: frozenset, timeout: int) -> List[str] | None:
+    """Roda os ``comandos`` do sslyze e traduz o resultado em alertas.
+    Comandos fora do perfil não têm resultado e não geram alerta.
+    Retorna ``None`` quando a varredura falha (resultado não cacheável)."""
     try:
         result = await asyncio.wait_for(
-            asyncio.to_thread(_run_tls_scan_sync, ip),
-            timeout=TLS_SCAN_TIMEOUT,
+            MOTOR_TLS.escanear(ip, comandos),  # entra no próximo lote do Scanner
+            timeout=timeout,
         )
     except asyncio.TimeoutError:
-        print(f"[TIMEOUT] TLS scan for {ip} exceeded {TLS_SCAN_TIMEOUT}s")
-        return []
+        print(f"[TIMEOUT] TLS scan for {ip} exceeded {timeout}s")
+        return None
     except Exception as exc:
         print(f"[ERROR] SSLyze scan failed for {ip}: {exc}")
-        return []
+        return None
 
     alerts: List[str] = []
 
     if (result.scan_status != ServerScanStatusEnum.COMPLETED or not result.scan_result):
         print(f"[ERROR] Could not collect TLS info for {ip}")
-        return [] 
+        return None
 
     scan = result.scan_result
 
@@ -293,11 +350,6 @@ async def scan_tls(ip: str) -> List[str]:
     except Exception:
         pass
 
-    try:
-        if scan.http_headers.result.strict_transport_security_header is None:
-            alerts.append("⚠️ Ausência de HSTS - facilita SSL-strip")
-    except Exception:
-        pass
 
     try:
         reneg = scan.session_renegotiation.result
@@ -326,18 +378,28 @@ async def scan_tls(ip: str) -> List[str]:
 
     return alerts
 
-async def analisar_ip(ip, portas):  # avalia cada porta aberta de um IP
-    """Executa verificações específicas para cada porta detectada."""
+async def analisar_ip(ip, portas, perfil_tls=PERFIL_TLS_PADRAO, capturas=None):  # avalia cada porta aberta de um IP
+    """Executa verificações específicas para cada porta detectada.
+    ``capturas`` reaproveita sondas já feitas e recebe as que forem feitas aqui."""
     alertas = []  # lista de alertas gerados
+    capturas = {} if capturas is None else capturas
+
+    async def capturar(porta):  # uma sonda por porta, mesmo se já feita pelo chamador
+        if porta not in PORTAS_SONDADAS:
+            return None
+        if porta not in capturas:
+            capturas[porta] = await sondar_servico(ip, porta)
+        return capturas[porta]
 
     async def processar_porta(porta):  # rotina para cada porta individual
         sub_alertas = []  # alertas específicos desta porta
+        captura = await capturar(porta)
         if porta == 21:
             sub_alertas.append((ip, porta, "⚠️ FTP aberto — arquivos da empresa podem estar expostos"))  # FTP sem proteção
-            await obter_banner(ip, porta, ["ftp"])  # registra software FTP
+            identificar_banner(ip, porta, captura, ["ftp"])  # registra software FTP
 
         elif porta == 22:
-            ok, banner = await obter_banner(ip, porta, ["ssh"])  # tenta identificar serviço SSH
+            ok, banner = identificar_banner(ip, porta, captura, ["ssh"])  # tenta identificar serviço SSH
             if ok:
                 sub_alertas.append((ip, porta, f"⚠️ SSH acessível — risco de acesso remoto via força bruta ({banner})"))
 
@@ -345,7 +407,7 @@ async def analisar_ip(ip, portas):  # avalia cada porta aberta de um IP
             sub_alertas.append((ip, porta, "🟥 Telnet habilitado — comunicação sem criptografia"))  # Telnet é inseguro
 
         elif porta == 110:
-            ok, banner = await obter_banner(ip, porta, ["pop3"])  # verifica POP3
+            ok, banner = identificar_banner(ip, porta, captura, ["pop3"])  # verifica POP3
             if ok:
                 sub_alertas.append(
                     (
@@ -356,7 +418,7 @@ async def analisar_ip(ip, portas):  # avalia cada porta aberta de um IP
                 )
 
         elif porta == 143:
-            ok, banner = await obter_banner(ip, porta, ["imap"])  # verifica IMAP
+            ok, banner = identificar_banner(ip, porta, captura, ["imap"])  # verifica IMAP
             if ok:
                 sub_alertas.append(
                     (
@@ -369,13 +431,16 @@ async def analisar_ip(ip, portas):  # avalia cada porta aberta de um IP
         elif porta == 80:
             if 443 not in portas:
                 sub_alertas.append((ip, porta, "⚠️ HTTP sem HTTPS — dados podem ser interceptados"))  # site sem TLS
-            elif await verificar_http_sem_redirect(ip):
+            elif http_sem_redirect(captura):
                 sub_alertas.append((ip, porta, "⚠️ HTTP exposto sem redirecionamento — status 200 OK"))  # não redireciona
-            await obter_server_header(ip, "http")  # coleta header do servidor
+            registrar_server_header(ip, porta, captura)  # coleta header do servidor
 
         elif porta == 443:
-            await obter_server_header(ip, "https")  # coleta header HTTPS
-            tls_alertas = await scan_tls(ip)
+            registrar_server_header(ip, porta, captura)  # coleta header HTTPS
+            tls_alertas = await scan_tls(ip, perfil_tls, impressao=captura.impressao_tls)
+            tls_alertas = [m for m in tls_alertas if m != ALERTA_SEM_HSTS]  # cacheados antes da sonda o traziam
+            if https_sem_hsts(captura):
+                tls_alertas.append(ALERTA_SEM_HSTS)
             for msg in tls_alertas:
                 sub_alertas.append((ip, porta, msg))
 
@@ -408,30 +473,30 @@ async def analisar_ip(ip, portas):  # avalia cada porta aberta de um IP
             )  # PPTP é vulnerável
 
         elif porta == 3306:
-            ok, banner = await obter_banner(ip, porta, ["mysql"])  # tenta identificar MySQL
+            ok, banner = identificar_banner(ip, porta, captura, ["mysql"])  # tenta identificar MySQL
             if ok:
                 sub_alertas.append((ip, porta, "⚠️ Banco de dados MySQL acessível publicamente"))
 
         elif porta == 5432:
-            ok, banner = await obter_banner(ip, porta, ["postgres"])  # verifica PostgreSQL
+            ok, banner = identificar_banner(ip, porta, captura, ["postgres"])  # verifica PostgreSQL
             if ok:
                 sub_alertas.append((ip, porta, f"⚠️ PostgreSQL exposto ({banner})"))
 
 
         elif porta == 1433:
-            ok, banner = await obter_banner(ip, porta, ["microsoft", "sql"])  # verifica MSSQL
+            ok, banner = identificar_banner(ip, porta, captura, ["microsoft", "sql"])  # verifica MSSQL
             if ok:
                 sub_alertas.append((ip, porta, f"⚠️ Microsoft SQL Server acessível ({banner})"))
 
         elif porta == 1521:
-            ok, banner = await obter_banner(ip, porta, ["oracle", "tns"])  # verifica Oracle DB
+            ok, banner = identificar_banner(ip, porta, captura, ["oracle", "tns"])  # verifica Oracle DB
             if ok:
                 sub_alertas.append(
                     (ip, porta, f"⚠️ Oracle DB acessível (versão: {banner})")
                 )
 
         elif porta in [25, 465, 587]:
-            msg, software = await verificar_smtp(ip, porta)  # análise de SMTP
+            msg, software = verificar_smtp(ip, porta, captura)  # análise de SMTP
             if "autenticação" in msg:
                 texto = f"📧 SMTP aberto — {msg}"
                 if software:
@@ -445,19 +510,117 @@ async def analisar_ip(ip, portas):  # avalia cada porta aberta de um IP
         alertas.extend(r)
     return alertas  # retorna lista final
 
-async def avaliar_portas(portas_por_ip):  # executa análise para vários IPs
-    """Percorre IPs e aplica verificações de serviço porta a porta."""
+async def analisar_host(ip, portas, perfil_tls, anterior=None):  # análise completa ou reaproveitada
+    """Retorna ``(registro, reaproveitado)``.
+
+    Uma análise recente do mesmo IP/portas/perfil, feita por qualquer scan, é
+    reutilizada; se outro scan está analisando o mesmo host, seu resultado é
+    aguardado. Com ``anterior`` (registro do último relatório), sonda só os
+    banners e, se nada mudou, devolve o registro antigo sem repetir TLS, SNMP
+    e CVEs (``reaproveitado``)."""
+    chave = f"{perfil_tls}|{ip}|{','.join(map(str, sorted(portas)))}"
+    registro = await _host_recente(chave)
+    if registro is not None:
+        for porta, software in registro["softwares"]:  # CVEs consultadas por este scan
+            registrar_software(ip, porta, software)
+        return registro, False
+    capturas = {}
+    if anterior is not None:
+        capturas = await sondar_portas(ip, portas)
+        if reaproveitavel(anterior, portas, perfil_tls, assinar(capturas)):
+            return anterior, True
+
+    tarefa = _hosts_em_andamento.get(chave)
+    if tarefa is not None:  # outro scan já analisa este host
+        try:
+            registro = await asyncio.shield(tarefa)
+        except asyncio.CancelledError:
+            if not tarefa.cancelled():  # cancelamento deste scan
+                raise
+        except Exception as exc:  # falha da análise do outro scan: segue com a própria
+            print(f"[ERRO] Análise compartilhada de {ip} falhou: {exc}")
+        else:
+            for porta, software in registro["softwares"]:
+                registrar_software(ip, porta, software)
+            return registro, False
+    tarefa = asyncio.create_task(_analisar_completo(ip, portas, perfil_tls, capturas))
+    _hosts_em_andamento[chave] = tarefa
+    tarefa.add_done_callback(lambda t: _concluir_host(chave, t))
+    return await tarefa, False  # timeout/cancelamento deste scan interrompe a análise
+
+
+async def _analisar_completo(ip, portas, perfil_tls, capturas) -> dict:
+    alertas = await analisar_ip(ip, portas, perfil_tls, capturas)
+    return {
+        "portas": sorted(portas),
+        "perfil_tls": perfil_tls,
+        "assinatura": assinar(capturas),
+        "alertas": [[porta, msg] for _, porta, msg in alertas],
+        "softwares": [[p, sw] for i, p, sw in _softwares_detectados.get() if i == ip],
+        "cves": [],  # preenchido após a consulta de CVEs
+        "verificado_em": time.time(),
+    }
+
+
+async def _host_recente(chave: str) -> dict | None:
+    registro = HOSTS_CACHE.get(chave)
+    if registro is None and CACHE_BACKEND == "postgres":
+        try:
+            registro = (await ler_compartilhado("hosts", [chave])).get(chave)
+        except Exception as exc:
+            print(f"[ERRO] Falha ao ler cache de hosts: {exc}")
+        if registro is not None:
+            HOSTS_CACHE.set(chave, registro)
+    return registro
+
+
+def _concluir_host(chave: str, tarefa: asyncio.Task) -> None:
+    """Libera a chave e guarda análises bem-sucedidas para outros scans."""
+    if _hosts_em_andamento.get(chave) is tarefa:
+        del _hosts_em_andamento[chave]
+    if tarefa.cancelled() or tarefa.exception():
+        return
+    HOSTS_CACHE.set(chave, tarefa.result())
+    if CACHE_BACKEND == "postgres":
+        _em_segundo_plano(_gravar_host(chave, tarefa.result()))
+
+
+async def _gravar_host(chave: str, registro: dict) -> None:
+    try:
+        await gravar_compartilhado("hosts", {chave: registro}, HOST_RESULT_TTL)
+    except Exception as exc:
+        print(f"[ERRO] Falha ao gravar cache de hosts: {exc}")
+
+
+async def avaliar_portas(portas_por_ip, perfil_tls=PERFIL_TLS_PADRAO, anterior=None, hosts=None):  # executa análise para vários IPs
+    """Percorre IPs e aplica verificações de serviço porta a porta.
+
+    ``anterior`` é o snapshot do último relatório (``ip -> registro``): hosts
+    inalterados têm alertas e CVEs reaproveitados e seus softwares não são
+    reenviados à busca de CVEs. ``hosts`` recebe o registro de cada IP
+    analisado (com ``reaproveitado``) para compor o próximo snapshot."""
     alertas = []
-    global softwares_detectados
-    softwares_detectados = []  # reinicia lista de softwares
+    softwares_detectados = []  # softwares desta chamada
+    _softwares_detectados.set(softwares_detectados)  # herdado pelas tarefas criadas abaixo
+    hosts = {} if hosts is None else hosts
 
     async def analisar_com_timeout(ip, portas):  # aplica timeout por IP
         try:
-            async with IP_SEM:
-                return await asyncio.wait_for(analisar_ip(ip, portas), timeout=35)
+            async with reservar("ips", IP_SEM):
+                registro, reaproveitado = await asyncio.wait_for(
+                    analisar_host(ip, portas, perfil_tls, (anterior or {}).get(ip)), timeout=35
+                )
+            hosts[ip] = {**registro, "reaproveitado": reaproveitado}
+            resultado = [(ip, porta, msg) for porta, msg in registro["alertas"]]
         except asyncio.TimeoutError:
             print(f"[TIMEOUT] análise do IP {ip} excedeu 35s e foi abortada.")
-            return []
+            resultado = []
+        publicar("alertas_porta", {  # alertas do IP assim que sua análise termina
+            "ip": ip,
+            "portas": sorted(portas),
+            "alertas": [{"ip": i, "porta": p, "mensagem": m} for i, p, m in resultado],
+        })
+        return resultado
 
     tarefas = [analisar_com_timeout(ip, portas) for ip, portas in portas_por_ip.items()]  # dispara avaliações
     resultados = await asyncio.gather(*tarefas)
@@ -468,6 +631,20 @@ async def avaliar_portas(portas_por_ip):  # executa análise para vários IPs
     return alertas, softwares_detectados  # retorna alertas e softwares encontrados
 
 
+async def avaliar_tls_adiado(portas_por_ip):  # fase em segundo plano do perfil "deep"
+    """Executa ROBOT, enumeração completa de cifras e demais comandos lentos
+    para os IPs com 443 aberta, sem o limite de tempo da análise de portas."""
+    alvos = [ip for ip, portas in portas_por_ip.items() if 443 in portas]
+
+    async def analisar(ip):
+        async with reservar("tls_adiado", TLS_ADIADO_SEM):  # não ocupa as vagas da análise de portas
+            alertas = await scan_tls(ip, "deep-adiado", COMANDOS_TLS_ADIADOS, TLS_DEEP_TIMEOUT)
+            return [(ip, 443, msg) for msg in alertas]
+
+    resultados = await asyncio.gather(*(analisar(ip) for ip in alvos))
+    return [alerta for r in resultados for alerta in r]
+
+
 async def avaliar_softwares(softwares):  # consulta banco de CVEs
     """Consulta o banco de CVEs para cada software identificado."""
     if not softwares:
@@ -94,3 +94,16 @@ def calcular_score_leaks(num_emails: int, num_passwords: int, num_hashes: int,
     fator = _fator_ajuste(total, k)  # ajusta pela quantidade total
     score = _formula(risco_total, fator)  # resultado final normalizado
     return round(score, 2)
+
+
+def calcular_score_final(port_score: float, software_score: float, leak_score: float) -> float:
+    """Combina as notas com pesos, ignorando as que valem 1 (sem achados)."""
+    notas = []  # notas individuais
+    pesos = []  # pesos correspondentes
+    for nota, peso in ((port_score, 2), (software_score, 1), (leak_score, 1)):
+        if nota != 1:
+            notas.append(nota)
+            pesos.append(peso)
+    if not notas:  # se todas foram 1, nota final é 1
+        return 1
+    return round(sum(n * p for n, p in zip(notas, pesos)) / sum(pesos), 2)
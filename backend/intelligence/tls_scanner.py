@@ -0,0 +1,157 @@
+"""Motor de varredura TLS em lote.
+
+Em vez de criar um ``Scanner`` do sslyze por IP, os pedidos feitos por
+``scan_tls`` (de um mesmo scan ou de scans simultâneos) são agrupados em uma
+janela curta e enfileirados em um único ``Scanner``, que usa a concorrência
+por servidor e global do próprio sslyze. Cada resultado é devolvido à
+corrotina que o aguarda assim que o servidor termina, sem esperar o lote.
+"""
+
+import asyncio  # integração entre o loop e a thread do sslyze
+import hashlib  # impressão digital do certificado
+import os  # parâmetros via variáveis de ambiente
+import ssl  # handshake leve para identificar o certificado
+from concurrent.futures import ThreadPoolExecutor  # threads dedicadas aos lotes
+
+from sslyze.server_setting import ServerNetworkLocation
+from sslyze.scanner.scanner import Scanner, ServerScanRequest
+
+TLS_BATCH_WINDOW = float(os.getenv("TLS_BATCH_WINDOW", "0.5"))  # segundos aguardando mais alvos
+TLS_MAX_BATCH = int(os.getenv("TLS_MAX_BATCH", "50"))  # alvos por Scanner
+TLS_SERVER_CONNECTIONS = int(os.getenv("TLS_SERVER_CONNECTIONS", "5"))  # conexões por servidor
+TLS_CONCURRENT_SERVERS = int(os.getenv("TLS_CONCURRENT_SERVERS", "20"))  # servidores em paralelo
+TLS_MAX_LOTES = int(os.getenv("TLS_MAX_LOTES", "4"))  # lotes executando ao mesmo tempo
+TLS_HANDSHAKE_TIMEOUT = float(os.getenv("TLS_HANDSHAKE_TIMEOUT", "5"))  # segundos
+
+
+def _contexto_handshake() -> ssl.SSLContext:
+    """Contexto permissivo: o objetivo é apenas ler o certificado."""
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    ctx.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+    try:
+        ctx.set_ciphers("ALL:@SECLEVEL=0")  # aceita servidores legados
+    except ssl.SSLError:
+        pass
+    return ctx
+
+
+CTX_HANDSHAKE = _contexto_handshake()  # também usado pela sonda de serviços
+
+
+def impressao_sessao(sessao) -> str | None:
+    """``sha256(certificado):versão:cifra`` de uma sessão TLS estabelecida."""
+    certificado = sessao.getpeercert(binary_form=True) if sessao else None
+    if not certificado:
+        return None
+    cifra = sessao.cipher()
+    return ":".join(
+        (hashlib.sha256(certificado).hexdigest(), sessao.version() or "", cifra[0] if cifra else "")
+    )
+
+
+async def impressao_tls(ip: str, porta: int = 443) -> str | None:
+    """Faz um único handshake e retorna ``sha256(certificado)`` junto com a
+    versão e a cifra negociadas. IPs atrás do mesmo balanceador/CDN
+    costumam compartilhar esse valor. Retorna ``None`` em caso de falha."""
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, porta, ssl=CTX_HANDSHAKE),
+            timeout=TLS_HANDSHAKE_TIMEOUT,
+        )
+    except Exception:
+        return None
+    try:
+        return impressao_sessao(writer.get_extra_info("ssl_object"))
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+class MotorTLS:
+    """Agrupa pedidos de varredura TLS e distribui os resultados."""
+
+    def __init__(self):
+        self._pendentes: dict[tuple, list[asyncio.Future]] = {}  # (ip, porta, comandos) -> aguardando
+        self._janela: asyncio.TimerHandle | None = None
+        self._executor = ThreadPoolExecutor(TLS_MAX_LOTES, thread_name_prefix="sslyze")
+
+    async def escanear(self, ip: str, comandos: frozenset, porta: int = 443):
+        """Enfileira ``ip`` no próximo lote e aguarda o ``ServerScanResult``."""
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendentes.setdefault((ip, porta, comandos), []).append(futuro)
+        if len(self._pendentes) >= TLS_MAX_BATCH:
+            self._disparar()
+        elif self._janela is None:
+            self._janela = loop.call_later(TLS_BATCH_WINDOW, self._disparar)
+        return await futuro
+
+    def _disparar(self) -> None:
+        """Envia os pedidos pendentes para um novo ``Scanner``."""
+        if self._janela is not None:
+            self._janela.cancel()
+            self._janela = None
+        lote: dict[tuple, list[asyncio.Future]] = {}
+        servidores = set()
+        for chave in list(self._pendentes):
+            ip, porta, _ = chave
+            # o sslyze identifica resultados pelo servidor, então cada
+            # (ip, porta) aparece uma única vez por lote
+            if (ip, porta) in servidores or len(lote) >= TLS_MAX_BATCH:
+                continue
+            servidores.add((ip, porta))
+            futuros = [f for f in self._pendentes.pop(chave) if not f.done()]
+            if futuros:
+                lote[chave] = futuros
+        loop = asyncio.get_running_loop()
+        if self._pendentes:  # sobras seguem na próxima janela
+            self._janela = loop.call_later(TLS_BATCH_WINDOW, self._disparar)
+        if lote:
+            loop.run_in_executor(self._executor, self._executar_lote, loop, lote)
+
+    def _executar_lote(self, loop: asyncio.AbstractEventLoop, lote: dict) -> None:
+        """Executa o lote na thread do executor, repassando cada resultado."""
+        por_servidor = {(chave[0], chave[1]): chave for chave in lote}
+        try:
+            scanner = Scanner(
+                per_server_concurrent_connections_limit=TLS_SERVER_CONNECTIONS,
+                concurrent_server_scans_limit=TLS_CONCURRENT_SERVERS,
+            )
+            scanner.queue_scans(
+                [
+                    ServerScanRequest(
+                        server_location=ServerNetworkLocation(ip, porta),
+                        scan_commands=set(comandos),
+                    )
+                    for ip, porta, comandos in lote
+                ]
+            )
+            for resultado in scanner.get_results():  # chega conforme cada servidor termina
+                local = resultado.server_location
+                chave = por_servidor.pop((local.hostname, local.port), None)
+                if chave is not None:
+                    loop.call_soon_threadsafe(_resolver, lote[chave], resultado, None)
+            erro = RuntimeError("sslyze não retornou resultado para o servidor")
+        except Exception as exc:
+            erro = exc
+        for chave in por_servidor.values():  # pedidos sem resultado
+            loop.call_soon_threadsafe(_resolver, lote[chave], None, erro)
+
+
+def _resolver(futuros: list[asyncio.Future], resultado, erro) -> None:
+    """Entrega o resultado às corrotinas que ainda o aguardam."""
+    for futuro in futuros:
+        if futuro.done():  # quem aguardava já desistiu (timeout)
+            continue
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
+
+
+MOTOR_TLS = MotorTLS()  # instância compartilhada por todos os scans do processo
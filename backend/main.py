@@ -6,25 +6,26 @@ As rotinas aqui sao usadas pelos endpoints em `api.py` para orquestrar scans de
 """
 import asyncio  # Biblioteca para execução assíncrona
 import os  # Funções de sistema operacional
+import tempfile  # Diretório de trabalho isolado por scan
 from datetime import datetime  # Manipulação de datas
 import tldextract  # Extrai domínios
-from modules.subfinder import run_subfinder  # Wrapper da ferramenta subfinder
-from modules.naabu import run_naabu  # Wrapper do scanner de portas Naabu
-from parsers.parse_dnsx import parse_dnsx  # Parser do DNSx
-from parsers.parse_naabu import parse_naabu  # Parser do Naabu
-import aiofiles  # Arquivos assíncronos
+from modules.subfinder import enumerar_ips  # subfinder -> dnsx em fluxo
+from modules.naabu import escanear_ips  # Naabu por lote de IPs via pipes
 from intelligence.risk_mapper import (
+    PERFIL_TLS_PADRAO,  # Perfil de varredura TLS usado por padrão
     avaliar_portas,  # Analisa portas abertas
     avaliar_softwares,  # Verifica softwares/vulnerabilidades
-    close_http_client,  # Fecha o cliente HTTP
+    avaliar_tls_adiado,  # Fase TLS em segundo plano do perfil "deep"
 )
 from intelligence.scoring import (
     calcular_score_portas,  # Score baseado em portas
     calcular_score_softwares,  # Score de softwares
     calcular_score_leaks,  # Score de vazamentos
+    calcular_score_final,  # Combinação ponderada das notas
 )
 from modules.dehashed import verificar_vazamentos  # Consulta vazamentos
-import uuid  # Gera UUIDs
+from modules.job_manager import GERENCIADOR_JOBS, Job  # Fila e execução dos scans
+from modules.eventos import publicar  # Progresso transmitido em /api/jobs/{id}/eventos
 
 
 # Utilizado pelos endpoints do API para normalizar a entrada do usuario
@@ -45,37 +46,22 @@ def extrair_dominio(alvo: str) -> str | None:
     return f"{partes.domain}.{partes.suffix}"  # Retorna dominio.tld
 
 
-# Esta lista de IPs alimenta o scanner naabu em modules.naabu
-async def salvar_ips(ip_list: list[str], path: str) -> None:
-    """Salva uma lista de IPs em ``path`` de maneira assíncrona."""
-    async with aiofiles.open(path, "w") as f:  # Abre arquivo para escrita
-        if ip_list:  # Caso existam IPs
-            await f.write("\n".join(ip_list) + "\n")  # Escreve cada IP em nova linha
-
-# Auxilia na contagem de resultados gerados por ferramentas externas
-async def contar_linhas(path: str) -> int:
-    """Conta linhas de um arquivo de forma assíncrona."""
-    total = 0  # Contador de linhas
-    try:
-        async with aiofiles.open(path, "r") as f:  # Abre arquivo para leitura
-            async for _ in f:  # Itera linha a linha
-                total += 1  # Incrementa contador
-    except FileNotFoundError:
-        print(f"[ERRO] Arquivo {path} não encontrado.")  # Aviso de erro
-    return total  # Devolve total
-
-
+from sqlalchemy import delete  # Remoção das credenciais anteriores
 from sqlalchemy.future import select  # Consulta assíncrona com SQLAlchemy
 from database import AsyncSessionLocal  # Sessão assíncrona do banco
-from models import Report  # Modelo do relatório
+from models import LeakedCredential, Report  # Modelos do relatório e das credenciais
 
 # Persiste ou atualiza dados no banco para consulta posterior via API
 
 async def salvar_relatorio_json(info: dict, usuario: str | None = None) -> None:
-    """Adiciona ou atualiza um relatório na base PostgreSQL."""
+    """Adiciona ou atualiza um relatório na base PostgreSQL.
+
+    ``leaked_data``, quando presente, substitui as credenciais do relatório
+    na tabela ``leaked_credentials``."""
     dominio = info.get("dominio")  # Extrai dominio do dicionário
     if not dominio:  # Se não houver dominio
         return
+    credenciais = info.get("leaked_data")
 
     async with AsyncSessionLocal() as session:  # Abre sessão com o banco
         result = await session.execute(select(Report).where(Report.dominio == dominio))  # Busca registro
@@ -87,177 +73,357 @@ async def salvar_relatorio_json(info: dict, usuario: str | None = None) -> None:
         if usuario:
             report.usuario = usuario
         for key, value in info.items():  # Percorre campos
-            if hasattr(report, key):  # Se atributo existe
+            if hasattr(report, key) and key != "leaked_data":  # Se atributo existe
                 setattr(report, key, value)  # Atualiza
+        if credenciais is not None:
+            await session.flush()  # garante report.id para relatórios novos
+            await _gravar_credenciais(session, report.id, credenciais)
         await session.commit()  # Salva alterações
 
-# Limpa a pasta usada pelos wrappers de ferramentas externas
-def limpar_pasta_data() -> None:
-    """Remove arquivos temporários gerados em ``data/``."""
-    pasta = "data"  # Pasta de trabalho
-    for arquivo in os.listdir(pasta):  # Percorre conteúdo
-        caminho = os.path.join(pasta, arquivo)  # Caminho completo
-        if os.path.isfile(caminho):  # Se for arquivo
-            os.remove(caminho)  # Remove
-    print("\n[INFO] Pasta 'data/' limpa para a próxima execução.")
-
-# Estruturas globais acessadas pelo API para acompanhar progresso
 
-jobs = {}  # Armazena informações de jobs em execução
-current_port_task = None  # Tarefa de portas em andamento
-current_job_id = None  # Identificador do job atual
+def _linha_credencial(row) -> tuple[str, str, str]:
+    """(email, senha, hash) de uma credencial em dict ou lista."""
+    if isinstance(row, dict):
+        return row.get("email") or "", row.get("password") or "", row.get("hash") or ""
+    if isinstance(row, (list, tuple)):
+        email, senha, hash_ = (list(row) + ["", "", ""])[:3]
+        return email or "", senha or "", hash_ or ""
+    return str(row), "", ""
 
-# Funcao utilizada pelo endpoint /api/cancel para abortar tarefas
 
-def cancelar_job(job_id: str) -> bool:
-    """Cancela tarefa em andamento e remove metadados do job."""
-    job = jobs.pop(job_id, None)  # Remove job da lista
-    if not job:  # Se não encontrado
-        return False
-    task = job.get("task")  # Obtém tarefa relacionada
-    if task:
-        task.cancel()  # Cancela a task
-
-
-# Chamado via /api/cancel-current para interromper o scan em execucao
-def cancelar_analise_atual() -> bool:
-    """Interrompe a análise em andamento, se existir."""
-    global current_port_task, current_job_id
-    cancelled = False  # Flag de cancelamento
-    if current_port_task and not current_port_task.done():  # Tarefa de portas ativa
-        current_port_task.cancel()  # Cancela tarefa
-        cancelled = True
-    if current_job_id:  # Se há job em execução
-        cancelar_job(current_job_id)
-        current_job_id = None
-        cancelled = True
-    return cancelled
+async def _gravar_credenciais(session, report_id: int, credenciais: list) -> None:
+    """Substitui as credenciais do relatório em lote, com COPY do asyncpg."""
+    await session.execute(delete(LeakedCredential).where(LeakedCredential.report_id == report_id))
+    if not credenciais:
+        return
+    conexao = await (await session.connection()).get_raw_connection()  # mesma transação
+    await conexao.driver_connection.copy_records_to_table(
+        LeakedCredential.__tablename__,
+        records=[(report_id, *_linha_credencial(c)) for c in credenciais],
+        columns=["report_id", "email", "password", "hash"],
+    )
+
+
+async def carregar_snapshot(dominio: str) -> dict | None:
+    """Snapshot por IP do último relatório do domínio, base do scan incremental."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Report.snapshot).where(Report.dominio == dominio))
+        return result.scalars().first()
+
+
+EVENTOS_HEARTBEAT = float(os.getenv("EVENTOS_HEARTBEAT", "15"))  # segundos entre keep-alives do stream
+EVENTOS_POLL = float(os.getenv("EVENTOS_POLL", "2"))  # segundos entre leituras de jobs de outro worker
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "64"))  # IPs por execução do Naabu
+PIPELINE_BATCH_WINDOW = float(os.getenv("PIPELINE_BATCH_WINDOW", "2"))  # segundos aguardando completar o lote
+
+
+# Enumeração, varredura de portas e análise encadeadas em fluxo
+async def varrer_em_fluxo(
+    dominio: str,
+    perfil_tls: str = PERFIL_TLS_PADRAO,
+    anterior: dict | None = None,
+    hosts: dict | None = None,
+    atualizar_dns: bool = False,
+    contagem: dict | None = None,
+):
+    """Executa subfinder -> dnsx -> Naabu -> ``avaliar_portas`` sem esperar
+    cada etapa terminar: os IPs resolvidos são agrupados em lotes pequenos,
+    cada lote vai ao Naabu assim que fecha e suas portas já seguem para a
+    análise enquanto os próximos IPs ainda estão sendo resolvidos.
+
+    As ferramentas rodam em um diretório temporário exclusivo deste scan,
+    removido ao final apenas por ele. ``anterior`` e ``hosts`` seguem para
+    ``avaliar_portas`` (scan incremental e registros do próximo snapshot).
+    Subdomínios e registros A vêm do cache por domínio, salvo com
+    ``atualizar_dns``; ``contagem`` recebe os instantes em que foram obtidos.
+
+    Retorna ``(num_subdominios, ips, portas_abertas, alertas, softwares)``.
+    """
+    with tempfile.TemporaryDirectory(prefix="scan-") as pasta:
+        if contagem is None:
+            contagem = {}
+        return await _varrer_em_fluxo(
+            dominio, perfil_tls, pasta, anterior, hosts, atualizar_dns, contagem
+        )
+
+
+async def _varrer_em_fluxo(dominio, perfil_tls, pasta, anterior, hosts, atualizar_dns, contagem):
+    loop = asyncio.get_running_loop()
+    ips = []  # IPs únicos na ordem em que foram resolvidos
+    fila = asyncio.Queue()  # IPs aguardando o Naabu (None encerra)
+    portas_abertas = {}  # ip -> portas de todos os lotes
+    analises = []  # avaliar_portas de cada lote
+    parciais = []  # alertas dos lotes já analisados
+    escaneados = 0  # IPs que já passaram pelo Naabu
+
+    def progresso():
+        publicar("progresso", {
+            "subdominios": contagem.get("subdominios", 0),
+            "ips": len(ips),
+            "ips_escaneados": escaneados,
+            "ips_com_portas": len(portas_abertas),
+        })
+
+    async def enumerar():
+        try:
+            async for ip in enumerar_ips(dominio, contagem, cwd=pasta, atualizar=atualizar_dns):
+                ips.append(ip)
+                fila.put_nowait(ip)
+        finally:
+            fila.put_nowait(None)
+            progresso()
+
+    async def analisar(portas):
+        alertas_lote, softwares_lote = await avaliar_portas(portas, perfil_tls, anterior, hosts)
+        parciais.extend(alertas_lote)
+        publicar("score", {  # nota provisória: ainda pode haver IPs a resolver
+            "port_score": calcular_score_portas(parciais, len(ips)),
+            "parcial": True,
+        })
+        return alertas_lote, softwares_lote
+
+    async def escanear():
+        nonlocal escaneados
+        fim = False
+        while not fim:
+            primeiro = await fila.get()
+            if primeiro is None:
+                break
+            lote = [primeiro]
+            prazo = loop.time() + PIPELINE_BATCH_WINDOW
+            while len(lote) < PIPELINE_BATCH_SIZE:
+                try:  # completa o lote até o fim da janela
+                    ip = await asyncio.wait_for(fila.get(), timeout=max(0, prazo - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if ip is None:
+                    fim = True
+                    break
+                lote.append(ip)
+            portas = await escanear_ips(lote, cwd=pasta)
+            portas_abertas.update(portas)
+            escaneados += len(lote)
+            progresso()
+            if portas:
+                analises.append(asyncio.create_task(analisar(portas)))
 
+    try:
+        await asyncio.gather(enumerar(), escanear())
+        resultados = await asyncio.gather(*analises)
+    finally:
+        for tarefa in analises:
+            tarefa.cancel()
 
-# Pipeline principal utilizado em /api/port-analysis para iniciar a varredura
-async def executar_analise(alvo, leak_analysis: bool = True, usuario: str | None = None):
-    """Executa a enumeração e análise, retornando apenas alertas de portas.
-    O processamento de softwares continua em background e pode ser
-    consultado depois via job_id."""
+    alertas, softwares = [], []
+    for alertas_lote, softwares_lote in resultados:
+        alertas.extend(alertas_lote)
+        softwares.extend(softwares_lote)
+    return contagem.get("subdominios", 0), ips, portas_abertas, alertas, softwares
 
-    global current_port_task, current_job_id
-    current_port_task = asyncio.current_task()  # Guarda tarefa atual
-    current_job_id = None
 
-    os.makedirs("data", exist_ok=True)  # Garante diretório temporário
+# Funcao utilizada pelo endpoint /api/cancel para abortar tarefas
+async def cancelar_job(job_id: str) -> bool:
+    """Cancela somente o job informado (fila, portas ou softwares)."""
+    return await GERENCIADOR_JOBS.cancelar(job_id)
+
+
+# Chamado via /api/cancel-current para interromper os scans do usuario
+async def cancelar_analise_atual(usuario: str | None = None) -> bool:
+    """Interrompe as análises em andamento ou na fila de ``usuario``."""
+    return await GERENCIADOR_JOBS.cancelar_do_usuario(usuario or "anonimo")
+
+
+# Usado por /api/jobs para enfileirar sem aguardar a fase de portas
+def submeter_analise(
+    alvo,
+    leak_analysis: bool = True,
+    usuario: str | None = None,
+    perfil_tls: str = PERFIL_TLS_PADRAO,
+    incremental: bool = False,
+    atualizar_dns: bool = False,
+    atualizar_vazamentos: bool = False,
+) -> Job | None:
+    """Valida o alvo e enfileira o scan no gerenciador de jobs."""
     dominio = extrair_dominio(alvo)  # Extrai dominio do alvo
-
     if not dominio:  # Valida entrada
-        return {"erro": "Entrada inválida."}
+        return None
 
-    job_id = str(uuid.uuid4())  # Identificador único
+    async def executar(job: Job):
+        return await _executar_scan(
+            job, dominio, leak_analysis, usuario, perfil_tls, incremental, atualizar_dns,
+            atualizar_vazamentos,
+        )
 
-    subs_path = os.path.join("data", f"{dominio}_subs.txt")  # Arquivo de subs
-    resolved_path = os.path.join("data", f"{dominio}_resolved.txt")  # DNS resolvido
-    iplist_path = os.path.join("data", f"{dominio}_iplist.txt")  # Lista de IPs
-    naabu_path = os.path.join("data", f"{dominio}_naabu.txt")  # Resultado do Naabu
+    return GERENCIADOR_JOBS.submeter(
+        usuario,
+        executar,
+        {"dominio": dominio, "tls_profile": perfil_tls, "incremental": incremental},
+    )
 
+
+# Pipeline principal utilizado em /api/port-analysis para iniciar a varredura
+async def executar_analise(
+    alvo,
+    leak_analysis: bool = True,
+    usuario: str | None = None,
+    perfil_tls: str = PERFIL_TLS_PADRAO,
+    incremental: bool = False,
+    atualizar_dns: bool = False,
+    atualizar_vazamentos: bool = False,
+):
+    """Enfileira o scan e aguarda a fase de portas, retornando seus alertas.
+    O processamento de softwares continua em background e pode ser
+    consultado depois via job_id. No perfil TLS ``deep`` os comandos
+    lentos rodam depois e atualizam o relatório ao terminar. Com
+    ``incremental``, hosts inalterados desde o último relatório reaproveitam
+    seus resultados. ``atualizar_dns`` ignora o cache de subdomínios/DNS e
+    ``atualizar_vazamentos`` busca vazamentos novos em vez de usar o cache."""
+    job = submeter_analise(
+        alvo, leak_analysis, usuario, perfil_tls, incremental, atualizar_dns, atualizar_vazamentos
+    )
+    if job is None:
+        return {"erro": "Entrada inválida."}
     try:
-        await run_subfinder(dominio, subs_path, resolved_path)  # Enumera subdomínios
-        num_subdominios = await contar_linhas(subs_path)  # Conta subdomínios
-        ips = await parse_dnsx(resolved_path)  # Lê IPs resolvidos
-        num_ips = len(ips)  # Total de IPs
-
-        if not ips:  # Nenhum IP resolvido
-            return {"erro": "Nenhum IP encontrado."}
-
-        await salvar_ips(ips, iplist_path)  # Salva lista de IPs
-        await run_naabu(iplist_path, naabu_path)  # Executa Naabu
-        portas_abertas = await parse_naabu(naabu_path)  # Lê portas abertas
-
-        alertas_portas, softwares = await avaliar_portas(portas_abertas)  # Avalia riscos de portas
-        port_score = calcular_score_portas(alertas_portas, num_ips)  # Score de portas
-
-        # Processamento paralelo de CVEs e vazamentos; ao terminar atualiza o dict `jobs`
-        # disparar software e leak analysis em background
-        async def processar_softwares():
-            if leak_analysis:  # Opcionalmente checa vazamentos
-                alertas_softwares, leak_res = await asyncio.gather(
-                    avaliar_softwares(softwares), verificar_vazamentos(dominio)
-                )
-            else:
-                alertas_softwares = await avaliar_softwares(softwares)
-                leak_res = {"num_emails": 0, "num_passwords": 0, "num_hashes": 0}
-            software_score = calcular_score_softwares(alertas_softwares)  # Score de software
-            leak_score = calcular_score_leaks(
-                leak_res.get("num_emails", 0),
-                leak_res.get("num_passwords", 0),
-                leak_res.get("num_hashes", 0),
-            )
+        return await asyncio.shield(job.resultado)
+    except asyncio.CancelledError:
+        if job.resultado.cancelled():  # job cancelado pelo usuário
+            return {"erro": "Análise cancelada.", "job_id": job.id}
+        GERENCIADOR_JOBS.cancelar_local(job)  # requisição abandonada: o scan não segue sozinho
+        raise
 
-            jobs[job_id]["software_alertas"] = [  # Lista de alertas de software
-                {
-                    "ip": a["ip"],
-                    "porta": a["porta"],
-                    "software": a["software"],
-                    "cve_id": a["cve_id"],
-                    "cvss": a["cvss"],
-                }
-                for a in alertas_softwares
-            ]
-            jobs[job_id]["software_score"] = software_score  # Guarda score
-            jobs[job_id]["leak_score"] = leak_score
-            jobs[job_id]["num_emails"] = leak_res.get("num_emails", 0)
-            jobs[job_id]["num_passwords"] = leak_res.get("num_passwords", 0)
-            jobs[job_id]["num_hashes"] = leak_res.get("num_hashes", 0)
-            jobs[job_id]["leaked_data"] = leak_res.get("leaked_data", [])
-
-            # Aplicar pesos e ignorar notas com score 1 (quando aplicável)
-            notas = []  # Notas individuais
-            pesos = []  # Pesos correspondentes
-
-            if port_score != 1:
-                notas.append(port_score)
-                pesos.append(2)
-
-            if software_score != 1:
-                notas.append(software_score)
-                pesos.append(1)
-
-            if leak_score != 1:
-                notas.append(leak_score)
-                pesos.append(1)
-
-            # Se todas foram 1, nota final é 1
-            if not notas:  # Se nenhuma nota, score final 1
-                final_score = 1
-            else:
-                final_score = round(sum(n * p for n, p in zip(notas, pesos)) / sum(pesos), 2)
-
-            jobs[job_id]["final_score"] = final_score
-
-            await salvar_relatorio_json(
-                {
-                    "dominio": dominio,
-                    "num_subdominios": num_subdominios,
-                    "num_ips": num_ips,
-                    "port_alertas": jobs[job_id]["port_alertas"],
-                    "software_alertas": jobs[job_id]["software_alertas"],
-                    "port_score": port_score,
-                    "software_score": software_score,
-                    "leak_score": leak_score,
-                    "num_emails": leak_res.get("num_emails", 0),
-                    "num_passwords": leak_res.get("num_passwords", 0),
-                    "num_hashes": leak_res.get("num_hashes", 0),
-                    "leaked_data": leak_res.get("leaked_data", []),
-                    "final_score": jobs[job_id]["final_score"],
-                },
-                usuario,
-            )
-            limpar_pasta_data()  # Remove arquivos temporários
-            await close_http_client()  # Fecha cliente HTTP
 
-        jobs[job_id] = {  # Informacoes iniciais do job
+async def _executar_scan(
+    job: Job,
+    dominio,
+    leak_analysis,
+    usuario,
+    perfil_tls,
+    incremental=False,
+    atualizar_dns=False,
+    atualizar_vazamentos=False,
+):
+    """Fase de portas de um job; dispara softwares/vazamentos em background."""
+    anterior = (await carregar_snapshot(dominio) or {}) if incremental else None
+    hosts = {}  # ip -> registro do snapshot deste scan
+    enumeracao = {}  # instantes em que subdomínios e registros A foram obtidos
+    (
+        num_subdominios,  # Subdomínios enumerados
+        ips,  # IPs resolvidos
+        portas_abertas,  # Portas abertas por IP
+        alertas_portas,  # Riscos de portas
+        softwares,  # Softwares identificados (só dos hosts reanalisados)
+    ) = await varrer_em_fluxo(dominio, perfil_tls, anterior, hosts, atualizar_dns, enumeracao)
+    num_ips = len(ips)  # Total de IPs
+    reaproveitados = {ip for ip, h in hosts.items() if h["reaproveitado"]}
+
+    if not ips:  # Nenhum IP resolvido
+        job.finalizar("erro", "Nenhum IP encontrado.")
+        return {"erro": "Nenhum IP encontrado."}
+
+    port_score = calcular_score_portas(alertas_portas, num_ips)  # Score de portas
+    dados = job.dados
+    subdominios_em = datetime.utcfromtimestamp(enumeracao["subdominios_em"])
+    resolucao_em = datetime.utcfromtimestamp(enumeracao["resolucao_em"])
+
+    # Processamento paralelo de CVEs e vazamentos; ao terminar atualiza os dados do job
+    async def processar_softwares():
+        if leak_analysis:  # Opcionalmente checa vazamentos
+            alertas_softwares, leak_res = await asyncio.gather(
+                avaliar_softwares(softwares), verificar_vazamentos(dominio, atualizar_vazamentos)
+            )
+        else:
+            alertas_softwares = await avaliar_softwares(softwares)
+            leak_res = {"num_emails": 0, "num_passwords": 0, "num_hashes": 0}
+        for ip, host in hosts.items():  # CVEs de cada host para o próximo snapshot
+            if ip not in reaproveitados:
+                host["cves"] = [a for a in alertas_softwares if a["ip"] == ip]
+        if reaproveitados:  # hosts inalterados mantêm as CVEs do scan anterior
+            alertas_softwares = sorted(
+                alertas_softwares + [a for ip in reaproveitados for a in hosts[ip]["cves"]],
+                key=lambda a: a.get("cvss") or 0,
+                reverse=True,
+            )
+        software_score = calcular_score_softwares(alertas_softwares)  # Score de software
+        leak_score = calcular_score_leaks(
+            leak_res.get("num_emails", 0),
+            leak_res.get("num_passwords", 0),
+            leak_res.get("num_hashes", 0),
+        )
+
+        dados["software_alertas"] = [  # Lista de alertas de software
+            {
+                "ip": a["ip"],
+                "porta": a["porta"],
+                "software": a["software"],
+                "cve_id": a["cve_id"],
+                "cvss": a["cvss"],
+            }
+            for a in alertas_softwares
+        ]
+        dados["software_score"] = software_score  # Guarda score
+        dados["leak_score"] = leak_score
+        dados["num_emails"] = leak_res.get("num_emails", 0)
+        dados["num_passwords"] = leak_res.get("num_passwords", 0)
+        dados["num_hashes"] = leak_res.get("num_hashes", 0)
+        dados["leaked_data"] = leak_res.get("leaked_data", [])
+        if leak_analysis:  # consulta parcial ou com falha fica visível no resultado
+            dados["vazamentos"] = {
+                "total": leak_res.get("total", 0),
+                "completo": leak_res.get("completo", False),
+                "erro": leak_res.get("erro"),
+                "consultado_em": leak_res["vazamentos_em"].isoformat(),  # idade do cache
+                "em_cache": leak_res.get("em_cache", False),
+            }
+
+        # Aplicar pesos e ignorar notas com score 1 (quando aplicável)
+        dados["final_score"] = calcular_score_final(port_score, software_score, leak_score)
+        publicar("score", {
+            "port_score": port_score,
+            "software_score": software_score,
+            "leak_score": leak_score,
+            "final_score": dados["final_score"],
+            "parcial": False,
+        })
+
+        await salvar_relatorio_json(
+            {
+                "dominio": dominio,
+                "num_subdominios": num_subdominios,
+                "num_ips": num_ips,
+                "port_alertas": dados["port_alertas"],
+                "software_alertas": dados["software_alertas"],
+                "port_score": port_score,
+                "software_score": software_score,
+                "leak_score": leak_score,
+                "num_emails": leak_res.get("num_emails", 0),
+                "num_passwords": leak_res.get("num_passwords", 0),
+                "num_hashes": leak_res.get("num_hashes", 0),
+                "leaked_data": leak_res.get("leaked_data", []),
+                "final_score": dados["final_score"],
+                "subdominios_em": subdominios_em,
+                "resolucao_em": resolucao_em,
+                "vazamentos_em": leak_res.get("vazamentos_em"),
+                "snapshot": {
+                    ip: {k: v for k, v in h.items() if k != "reaproveitado"}
+                    for ip, h in hosts.items()
+                },
+            },
+            usuario,
+        )
+        publicar("resultado", montar_resultado(dados))
+        job.finalizar("concluido")
+
+    dados.update(  # Informacoes iniciais do job
+        {
             "software_alertas": None,
             "dominio": dominio,
             "port_score": port_score,
             "num_subdominios": num_subdominios,
             "num_ips": num_ips,
+            "enumeracao": {  # idade dos dados de DNS usados (cache por domínio)
+                "subdominios_em": subdominios_em.isoformat(),
+                "resolucao_em": resolucao_em.isoformat(),
+            },
             "leak_score": None,
             "num_emails": 0,
             "num_passwords": 0,
@@ -268,52 +434,193 @@ async def executar_analise(alvo, leak_analysis: bool = True, usuario: str | None
                 for ip, porta, msg in alertas_portas
             ],
         }
-        task = asyncio.create_task(processar_softwares())  # Dispara processamento
-        jobs[job_id]["task"] = task  # Salva ref da task
-        current_job_id = job_id
-
-        return {  # Retorno imediato
-            "job_id": job_id,
-            "dominio": dominio,
-            "ips_com_portas": portas_abertas,
-            "alertas": jobs[job_id]["port_alertas"],
-            "port_score": port_score,
-            "num_subdominios": num_subdominios,
-            "num_ips": num_ips,
+    )
+    if incremental:  # diferença em relação ao último relatório
+        dados["incremental"] = {
+            "reaproveitados": len(reaproveitados),
+            "reanalisados": len(hosts) - len(reaproveitados),
+            "novos": sorted(ip for ip in hosts if ip not in anterior),
+            "removidos": sorted(ip for ip in anterior if ip not in portas_abertas),
         }
-    except asyncio.CancelledError:
-        limpar_pasta_data()  # Limpa caso cancelado
-        if current_job_id:
-            cancelar_job(current_job_id)  # Cancela job pendente
-        raise
-    finally:
-        current_port_task = None
-        current_job_id = None
-        await close_http_client()
+    if perfil_tls == "deep":  # ROBOT e demais comandos lentos em segundo plano
+        dados["tls_adiado"] = "pendente"
+    resposta = {  # Retorno imediato
+        "job_id": job.id,
+        "dominio": dominio,
+        "ips_com_portas": portas_abertas,
+        "alertas": dados["port_alertas"],
+        "port_score": port_score,
+        "num_subdominios": num_subdominios,
+        "num_ips": num_ips,
+        "incremental": dados.get("incremental"),
+        "enumeracao": dados["enumeracao"],
+    }
+    publicar("portas", {**resposta, "alertas": list(dados["port_alertas"])})  # fim da fase de portas
+    job.avancar("softwares")
+    task = asyncio.create_task(processar_softwares())  # Dispara processamento
+    task.add_done_callback(lambda t: _registrar_falha(job, t))
+    GERENCIADOR_JOBS.acompanhar(job, "softwares", task)  # Salva ref da task
+    if perfil_tls == "deep":
+        GERENCIADOR_JOBS.acompanhar(
+            job,
+            "tls",
+            asyncio.create_task(
+                processar_tls_adiado(
+                    job,
+                    dominio,
+                    {ip: p for ip, p in portas_abertas.items() if ip not in reaproveitados},
+                    num_ips,
+                    task,
+                )
+            ),
+        )
+
+    return resposta
+
+
+def _registrar_falha(job: Job, tarefa: asyncio.Task) -> None:
+    """Marca o job como falho se a fase de softwares levantar exceção."""
+    if not tarefa.cancelled() and tarefa.exception() is not None:
+        print(f"[JOB] Fase de softwares de {job.id} falhou: {tarefa.exception()}")
+        job.finalizar("erro", "Falha na análise de softwares.")
+
+
+# Fase posterior do perfil TLS "deep"
+async def processar_tls_adiado(job: Job, dominio, portas_abertas, num_ips, tarefa_softwares):
+    """Executa a fase TLS adiada e acrescenta os alertas ao job e ao relatório."""
+    novos = await avaliar_tls_adiado(portas_abertas)
+    novos = [{"ip": ip, "porta": porta, "mensagem": msg} for ip, porta, msg in novos]
+    job.dados["port_alertas"].extend(novos)
+    job.dados["tls_adiado"] = "concluido"
+    publicar("tls_adiado", {"estado": "concluido", "alertas": novos})
+    try:
+        await tarefa_softwares  # relatório já persistido pela fase de softwares
+    except (asyncio.CancelledError, Exception):
+        return
+    if novos:
+        await acrescentar_alertas_portas(dominio, novos, num_ips)
+    print(f"[TLS] Fase adiada de {dominio} concluída com {len(novos)} alertas")
+
+
+async def acrescentar_alertas_portas(dominio: str, novos: list[dict], num_ips: int) -> None:
+    """Acrescenta alertas de porta a um relatório salvo e recalcula as notas."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Report).where(Report.dominio == dominio))
+        report = result.scalars().first()
+        if not report:
+            return
+        vistos = {(a["ip"], a["porta"], a["mensagem"]) for a in report.port_alertas or []}
+        alertas = list(report.port_alertas or []) + [
+            a for a in novos if (a["ip"], a["porta"], a["mensagem"]) not in vistos
+        ]
+        report.port_alertas = alertas  # nova lista para o SQLAlchemy detectar a mudança
+        if report.snapshot:  # hosts reaproveitados no próximo scan mantêm estes alertas
+            snapshot = dict(report.snapshot)
+            for a in novos:
+                host = snapshot.get(a["ip"])
+                if host is not None and [a["porta"], a["mensagem"]] not in host["alertas"]:
+                    snapshot[a["ip"]] = {**host, "alertas": host["alertas"] + [[a["porta"], a["mensagem"]]]}
+            report.snapshot = snapshot
+        report.port_score = calcular_score_portas(
+            [(a["ip"], a["porta"], a["mensagem"]) for a in alertas], num_ips
+        )
+        report.final_score = calcular_score_final(
+            report.port_score,
+            1 if report.software_score is None else report.software_score,
+            1 if report.leak_score is None else report.leak_score,
+        )
+        await session.commit()
 
 
 # Chamado pelo endpoint /api/software-analysis para obter o resultado final
 async def consultar_software_alertas(job_id: str):
     """Retorna resultados de CVEs quando estiverem prontos."""
-    job = jobs.get(job_id)  # Recupera job
-    if not job:  # Não localizado
+    registro = await GERENCIADOR_JOBS.ler(job_id)  # Recupera job de qualquer worker
+    if not registro:  # Não localizado ou expirado
         return {"erro": "Job não encontrado"}
-    if job["software_alertas"] is None:  # Ainda processando
-        return {"status": "pendente", "port_score": job.get("port_score")}
-    result = {
-        "alertas": job["software_alertas"],
-        "dominio": job["dominio"],
-        "port_score": job.get("port_score"),
-        "software_score": job.get("software_score"),
-        "leak_score": job.get("leak_score"),
-        "final_score": job.get("final_score"),
-        "num_subdominios": job.get("num_subdominios"),
-        "num_ips": job.get("num_ips"),
-        "num_emails": job.get("num_emails", 0),
-        "num_passwords": job.get("num_passwords", 0),
-        "num_hashes": job.get("num_hashes", 0),
-        "port_alertas": job.get("port_alertas"),
-        "leaked_data": job.get("leaked_data", []),
-    }
-    jobs.pop(job_id, None)  # Remove da memoria, ja persistido em banco
+    job = registro["dados"]
+    if job.get("software_alertas") is None:  # Ainda processando
+        if registro["estado"] in ("erro", "cancelado"):
+            await GERENCIADOR_JOBS.remover(job_id)
+            return {"erro": registro["erro"] or "Análise cancelada.", "estado": registro["estado"]}
+        return {
+            "status": "pendente",
+            "estado": registro["estado"],
+            "posicao": registro["posicao"],
+            "port_score": job.get("port_score"),
+        }
+    result = montar_resultado(job)
+    if job.get("tls_adiado") != "pendente":  # fase TLS adiada ainda atualiza o job
+        await GERENCIADOR_JOBS.remover(job_id)  # Ja persistido em reports
     return result
+
+
+def montar_resultado(dados: dict) -> dict:
+    """Resultado final de um job, como entregue pela API e pelo evento ``resultado``.
+    As credenciais vazadas não fazem parte dele: só as contagens e o resumo
+    ``vazamentos``; a lista fica em ``/api/reports/{dominio}/leaks``."""
+    return {
+        "alertas": list(dados["software_alertas"] or []),  # cópias: o evento não muda depois
+        "dominio": dados["dominio"],
+        "port_score": dados.get("port_score"),
+        "software_score": dados.get("software_score"),
+        "leak_score": dados.get("leak_score"),
+        "final_score": dados.get("final_score"),
+        "num_subdominios": dados.get("num_subdominios"),
+        "num_ips": dados.get("num_ips"),
+        "num_emails": dados.get("num_emails", 0),
+        "num_passwords": dados.get("num_passwords", 0),
+        "num_hashes": dados.get("num_hashes", 0),
+        "port_alertas": list(dados.get("port_alertas") or []),  # a fase TLS adiada estende a lista do job
+        "tls_adiado": dados.get("tls_adiado"),
+        "incremental": dados.get("incremental"),
+        "enumeracao": dados.get("enumeracao"),
+        "vazamentos": dados.get("vazamentos"),
+    }
+
+
+# Usado por /api/jobs/{job_id}/eventos para transmitir o progresso
+async def eventos_do_job(job_id: str, desde: int = 0):
+    """Gera ``(seq, tipo, dados)`` do job a partir de ``desde`` e termina com
+    ``fim``. ``None`` indica intervalo sem eventos (keep-alive).
+
+    Jobs deste processo são transmitidos do seu canal de eventos, com
+    histórico; para jobs de outro worker (ou já descartados da memória) o
+    estado e o resultado são lidos periodicamente do armazenamento.
+    """
+    job = GERENCIADOR_JOBS.obter(job_id)
+    seq = desde
+    if job is not None:
+        async for evento in job.eventos.assinar(desde, EVENTOS_HEARTBEAT):
+            if evento is not None:
+                seq = evento[0]
+            yield evento
+        yield (seq + 1, "fim", {})
+        return
+
+    estado = resultado = None
+    while True:
+        registro = await GERENCIADOR_JOBS.ler(job_id)
+        if registro is None:
+            yield (seq + 1, "erro", {"erro": "Job não encontrado"})
+            return
+        dados = registro["dados"]
+        if registro["estado"] != estado:
+            estado = registro["estado"]
+            seq += 1
+            yield (seq, "estado", {"estado": estado, "erro": registro["erro"]})
+        if dados.get("software_alertas") is not None and resultado is None:
+            resultado = montar_resultado(dados)
+            seq += 1
+            yield (seq, "resultado", resultado)
+        if estado in ("erro", "cancelado") or (
+            resultado is not None and dados.get("tls_adiado") != "pendente"
+        ):
+            if resultado is not None and resultado.get("tls_adiado") == "pendente":
+                seq += 1  # fase TLS adiada terminou depois do resultado
+                novos = (dados.get("port_alertas") or [])[len(resultado["port_alertas"] or []):]
+                yield (seq, "tls_adiado", {"estado": dados.get("tls_adiado"), "alertas": novos})
+            yield (seq + 1, "fim", {})
+            return
+        await asyncio.sleep(EVENTOS_POLL)
+        yield None
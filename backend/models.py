@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 
 from database import Base
@@ -33,12 +33,26 @@ class Report(Base):
     num_emails = Column(Integer)
     num_passwords = Column(Integer)
     num_hashes = Column(Integer)
-    leaked_data = Column(JSONB)
+    leaked_data = deferred(Column(JSONB))  # legado: credenciais ficam em leaked_credentials
     final_score = Column(Float)
+    subdominios_em = Column(DateTime)  # quando a lista de subdomínios usada foi obtida
+    resolucao_em = Column(DateTime)  # quando os registros A usados foram resolvidos
+    vazamentos_em = Column(DateTime)  # quando os vazamentos usados foram consultados
+    snapshot = Column(JSONB)  # ip -> portas, assinaturas, alertas e CVEs do último scan
 
     chamados = relationship("Chamado", back_populates="report", cascade="all, delete-orphan")
 
 
+class LeakedCredential(Base):
+    __tablename__ = "leaked_credentials"
+
+    id = Column(Integer, primary_key=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), index=True, nullable=False)
+    email = Column(String)
+    password = Column(String)
+    hash = Column(String)
+
+
 class Chamado(Base):
     __tablename__ = "chamados"
 
@@ -61,4 +75,48 @@ class TempPassword(Base):
     hash = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     used = Column(Boolean, default=False)
-    expires_at = Column(DateTime, nullable=True)
\ No newline at end of file
+    expires_at = Column(DateTime, nullable=True)
+
+
+class CacheEntry(Base):
+    __tablename__ = "cache_entries"
+
+    namespace = Column(String, primary_key=True)
+    chave = Column(String, primary_key=True)
+    valor = Column(JSONB)
+    geracao = Column(String, default="")
+    expira_em = Column(DateTime, index=True)
+
+
+class ScanJob(Base):
+    __tablename__ = "scan_jobs"
+
+    job_id = Column(String, primary_key=True)
+    usuario = Column(String, index=True)
+    estado = Column(String)
+    resumo = Column(JSONB)  # estado, instantes e descrição do scan
+    dados = Column(JSONB)  # resultados consultados por /api/software-analysis
+    cancelar = Column(Boolean, default=False)  # pedido de cancelamento vindo de outro worker
+    atualizado_em = Column(DateTime, default=datetime.utcnow, index=True)
+    expira_em = Column(DateTime, index=True)
+
+
+class NaabuRun(Base):
+    __tablename__ = "naabu_runs"
+
+    id = Column(Integer, primary_key=True)
+    iniciado_em = Column(DateTime, default=datetime.utcnow, index=True)
+    num_ips = Column(Integer)
+    rate = Column(Integer)  # pacotes/s usados
+    timeout_ms = Column(Integer)  # espera por porta usada
+    retries = Column(Integer)
+    limite = Column(Integer)  # segundos permitidos ao processo
+    duracao = Column(Float)  # segundos
+    ips_por_seg = Column(Float)  # vazão alcançada
+    portas_abertas = Column(Integer)
+    portas_conhecidas = Column(Integer)  # abertas na varredura recente anterior dos mesmos IPs
+    portas_perdidas = Column(Integer)  # conhecidas que não apareceram nesta execução
+    completo = Column(Boolean)  # terminou sem erro nem tempo esgotado
+    rate_seguinte = Column(Integer)  # estado do controle após esta execução
+    timeout_seguinte = Column(Integer)
+    seg_por_ip = Column(Float)
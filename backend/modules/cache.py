@@ -0,0 +1,163 @@
+# Caches compartilhados entre scans. ``TTLCache`` vive na memória do
+# processo (LRU com expiração por entrada) e registra acertos/erros para
+# dimensionamento. As funções ``*_compartilhado`` persistem pares
+# chave/valor na tabela ``cache_entries`` do PostgreSQL, permitindo que
+# vários workers e reinícios aproveitem o mesmo resultado.
+
+import os  # variáveis de ambiente
+import time  # relógio monotônico para expiração
+from collections import OrderedDict  # ordem de uso para o LRU
+from datetime import datetime, timedelta  # expiração persistida no banco
+
+from sqlalchemy import delete, or_  # remoção de entradas expiradas
+from sqlalchemy.dialects.postgresql import insert  # upsert em lote
+from sqlalchemy.future import select  # consultas assíncronas
+
+from database import AsyncSessionLocal  # sessão assíncrona do banco
+from models import CacheEntry  # tabela genérica de cache
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory" ou "postgres"
+
+_CACHES: dict[str, "TTLCache"] = {}  # registro para exposição das estatísticas
+
+
+class TTLCache:
+    """LRU limitado a ``max_itens`` com validade de ``ttl`` segundos
+    (``None`` desativa a expiração)."""
+
+    def __init__(self, nome: str, max_itens: int, ttl: float | None = None):
+        self.nome = nome
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._dados: OrderedDict = OrderedDict()  # chave -> (expira_em, valor)
+        _CACHES[nome] = self
+
+    def __len__(self):
+        return len(self._dados)
+
+    def get(self, chave, default=None):
+        """Retorna o valor e o marca como recém-usado."""
+        item = self._dados.get(chave)
+        if item is not None:
+            expira_em, valor = item
+            if expira_em is None or expira_em > time.monotonic():
+                self._dados.move_to_end(chave)
+                self.hits += 1
+                return valor
+            del self._dados[chave]  # expirado
+        self.misses += 1
+        return default
+
+    def set(self, chave, valor) -> None:
+        expira_em = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._dados[chave] = (expira_em, valor)
+        self._dados.move_to_end(chave)
+        while len(self._dados) > self.max_itens:  # descarta o menos usado
+            self._dados.popitem(last=False)
+
+    def pop(self, chave, default=None):
+        item = self._dados.pop(chave, None)
+        return item[1] if item is not None else default
+
+    def limpar(self) -> None:
+        self._dados.clear()
+
+    def itens(self):
+        """Pares (chave, valor) ainda válidos, do menos ao mais usado."""
+        agora = time.monotonic()
+        return [
+            (chave, valor)
+            for chave, (expira_em, valor) in self._dados.items()
+            if expira_em is None or expira_em > agora
+        ]
+
+    def estatisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "itens": len(self._dados),
+            "max_itens": self.max_itens,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / total, 4) if total else None,
+        }
+
+
+def estatisticas_caches() -> dict:
+    """Contadores de todos os caches do processo, por nome."""
+    return {nome: cache.estatisticas() for nome, cache in _CACHES.items()}
+
+
+async def ler_compartilhado(namespace: str, chaves: list[str], geracao: str = "") -> dict:
+    """Lê do PostgreSQL as chaves válidas da ``geracao`` informada.
+    Falhas do banco contam como ausência no cache."""
+    if not chaves:
+        return {}
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(CacheEntry.chave, CacheEntry.valor).where(
+                    CacheEntry.namespace == namespace,
+                    CacheEntry.chave.in_(chaves),
+                    CacheEntry.geracao == geracao,
+                    CacheEntry.expira_em > datetime.utcnow(),
+                )
+            )
+            return {chave: valor for chave, valor in result.all()}
+    except Exception as exc:
+        print(f"[ERRO] Falha ao ler cache compartilhado {namespace}: {exc}")
+        return {}
+
+
+async def gravar_compartilhado(
+    namespace: str, itens: dict, ttl: float, geracao: str = ""
+) -> None:
+    """Insere ou atualiza as entradas em lote. Uma falha do banco só é
+    registrada: o resultado já calculado segue valendo para quem chamou."""
+    if not itens:
+        return
+    expira_em = datetime.utcnow() + timedelta(seconds=ttl)
+    stmt = insert(CacheEntry).values(
+        [
+            {
+                "namespace": namespace,
+                "chave": chave,
+                "valor": valor,
+                "geracao": geracao,
+                "expira_em": expira_em,
+            }
+            for chave, valor in itens.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CacheEntry.namespace, CacheEntry.chave],
+        set_={
+            "valor": stmt.excluded.valor,
+            "geracao": stmt.excluded.geracao,
+            "expira_em": stmt.excluded.expira_em,
+        },
+    )
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as exc:
+        print(f"[ERRO] Falha ao gravar cache compartilhado {namespace}: {exc}")
+
+
+async def limpar_compartilhado(namespace: str, geracao: str | None = None) -> None:
+    """Remove entradas expiradas ou de outra geração (todas se ``None``).
+    Uma falha do banco só é registrada: a leitura já ignora outras gerações."""
+    condicao = CacheEntry.namespace == namespace
+    if geracao is not None:
+        condicao = condicao & or_(
+            CacheEntry.geracao != geracao, CacheEntry.expira_em <= datetime.utcnow()
+        )
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(CacheEntry).where(condicao))
+            await session.commit()
+    except Exception as exc:
+        print(f"[ERRO] Falha ao limpar cache compartilhado {namespace}: {exc}")
@@ -0,0 +1,86 @@
+# Varredura de portas por TCP connect em asyncio puro. Não precisa de root nem
+# de binários externos, e por isso serve de alternativa ao Naabu (SYN scan) em
+# hosts sem ``sudo naabu`` ou como fallback quando ele falha. Recebe a mesma
+# lista de IPs e de portas e gera ``{ip: [portas]}``, o formato montado a
+# partir de ``parse_naabu``. Um semáforo global limita as conexões abertas
+# ao mesmo tempo no processo (somando todos os scans), e cada host tem um
+# limite próprio de conexões simultâneas e um intervalo mínimo entre elas.
+
+import asyncio  # conexões concorrentes
+import os  # parâmetros via variáveis de ambiente
+
+CONNECT_CONCURRENCY = int(os.getenv("CONNECT_CONCURRENCY", "500"))  # conexões simultâneas no processo
+CONNECT_POR_HOST = int(os.getenv("CONNECT_POR_HOST", "10"))  # conexões simultâneas por host
+CONNECT_INTERVALO = float(os.getenv("CONNECT_INTERVALO", "0.01"))  # segundos entre conexões ao mesmo host
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "2"))  # segundos de espera pelo handshake
+CONNECT_RETRIES = int(os.getenv("CONNECT_RETRIES", "1"))  # novas tentativas de portas sem resposta
+CONNECT_MAX_RUN = int(os.getenv("CONNECT_MAX_RUN", "1800"))  # segundos, limite de uma varredura
+
+_limite_global = asyncio.Semaphore(CONNECT_CONCURRENCY)  # compartilhado por todos os scans
+
+
+async def _porta_aberta(ip: str, porta: int) -> bool:
+    """Completa o handshake TCP com ``ip:porta``. Conexão recusada ou host
+    inalcançável encerram na hora; sem resposta (filtrada ou pacote perdido),
+    tenta de novo até ``CONNECT_RETRIES`` vezes."""
+    for _ in range(CONNECT_RETRIES + 1):
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, porta), timeout=CONNECT_TIMEOUT
+            )
+        except asyncio.TimeoutError:  # antes de OSError: é subclasse dele no 3.11+
+            continue
+        except OSError:
+            return False
+        writer.transport.abort()  # RST imediato, sem esperar o FIN
+        return True
+    return False
+
+
+async def _testar(ip: str, porta: int, por_host: asyncio.Semaphore, abertas: dict) -> None:
+    try:
+        async with _limite_global:
+            if await _porta_aberta(ip, porta):
+                abertas.setdefault(ip, []).append(porta)
+    finally:
+        por_host.release()
+
+
+async def _varrer_host(ip: str, portas: list[int], abertas: dict) -> None:
+    """Dispara as portas de ``ip`` em ordem, respeitando o limite e o
+    intervalo por host."""
+    por_host = asyncio.Semaphore(CONNECT_POR_HOST)
+    tarefas = []
+    try:
+        for porta in portas:
+            await por_host.acquire()
+            tarefas.append(asyncio.create_task(_testar(ip, porta, por_host, abertas)))
+            if CONNECT_INTERVALO:
+                await asyncio.sleep(CONNECT_INTERVALO)
+        await asyncio.gather(*tarefas)
+    finally:
+        for tarefa in tarefas:  # cancelamento ou timeout não deixam conexões soltas
+            tarefa.cancel()
+
+
+async def escanear_connect(
+    ips: list[str], ports, timeout: int | None = None
+) -> tuple[dict[str, list[int]], bool]:
+    """Portas abertas de cada IP de ``ips`` (apenas IPs com alguma porta) e
+    se a varredura terminou dentro de ``timeout`` (padrão ``CONNECT_MAX_RUN``).
+    Em caso de timeout, retorna o que já foi encontrado."""
+    portas = [int(p) for p in ports]
+    abertas: dict[str, list[int]] = {}
+    print(f"[Connect] Escaneando lote de {len(ips)} IPs")
+    completo = True
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(_varrer_host(ip, portas, abertas) for ip in ips)),
+            timeout=timeout or CONNECT_MAX_RUN,
+        )
+    except asyncio.TimeoutError:
+        print(f"[ERRO] Varredura connect excedeu {timeout or CONNECT_MAX_RUN}s")  # mantém o parcial
+        completo = False
+    for ip in abertas:
+        abertas[ip].sort()
+    return abertas, completo
@@ -0,0 +1,152 @@
+# Controle adaptativo dos parâmetros do Naabu. A taxa de envio (``-rate``) e
+# a espera por resposta (``-timeout``) seguem um AIMD: sobem aos poucos
+# enquanto as execuções terminam sem perda e caem pela metade quando há
+# perda. Como o Naabu não informa retransmissões na saída JSON, a perda é
+# medida pelas portas que estavam abertas em uma varredura recente do mesmo
+# IP e não apareceram agora, além de execuções abortadas por tempo. O tempo
+# limite do processo é dimensionado pela quantidade de IPs e pela duração
+# por IP observada. Cada execução fica registrada na tabela ``naabu_runs``.
+
+import asyncio  # gravação do histórico em segundo plano
+import os  # limites definidos pelo operador
+from datetime import datetime, timedelta  # instante gravado no histórico
+
+from sqlalchemy.future import select  # última execução registrada
+
+from database import AsyncSessionLocal  # sessão assíncrona do banco
+from models import NaabuRun  # histórico das execuções
+from modules.cache import TTLCache  # portas vistas recentemente por IP
+
+NAABU_RATE_MIN = int(os.getenv("NAABU_RATE_MIN", "100"))  # pacotes/s
+NAABU_RATE_MAX = int(os.getenv("NAABU_RATE_MAX", "2000"))  # pacotes/s
+NAABU_RATE_INICIAL = int(os.getenv("NAABU_RATE_INICIAL", "500"))  # pacotes/s sem histórico
+NAABU_RATE_PASSO = int(os.getenv("NAABU_RATE_PASSO", "100"))  # aumento por execução sem perda
+NAABU_TIMEOUT_MIN = int(os.getenv("NAABU_TIMEOUT_MIN", "1000"))  # ms de espera por porta
+NAABU_TIMEOUT_MAX = int(os.getenv("NAABU_TIMEOUT_MAX", "8000"))  # ms de espera por porta
+NAABU_RETRIES = int(os.getenv("NAABU_RETRIES", "2"))  # tentativas por porta
+NAABU_PERDA_MAX = float(os.getenv("NAABU_PERDA_MAX", "0.05"))  # fração de portas perdidas tolerada
+NAABU_MAX_RUN = int(os.getenv("NAABU_MAX_RUN", "1800"))  # segundos, limite de uma execução
+NAABU_MIN_RUN = 60  # segundos, piso do tempo limite do processo
+AMOSTRA_MINIMA = 5  # portas conhecidas necessárias para estimar a perda
+
+
+class ControleNaabu:
+    """Escolhe os parâmetros de cada execução e aprende com o resultado."""
+
+    def __init__(self):
+        self.rate = min(max(NAABU_RATE_INICIAL, NAABU_RATE_MIN), NAABU_RATE_MAX)
+        self.timeout_ms = NAABU_TIMEOUT_MAX  # começa conservador
+        self.seg_por_ip: float | None = None  # média móvel da duração por IP
+        self._conhecidas = TTLCache("naabu_conhecidas", 100000, 86400)  # chave -> portas abertas
+        self._carregado = False
+        self._gravacoes: set[asyncio.Task] = set()  # gravações do histórico ainda em curso
+        self.vez = asyncio.Lock()  # uma execução por vez: ``rate`` é o total enviado pelo processo
+
+    async def _carregar(self) -> None:
+        """Retoma o estado da última execução registrada (ex.: após reinício)."""
+        self._carregado = True
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(NaabuRun).order_by(NaabuRun.id.desc()).limit(1)
+                )
+                ultima = result.scalars().first()
+        except Exception as exc:
+            print(f"[NAABU] Histórico indisponível: {exc}")
+            return
+        if ultima is not None:
+            self.rate = min(max(ultima.rate_seguinte, NAABU_RATE_MIN), NAABU_RATE_MAX)
+            self.timeout_ms = min(max(ultima.timeout_seguinte, NAABU_TIMEOUT_MIN), NAABU_TIMEOUT_MAX)
+            self.seg_por_ip = ultima.seg_por_ip
+
+    async def parametros(self, num_ips: int, num_portas: int) -> dict:
+        """Parâmetros da próxima execução para ``num_ips`` IPs."""
+        if not self._carregado:
+            await self._carregar()
+        tentativas = NAABU_RETRIES + 1
+        if self.seg_por_ip is not None:
+            estimativa = self.seg_por_ip * num_ips
+        else:  # envio dos pacotes + espera pelas respostas de cada tentativa
+            estimativa = num_ips * num_portas * tentativas / self.rate
+            estimativa += tentativas * self.timeout_ms / 1000
+        return {
+            "rate": self.rate,
+            "timeout_ms": self.timeout_ms,
+            "retries": NAABU_RETRIES,
+            "limite": int(min(NAABU_MAX_RUN, max(NAABU_MIN_RUN, 3 * estimativa + 30))),
+        }
+
+    def registrar(
+        self, params: dict, chaves: dict, resultados: dict, duracao: float, completo: bool
+    ) -> dict:
+        """Ajusta o estado pelo resultado e retorna o registro da execução.
+
+        ``chaves`` mapeia cada IP enviado à sua chave (IP + lista de portas).
+        """
+        conhecidas = perdidas = 0
+        for ip, chave in chaves.items():
+            anteriores = self._conhecidas.get(chave)
+            atuais = resultados.get(ip, [])
+            if anteriores:
+                conhecidas += len(anteriores)
+                perdidas += len(set(anteriores) - set(atuais))
+            if completo:
+                self._conhecidas.set(chave, list(atuais))
+        perda = perdidas / conhecidas if conhecidas >= AMOSTRA_MINIMA else None
+
+        if not completo or (perda is not None and perda > NAABU_PERDA_MAX):
+            self.rate = max(NAABU_RATE_MIN, self.rate // 2)  # redução multiplicativa
+            self.timeout_ms = min(NAABU_TIMEOUT_MAX, int(self.timeout_ms * 1.5))
+        else:
+            self.rate = min(NAABU_RATE_MAX, self.rate + NAABU_RATE_PASSO)  # aumento aditivo
+            if perda is not None:  # só encurta a espera com evidência de que nada se perdeu
+                self.timeout_ms = max(NAABU_TIMEOUT_MIN, int(self.timeout_ms * 0.9))
+        if completo and chaves:
+            amostra = duracao / len(chaves)
+            self.seg_por_ip = amostra if self.seg_por_ip is None else 0.7 * self.seg_por_ip + 0.3 * amostra
+
+        print(
+            f"[NAABU] {len(chaves)} IPs em {duracao:.1f}s (rate {params['rate']}, "
+            f"timeout {params['timeout_ms']}ms, perda {'-' if perda is None else f'{perda:.1%}'}) "
+            f"-> rate {self.rate}, timeout {self.timeout_ms}ms"
+        )
+        return {
+            "iniciado_em": datetime.utcnow() - timedelta(seconds=duracao),
+            "num_ips": len(chaves),
+            "rate": params["rate"],
+            "timeout_ms": params["timeout_ms"],
+            "retries": params["retries"],
+            "limite": params["limite"],
+            "duracao": round(duracao, 3),
+            "ips_por_seg": round(len(chaves) / duracao, 3) if duracao else None,
+            "portas_abertas": sum(len(p) for p in resultados.values()),
+            "portas_conhecidas": conhecidas,
+            "portas_perdidas": perdidas,
+            "completo": completo,
+            "rate_seguinte": self.rate,
+            "timeout_seguinte": self.timeout_ms,
+            "seg_por_ip": self.seg_por_ip,
+        }
+
+    async def gravar(self, execucao: dict) -> None:
+        """Acrescenta a execução ao histórico ``naabu_runs``."""
+        try:
+            async with AsyncSessionLocal() as session:
+                session.add(NaabuRun(**execucao))
+                await session.commit()
+        except Exception as exc:
+            print(f"[NAABU] Falha ao registrar execução: {exc}")
+
+    def agendar_gravacao(self, execucao: dict) -> None:
+        """Grava a execução sem atrasar o scan, mantendo a tarefa referenciada."""
+        tarefa = asyncio.get_running_loop().create_task(self.gravar(execucao))
+        self._gravacoes.add(tarefa)
+        tarefa.add_done_callback(self._gravacoes.discard)
+
+    async def aguardar_gravacoes(self) -> None:
+        """Espera as gravações pendentes (ex.: no encerramento do processo)."""
+        if self._gravacoes:
+            await asyncio.gather(*self._gravacoes, return_exceptions=True)
+
+
+CONTROLE_NAABU = ControleNaabu()  # estado compartilhado pelas execuções do processo
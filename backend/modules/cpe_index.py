@@ -0,0 +1,424 @@
+# Índice binário do dicionário CPE. O XML oficial é compilado uma única
+# vez (etapa offline executada pelo start.sh) em um arquivo com tabelas de
+# strings ordenadas e offsets. Os workers apenas mapeiam o arquivo em memória
+# (mmap), de modo que o conteúdo é compartilhado pelo page cache do sistema
+# operacional em vez de ficar duplicado no heap de cada processo.
+
+import mmap  # mapeamento do arquivo compilado em memória
+import os  # caminhos e substituição atômica de arquivos
+import re  # separação dos componentes de versão
+import struct  # serialização do cabeçalho binário
+import sys  # argumentos da linha de comando
+import xml.etree.ElementTree as ET  # leitura incremental do XML
+from array import array  # vetores compactos de inteiros
+from bisect import bisect_left  # busca binária nas listas de postings
+
+MAGIC = b"CPEIDX\x00\x04"  # assinatura e versão do formato
+_CABECALHO = struct.Struct("<8sI")  # assinatura + quantidade de seções
+_SECAO = struct.Struct("<8sQQ")  # nome + offset + tamanho de cada seção
+_CPE_ITEM = "{http://cpe.mitre.org/dictionary/2.0}cpe-item"
+_CPE23_ITEM = "{http://scap.nist.gov/schema/cpe-extension/2.3}cpe23-item"
+TRIGRAMA_FREQUENTE = 0.05  # trigramas em mais de 5% das entradas não filtram nada
+VERSOES_CORINGA = {"", "-", "*"}  # versões que não representam um release
+PRE_RELEASE = {"alpha", "beta", "rc", "pre", "preview", "dev", "snapshot"}  # só palavras: 1.0.2a é patch
+VERSAO_TOKEN_RE = re.compile(r"\d+|[a-z]+")  # blocos numéricos ou alfabéticos
+
+CPE_XML_PATH = os.path.join(
+    os.path.dirname(__file__), "../CPE/official-cpe-dictionary_v2.3.xml"
+)  # caminho do XML oficial do CPE
+CPE_INDEX_PATH = os.getenv(
+    "CPE_INDEX_PATH", os.path.join(os.path.dirname(__file__), "../CPE/cpe-index.bin")
+)  # índice compilado a partir do XML
+
+
+def _chave(*partes: str) -> bytes:
+    """Serializa os componentes de uma chave de busca."""
+    return "\x00".join(partes).encode()
+
+
+def chave_versao(versao: str) -> tuple:
+    """Chave de ordenação semântica de uma versão.
+
+    ``1.18`` e ``1.18.0`` são equivalentes, ``1.0rc1`` antecede ``1.0`` e
+    ``8.2p1`` e ``1.0.2a`` sucedem ``8.2`` e ``1.0.2``."""
+    tokens = VERSAO_TOKEN_RE.findall(versao.lower())
+    numericos = 0
+    while numericos < len(tokens) and tokens[numericos].isdigit():
+        numericos += 1
+    base = [int(t) for t in tokens[:numericos]]
+    while base and base[-1] == 0:  # zeros finais do release não mudam a versão
+        base.pop()
+    partes = [(2, n, "") for n in base]
+    for token in tokens[numericos:]:
+        if token.isdigit():
+            partes.append((2, int(token), ""))
+        elif token in PRE_RELEASE:
+            partes.append((0, 0, token))
+        else:
+            partes.append((1, 0, token))
+    partes.append((1, 0, ""))  # sentinela: pré-release < release < patch
+    return tuple(partes)
+
+
+def _trigramas(texto: bytes) -> set[int]:
+    """Trigramas de bytes codificados como inteiros de 24 bits.
+    Como UTF-8 preserva a relação de substring, o filtro por bytes é exato."""
+    return {
+        (texto[i] << 16) | (texto[i + 1] << 8) | texto[i + 2]
+        for i in range(len(texto) - 2)
+    }
+
+
+def _indice_trigramas(postings: dict[int, array], total: int) -> dict[bytes, bytes]:
+    """Serializa o índice invertido trigrama -> ids das entradas.
+    Trigramas muito frequentes ficam sem lista (contagem marcada como
+    ``0xFFFFFFFF``) e são ignorados na consulta."""
+    limite = max(1, int(total * TRIGRAMA_FREQUENTE))
+    chaves = array("I")
+    offsets = array("Q", [0])
+    ids = array("I")
+    for tg in sorted(postings):
+        lista = postings[tg]
+        chaves.append(tg)
+        if len(lista) > limite:
+            offsets.append(offsets[-1] | (1 << 63))  # bit alto marca "frequente"
+            continue
+        ids.extend(lista)
+        offsets.append(len(ids))
+    return {b"tg_key": chaves.tobytes(), b"tg_of": offsets.tobytes(), b"tg_ids": ids.tobytes()}
+
+
+def _indice_versoes(versoes: dict[tuple[str, str], dict[str, int]]) -> dict[bytes, bytes]:
+    """Serializa os grupos (produto, fabricante) e suas versões ordenadas
+    semanticamente, permitindo busca binária pela versão mais próxima."""
+    grupos_of = array("Q", [0])
+    grupos_kb = bytearray()
+    grupos_ini = array("I", [0])
+    versoes_of = array("Q", [0])
+    versoes_kb = bytearray()
+    versoes_id = array("I")
+    for grupo in sorted(versoes, key=lambda g: _chave(*g)):
+        grupos_kb += _chave(*grupo)
+        grupos_of.append(len(grupos_kb))
+        por_versao = versoes[grupo]
+        for versao in sorted(por_versao, key=lambda v: (chave_versao(v), v)):
+            versoes_kb += versao.encode()
+            versoes_of.append(len(versoes_kb))
+            versoes_id.append(por_versao[versao])
+        grupos_ini.append(len(versoes_id))
+    return {
+        b"gr_of": grupos_of.tobytes(),
+        b"gr_kb": bytes(grupos_kb),
+        b"gr_ini": grupos_ini.tobytes(),
+        b"vs_of": versoes_of.tobytes(),
+        b"vs_kb": bytes(versoes_kb),
+        b"vs_id": versoes_id.tobytes(),
+    }
+
+
+def _tabela_ordenada(pares: list[tuple[bytes, int]]) -> tuple[bytes, bytes, bytes]:
+    """Gera as seções (offsets, chaves, ids) de uma tabela ordenada.
+    Chaves repetidas permanecem na ordem original do dicionário."""
+    pares.sort()
+    offsets = array("Q", [0])
+    blob = bytearray()
+    ids = array("I")
+    for chave, idx in pares:
+        blob += chave
+        offsets.append(len(blob))
+        ids.append(idx)
+    return offsets.tobytes(), bytes(blob), ids.tobytes()
+
+
+def compilar_indice(xml_path: str, destino: str) -> int:
+    """Lê o XML oficial e grava o índice binário em ``destino``.
+    Retorna a quantidade de entradas indexadas."""
+    nomes_offsets = array("Q", [0])
+    nomes = bytearray()
+    triplas: list[tuple[bytes, int]] = []  # (fabricante, produto, versão)
+    pares: list[tuple[bytes, int]] = []  # (produto, versão)
+    postings: dict[int, array] = {}  # trigrama -> ids em ordem crescente
+    versoes: dict[tuple[str, str], dict[str, int]] = {}  # (produto, fabricante) -> versão -> id
+
+    eventos = ET.iterparse(xml_path, events=("start", "end"))
+    _, raiz = next(eventos)
+    for evento, elem in eventos:
+        if evento != "end":
+            continue
+        if elem.tag == _CPE_ITEM:
+            raiz.clear()  # descarta o cpe-item inteiro (título, referências) já processado
+            continue
+        if elem.tag != _CPE23_ITEM:
+            continue
+        name = elem.get("name")
+        if not name:
+            continue
+        idx = len(nomes_offsets) - 1
+        nomes += name.encode()
+        nomes_offsets.append(len(nomes))
+        for tg in _trigramas(name.lower().encode()):
+            lista = postings.get(tg)
+            if lista is None:
+                lista = postings[tg] = array("I")
+            lista.append(idx)
+        parts = name.split(":")
+        if len(parts) >= 6:
+            fabricante, produto, versao = (p.lower() for p in parts[3:6])
+            triplas.append((_chave(fabricante, produto, versao), idx))
+            pares.append((_chave(produto, versao), idx))
+            if versao not in VERSOES_CORINGA:
+                versoes.setdefault((produto, fabricante), {}).setdefault(versao, idx)
+
+    secoes = {b"nomes_of": nomes_offsets.tobytes(), b"nomes": bytes(nomes)}
+    for prefixo, lista in ((b"tri", triplas), (b"par", pares)):
+        of, kb, ids = _tabela_ordenada(lista)
+        secoes[prefixo + b"_of"] = of
+        secoes[prefixo + b"_kb"] = kb
+        secoes[prefixo + b"_id"] = ids
+    secoes.update(_indice_trigramas(postings, len(nomes_offsets) - 1))
+    del postings
+    secoes.update(_indice_versoes(versoes))
+
+    inicio = _CABECALHO.size + _SECAO.size * len(secoes)
+    tabela = []
+    offset = inicio
+    for nome, dados in secoes.items():
+        offset += -offset % 8  # mantém o alinhamento de 8 bytes
+        tabela.append((nome, offset, len(dados)))
+        offset += len(dados)
+
+    temporario = f"{destino}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(_CABECALHO.pack(MAGIC, len(secoes)))
+        for nome, off, tam in tabela:
+            f.write(_SECAO.pack(nome, off, tam))
+        for (nome, off, _), dados in zip(tabela, secoes.values()):
+            f.write(b"\x00" * (off - f.tell()))
+            f.write(dados)
+    os.replace(temporario, destino)  # leitores nunca veem arquivo parcial
+    return len(nomes_offsets) - 1
+
+
+class _Entradas:
+    """Sequência ``(minúsculo, original)`` na ordem do dicionário."""
+
+    def __init__(self, indice: "IndiceCPE"):
+        self._indice = indice
+
+    def __len__(self):
+        return self._indice.total
+
+    def __iter__(self):
+        for i in range(self._indice.total):
+            nome = self._indice.nome(i)
+            yield nome.lower(), nome
+
+
+class _TabelaOrdenada:
+    """Busca binária sobre uma tabela de chaves ordenadas no mmap."""
+
+    def __init__(self, indice: "IndiceCPE", prefixo: str):
+        self._indice = indice
+        self._offsets = indice.secao(f"{prefixo}_of").cast("Q")
+        self._chaves = indice.faixa(f"{prefixo}_kb")
+        self._ids = indice.secao(f"{prefixo}_id").cast("I")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _chave_em(self, i: int) -> bytes:
+        base = self._chaves[0]
+        return self._indice.mm[base + self._offsets[i]:base + self._offsets[i + 1]]
+
+    def get(self, key: tuple, default=None):
+        """Retorna a lista de CPEs da chave, na ordem do dicionário."""
+        alvo = _chave(*key)
+        lo, hi = 0, len(self._ids)
+        while lo < hi:  # primeira posição com chave >= alvo
+            meio = (lo + hi) // 2
+            if self._chave_em(meio) < alvo:
+                lo = meio + 1
+            else:
+                hi = meio
+        resultado = []
+        while lo < len(self._ids) and self._chave_em(lo) == alvo:
+            resultado.append(self._indice.nome(self._ids[lo]))
+            lo += 1
+        return resultado or default
+
+
+class IndiceCPE:
+    """Índice CPE compilado e mapeado em memória somente leitura."""
+
+    def __init__(self, caminho: str):
+        with open(caminho, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_secoes = _CABECALHO.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Índice CPE incompatível: {caminho}")
+        self._secoes = {}
+        for i in range(n_secoes):
+            nome, off, tam = _SECAO.unpack_from(self.mm, _CABECALHO.size + i * _SECAO.size)
+            self._secoes[nome.rstrip(b"\x00").decode()] = (off, off + tam)
+        self._view = memoryview(self.mm)
+        self._nomes_of = self.secao("nomes_of").cast("Q")
+        self._nomes_base = self.faixa("nomes")[0]
+        self.total = len(self._nomes_of) - 1
+
+        self.entradas = _Entradas(self)  # substitui a antiga lista _cpe_entries
+        self.lookup = _TabelaOrdenada(self, "tri")  # (fabricante, produto, versão)
+        self.single_lookup = _TabelaOrdenada(self, "par")  # (produto, versão)
+        self._tg_chaves = self.secao("tg_key").cast("I")
+        self._tg_offsets = self.secao("tg_of").cast("Q")
+        self._tg_ids = self.secao("tg_ids").cast("I")
+        self._gr_of = self.secao("gr_of").cast("Q")
+        self._gr_base = self.faixa("gr_kb")[0]
+        self._gr_ini = self.secao("gr_ini").cast("I")
+        self._vs_of = self.secao("vs_of").cast("Q")
+        self._vs_base = self.faixa("vs_kb")[0]
+        self._vs_id = self.secao("vs_id").cast("I")
+
+    def faixa(self, nome: str) -> tuple[int, int]:
+        return self._secoes[nome]
+
+    def secao(self, nome: str) -> memoryview:
+        inicio, fim = self._secoes[nome]
+        return self._view[inicio:fim]
+
+    def nome(self, i: int) -> str:
+        inicio = self._nomes_base + self._nomes_of[i]
+        fim = self._nomes_base + self._nomes_of[i + 1]
+        return self.mm[inicio:fim].decode()
+
+    def _grupo(self, i: int) -> bytes:
+        return self.mm[self._gr_base + self._gr_of[i]:self._gr_base + self._gr_of[i + 1]]
+
+    def _versao(self, i: int) -> str:
+        return self.mm[self._vs_base + self._vs_of[i]:self._vs_base + self._vs_of[i + 1]].decode()
+
+    def _grupos(self, produto: str, fabricante: str | None) -> range:
+        """Grupos (produto, fabricante) compatíveis, via busca binária."""
+        if fabricante is None:
+            prefixo = _chave(produto, "")  # "produto\x00" casa com qualquer fabricante
+        else:
+            prefixo = _chave(produto, fabricante)
+        total = len(self._gr_ini) - 1
+        lo, hi = 0, total
+        while lo < hi:
+            meio = (lo + hi) // 2
+            if self._grupo(meio) < prefixo:
+                lo = meio + 1
+            else:
+                hi = meio
+        fim = lo
+        while fim < total and (
+            self._grupo(fim).startswith(prefixo)
+            if fabricante is None
+            else self._grupo(fim) == prefixo
+        ):
+            fim += 1
+        return range(lo, fim)
+
+    def versoes_vizinhas(self, produto: str, versao: str, fabricante: str | None = None):
+        """Localiza ``versao`` na lista ordenada do produto.
+
+        Retorna ``None`` se o produto não estiver no índice, ``(cpe, None)``
+        quando existe versão equivalente, ``(piso, (piso, teto))`` quando a
+        versão cai entre dois releases conhecidos e ``(produto, None)`` com o
+        CPE do produto (versão ``*``) quando fica fora do intervalo
+        catalogado: só casa com CVEs registradas para todas as versões, e
+        não com as do release mais próximo, que a versão pode já corrigir.
+        Sem fabricante, usa o grupo com mais versões catalogadas."""
+        grupos = self._grupos(produto, fabricante)
+        if not grupos:
+            return None
+        grupo = max(grupos, key=lambda g: (self._gr_ini[g + 1] - self._gr_ini[g], -g))
+        inicio, fim = self._gr_ini[grupo], self._gr_ini[grupo + 1]
+        alvo = chave_versao(versao)
+        lo, hi = inicio, fim
+        while lo < hi:  # primeira versão >= alvo
+            meio = (lo + hi) // 2
+            if chave_versao(self._versao(meio)) < alvo:
+                lo = meio + 1
+            else:
+                hi = meio
+        if lo < fim and chave_versao(self._versao(lo)) == alvo:
+            return self.nome(self._vs_id[lo]), None
+        if inicio < lo < fim:
+            piso = self.nome(self._vs_id[lo - 1])
+            teto = self.nome(self._vs_id[lo])
+            return piso, (piso, teto)
+        partes = self.nome(self._vs_id[inicio]).split(":")
+        partes[5] = "*"  # fora do catálogo: CPE do produto, sem versão
+        return ":".join(partes), None
+
+    def _postings(self, tg: int):
+        """Lista de ids do trigrama, ``None`` se frequente ou vazia se ausente."""
+        pos = bisect_left(self._tg_chaves, tg)
+        if pos == len(self._tg_chaves) or self._tg_chaves[pos] != tg:
+            return self._tg_ids[0:0]
+        fim = self._tg_offsets[pos + 1]
+        if fim >> 63:
+            return None
+        return self._tg_ids[self._tg_offsets[pos] & ~(1 << 63):fim]
+
+    def busca_aproximada(self, tokens: list[str]) -> str | None:
+        """Primeira entrada, na ordem do dicionário, que contém todos os
+        ``tokens`` (já em minúsculas) como substring. Equivale à varredura
+        linear sobre ``entradas``, mas verifica só os candidatos comuns às
+        listas de trigramas."""
+        listas = []
+        for token in tokens:
+            for tg in _trigramas(token.encode()):
+                lista = self._postings(tg)
+                if lista is None:
+                    continue
+                if not lista:
+                    return None  # trigrama inexistente: nenhuma entrada casa
+                listas.append(lista)
+        if not listas:  # tokens curtos ou frequentes demais para filtrar
+            for lower, full in self.entradas:
+                if all(t in lower for t in tokens):
+                    return full
+            return None
+
+        listas.sort(key=len)
+        menor, demais = listas[0], listas[1:]
+        posicoes = [0] * len(demais)
+        for idx in menor:  # ids crescentes: o primeiro válido é o da varredura
+            for j, lista in enumerate(demais):
+                posicoes[j] = bisect_left(lista, idx, posicoes[j])
+                if posicoes[j] == len(lista):
+                    return None  # uma das listas se esgotou
+                if lista[posicoes[j]] != idx:
+                    break
+            else:
+                full = self.nome(idx)
+                lower = full.lower()
+                if all(t in lower for t in tokens):
+                    return full
+        return None
+
+
+def indice_atualizado(xml_path: str, caminho: str) -> bool:
+    """Indica se o índice existe, está no formato atual (``MAGIC``) e é mais
+    novo que o XML de origem."""
+    if not os.path.exists(caminho):
+        return False
+    with open(caminho, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return False  # formato antigo: precisa recompilar
+    if not os.path.exists(xml_path):
+        return True  # sem XML o índice existente continua válido
+    return os.path.getmtime(caminho) >= os.path.getmtime(xml_path)
+
+
+if __name__ == "__main__":  # etapa offline: python -m modules.cpe_index [--verificar] [xml] [destino]
+    verificar = "--verificar" in sys.argv[1:]  # só informa, pelo código de saída, se o índice está atualizado
+    args = [a for a in sys.argv[1:] if a != "--verificar"]
+    xml_path = args[0] if len(args) > 0 else CPE_XML_PATH
+    destino = args[1] if len(args) > 1 else CPE_INDEX_PATH
+    if verificar:
+        sys.exit(0 if indice_atualizado(xml_path, destino) else 1)
+    total = compilar_indice(xml_path, destino)
+    print(f"[CPE] {total} entradas compiladas em {destino}")
@@ -4,19 +4,45 @@
 
 from motor.motor_asyncio import AsyncIOMotorClient  # cliente assíncrono do MongoDB
 import re  # expressões regulares
-import xml.etree.ElementTree as ET  # manipulação de XML
 import os  # funções de sistema operacional
 import asyncio  # utilidades assíncronas
-from collections import defaultdict  # estruturas de listas práticas
+import json  # persistência do cache de banners
+import threading  # evita compilações concorrentes do índice
+from modules.cache import (  # cache de CVEs compartilhado entre scans
+    CACHE_BACKEND,
+    TTLCache,
+    gravar_compartilhado,
+    ler_compartilhado,
+    limpar_compartilhado,
+)
+from modules.cpe_index import (  # índice CPE compilado e mapeado em memória
+    CPE_XML_PATH,
+    CPE_INDEX_PATH,
+    IndiceCPE,
+    compilar_indice,
+    indice_atualizado,
+)
+from modules.eventos import publicar  # alertas de CVE para quem acompanha o job
 
 SOFTWARE_RE = re.compile(r"(\w[\w\-\.]*?/\d+\.\d+(?:\.\d+)?)")  # extrai "software/versão"
 NAME_SPLIT_RE = re.compile("[-_]")  # separa nomes usando hífen ou underline
 
-CPE_XML_PATH = os.path.join(
-    os.path.dirname(__file__), "../CPE/official-cpe-dictionary_v2.3.xml"
-)  # caminho do XML oficial do CPE
 client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))  # cliente MongoDB
 db = client.cvedb  # referência ao banco de CVEs
+CVE_TOP_N = int(os.getenv("CVE_TOP_N", "5"))  # CVEs mais graves retornadas por CPE
+CVE_DB_STAMP = os.getenv(
+    "CVE_DB_STAMP", os.path.join(os.path.dirname(__file__), "../cve-db/.last_update")
+)  # gravado pelo start.sh quando o db_updater.py termina
+CVE_CACHE_TTL = int(os.getenv("CVE_CACHE_TTL", "86400"))  # segundos
+
+cve_cache = TTLCache("cve", int(os.getenv("CVE_CACHE_SIZE", "5000")), CVE_CACHE_TTL)
+_cve_geracao = None  # conteúdo do carimbo quando o cache foi populado
+
+CPE_MEMO_PATH = os.getenv(
+    "CPE_MEMO_PATH", os.path.join(os.path.dirname(__file__), "../CPE/cpe-memo.json")
+)  # cópia em disco do cache banner -> CPE
+banner_cache = TTLCache("banner_cpe", int(os.getenv("CPE_MEMO_SIZE", "20000")))
+_banner_cache_alterado = False  # há resoluções novas ainda não persistidas
 
 NOMES_NORMALIZADOS = {  # mapeia variações de nomes para a forma oficial do CPE
     "microsoft_iis": ("microsoft", "internet_information_services"),
@@ -48,142 +74,341 @@ def normalizar_nome_software(nome_detectado: str):
     return None
 
 
-_cpe_entries = []  # listagem completa das entradas de CPE carregadas do XML
-_cpe_lookup = defaultdict(list)  # índice por fabricante/nome/versão
-_cpe_single_lookup = defaultdict(list)  # índice simplificado por nome/versão
+_cpe_entries = ()  # entradas (minúsculo, original) na ordem do dicionário
+_cpe_lookup = {}  # índice por fabricante/nome/versão
+_cpe_single_lookup = {}  # índice simplificado por nome/versão
+_cpe_fuzzy = None  # busca por substring via índice invertido de trigramas
+_cpe_versoes = None  # busca binária na lista ordenada de versões do produto
 _cpe_loaded = False  # indica se o dicionário já foi carregado
+_cpe_lock = threading.Lock()  # serializa o carregamento entre threads
 
 
-# Carrega o dicionário de CPE do arquivo XML para memória
+# Mapeia o índice CPE compilado, gerando-o a partir do XML se necessário
 def _load_cpe_index():
-    """Preenche os caches de lookup a partir do XML oficial.
-    A função é idempotente e evita leituras repetidas do disco."""
-    global _cpe_loaded
+    """Preenche os caches de lookup a partir do índice binário.
+    A função é idempotente; o arquivo só é compilado aqui quando a etapa
+    offline (``python -m modules.cpe_index``) não foi executada."""
+    global _cpe_entries, _cpe_lookup, _cpe_single_lookup, _cpe_fuzzy, _cpe_versoes, _cpe_loaded
     if _cpe_loaded:  # não recarrega caso já tenha sido feito anteriormente
         return
-    tree = ET.parse(CPE_XML_PATH)  # analisa o XML contendo o dicionário
-    root = tree.getroot()
-    ns = {"cpe23": "http://scap.nist.gov/schema/cpe-extension/2.3"}  # namespace do CPE 2.3
-    # Para cada item encontrado no dicionário
-    for entry in root.findall(".//cpe23:cpe23-item", ns):
-        name = entry.get("name")
-        if not name:
-            continue
-        lower = name.lower()  # mantém a versão minúscula para comparação
-        _cpe_entries.append((lower, name))  # guarda a dupla minúscula->original
-        parts = name.split(":")
-        if len(parts) >= 6:
-            # Cria chave (fabricante, nome, versão)
-            key = (parts[3].lower(), parts[4].lower(), parts[5].lower())
-            _cpe_lookup[key].append(name)
-            # Cria chave simplificada (nome, versão)
-            _cpe_single_lookup[(parts[4].lower(), parts[5].lower())].append(name)
-    # Marca como carregado
-    _cpe_loaded = True
+    with _cpe_lock:
+        if _cpe_loaded:
+            return
+        if not indice_atualizado(CPE_XML_PATH, CPE_INDEX_PATH):
+            print("[CPE] Índice compilado ausente ou desatualizado, gerando...")
+            compilar_indice(CPE_XML_PATH, CPE_INDEX_PATH)
+        indice = IndiceCPE(CPE_INDEX_PATH)  # apenas mmap, sem parse
+        _cpe_entries = indice.entradas
+        _cpe_lookup = indice.lookup
+        _cpe_single_lookup = indice.single_lookup
+        _cpe_fuzzy = indice.busca_aproximada
+        _cpe_versoes = indice.versoes_vizinhas
+        _cpe_loaded = True  # marca como carregado
 
 
-# Função principal que recebe a lista de softwares detectados
-async def buscar_cves_para_softwares(lista_softwares):
-    """Recebe uma lista ``[(ip, porta, banner)]`` e retorna
-    alertas de CVE ordenados por severidade.
-    Cada passo da busca (extração, CPE e CVE) é realizado de forma
-    assíncrona para maximizar a performance."""
-    print("\n=== COLETANDO SOFTWARES VALIDOS ===")  # informativo inicial
-    softwares_validos = []  # armazenará (ip, porta, software/versão)
-
-    for ip, porta, software_raw in lista_softwares:  # extrai softwares/versão
-        matches = SOFTWARE_RE.findall(software_raw)
-        for m in matches:
-            print(f"[EXTRAÇÃO] {ip}:{porta} {m}")
-            softwares_validos.append((ip, porta, m))
-
-    print("\n=== BUSCANDO CPEs ===")  # etapa seguinte
-    _load_cpe_index()
-
-    # Função auxiliar para localizar o CPE com base em tokens do nome
-    def _find_cpe(*tokens: str):
-        """Retorna o CPE mais relevante dado o fabricante/nome/versão.
-        Tenta primeiro o índice completo e, caso falhe, procura de
-        forma mais abrangente em todas as entradas carregadas."""
-
-        versao = tokens[-1].lower()
-        nomes = [t.lower() for t in tokens[:-1]]
-
-        # Busca rápida quando fabricante e nome são conhecidos
-        if len(nomes) == 2:
-            resultado = _cpe_lookup.get((nomes[0], nomes[1], versao))
-            if resultado:
-                return resultado[0]
-
-        # Busca simplificada apenas com nome e versão
-        if len(nomes) == 1:
-            res = _cpe_single_lookup.get((nomes[0], versao))
-            if res:
-                return res[0]
-
-        # Por fim, procura sequencialmente dentre todas as entradas
-        for lower, full in _cpe_entries:
-            if all(n in lower for n in nomes) and versao in lower:
-                return full
-        return None
+# Função auxiliar para localizar o CPE com base em tokens do nome
+def _find_cpe(*tokens: str):
+    """Retorna ``(cpe, faixa)`` para o fabricante/nome/versão.
+    Tenta primeiro o índice completo, depois a versão mais próxima
+    do produto e, caso o produto seja desconhecido, procura de forma
+    mais abrangente (substring) em todas as entradas. ``faixa`` é o
+    par de CPEs (piso, teto) que cerca uma versão não catalogada."""
 
-    # Tarefa assíncrona para determinar o CPE de um item
-    async def procurar_cpe(ip, porta, item):
-        """Recebe (ip, porta, "software/versao") e tenta
-        descobrir o CPE correspondente."""
-        try:
-            nome, versao = item.split("/")
-            nome = nome.lower()
-            versao = versao.strip()
-
-            # tenta normalizar nome
-            normalizado = normalizar_nome_software(nome)
-            if normalizado:
-                fabricante, nome_oficial = normalizado
-                cpe = _find_cpe(fabricante, nome_oficial, versao)
+    versao = tokens[-1].lower()
+    nomes = [t.lower() for t in tokens[:-1]]
+    vizinhas = None  # resultado da busca por versão próxima
+
+    # Busca rápida quando fabricante e nome são conhecidos
+    if len(nomes) == 2:
+        resultado = _cpe_lookup.get((nomes[0], nomes[1], versao))
+        if resultado:
+            return resultado[0], None
+        vizinhas = _cpe_versoes(nomes[1], versao, nomes[0])
+
+    # Busca simplificada apenas com nome e versão
+    if len(nomes) == 1:
+        res = _cpe_single_lookup.get((nomes[0], versao))
+        if res:
+            return res[0], None
+        vizinhas = _cpe_versoes(nomes[0], versao)
+
+    # Produto conhecido: usa a versão equivalente, o intervalo que a contém
+    # ou, fora do intervalo catalogado, o CPE do produto sem versão
+    if vizinhas is not None:
+        return vizinhas
+
+    # Por fim, procura por substring com apoio do índice de trigramas
+    cpe = _cpe_fuzzy(nomes + [versao])
+    return (cpe, None) if cpe else None
+
+
+# Determina o CPE de um item "software/versao"
+def procurar_cpe(item):
+    """Retorna ``(cpe, faixa)`` para o item ou ``None`` se não houver
+    entrada CPE correspondente."""
+    try:
+        nome, versao = item.split("/")
+        nome = nome.lower()
+        versao = versao.strip()
+
+        # tenta normalizar nome
+        normalizado = normalizar_nome_software(nome)
+        if normalizado:
+            fabricante, nome_oficial = normalizado
+            encontrado = _find_cpe(fabricante, nome_oficial, versao)
+        else:
+            partes_nome = NAME_SPLIT_RE.split(nome)
+            if len(partes_nome) >= 2:
+                encontrado = _find_cpe(partes_nome[0], partes_nome[1], versao)
             else:
-                partes_nome = NAME_SPLIT_RE.split(nome)
-                if len(partes_nome) >= 2:
-                    cpe = _find_cpe(partes_nome[0], partes_nome[1], versao)
-                else:
-                    cpe = _find_cpe(nome, versao)
+                encontrado = _find_cpe(nome, versao)
 
-            if cpe:
-                # Achou o CPE correspondente ao banner
-                print(f"[✔️] {nome} {versao} → {cpe}")
-                return (ip, porta, item, cpe)
+        if encontrado:
+            # Achou o CPE correspondente ao banner
+            cpe, faixa = encontrado
+            if faixa:
+                print(f"[✔️] {nome} {versao} → entre {faixa[0]} e {faixa[1]}")
             else:
-                # Não foi possível mapear para uma entrada CPE
-                print(f"[❌] NENHUMA CPE para {nome} {versao}")
-                return None
-        except Exception as e:
-            print(f"[ERRO] ao buscar CPE: {item} - {e}")
+                print(f"[✔️] {nome} {versao} → {cpe}")
+            return cpe, faixa
+        else:
+            # Não foi possível mapear para uma entrada CPE
+            print(f"[❌] NENHUMA CPE para {nome} {versao}")
             return None
+    except Exception as e:
+        print(f"[ERRO] ao buscar CPE: {item} - {e}")
+        return None
+
+
+# Resolve todos os softwares de um banner, memorizando o resultado
+def resolver_banner(software_raw: str) -> tuple:
+    """Retorna ``((item, cpe, faixa), ...)`` para os "software/versão"
+    extraídos do banner. Resultados negativos (``cpe`` ``None``) também
+    ficam no cache, de modo que banners repetidos custam uma consulta ao
+    dicionário em memória."""
+    global _banner_cache_alterado
+    resolvido = banner_cache.get(software_raw)
+    if resolvido is None:
+        resolvido = []
+        for item in SOFTWARE_RE.findall(software_raw):
+            encontrado = procurar_cpe(item)
+            resolvido.append((item, *(encontrado or (None, None))))
+        resolvido = tuple(resolvido)
+        banner_cache.set(software_raw, resolvido)
+        _banner_cache_alterado = True
+    return resolvido
+
+
+def _assinatura_indice() -> str:
+    """Identifica a versão do índice CPE usada nas resoluções em cache."""
+    try:
+        estado = os.stat(CPE_INDEX_PATH)
+    except OSError:
+        return ""
+    return f"{estado.st_mtime_ns}:{estado.st_size}:{len(NOMES_NORMALIZADOS)}"
+
+
+def _copiar_cache_banners() -> dict:
+    """Cópia serializável do cache banner -> CPE. Deve rodar no event loop,
+    onde os scans alteram o cache, e não em uma thread."""
+    global _banner_cache_alterado
+    _banner_cache_alterado = False
+    return {
+        "indice": _assinatura_indice(),
+        "itens": [[raw, [list(r) for r in res]] for raw, res in banner_cache.itens()],
+    }
+
+
+def salvar_cache_banners() -> None:
+    """Grava o cache banner -> CPE em disco para um reinício já aquecido."""
+    _gravar_cache_banners(_copiar_cache_banners())
+
+
+def _gravar_cache_banners(dados: dict) -> None:
+    temporario = f"{CPE_MEMO_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(temporario, "w") as f:
+            json.dump(dados, f)
+        os.replace(temporario, CPE_MEMO_PATH)
+    except OSError as e:
+        print(f"[ERRO] Falha ao salvar cache de banners: {e}")
+
+
+def carregar_cache_banners() -> None:
+    """Restaura o cache salvo se ele foi gerado com o mesmo índice CPE."""
+    try:
+        with open(CPE_MEMO_PATH) as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        return
+    if dados.get("indice") != _assinatura_indice():
+        return  # índice recompilado: resoluções antigas podem ter mudado
+    for raw, res in dados.get("itens", []):
+        banner_cache.set(
+            raw,
+            tuple((item, cpe, tuple(faixa) if faixa else None) for item, cpe, faixa in res),
+        )
+    print(f"[CPE] {len(banner_cache)} banners restaurados do cache")
 
-    tarefas_cpe = [  # cada software gera uma tarefa para resolver o CPE
-        procurar_cpe(ip, porta, item) for ip, porta, item in softwares_validos
+
+# Chamado na inicialização da API para mapear o índice antes do primeiro scan
+async def carregar_indice_cpe() -> None:
+    """Carrega o índice CPE (e o cache de banners) em thread para não
+    bloquear o event loop."""
+    try:
+        await asyncio.to_thread(_load_cpe_index)
+        await asyncio.to_thread(carregar_cache_banners)
+    except Exception as e:
+        print(f"[ERRO] Falha ao carregar índice CPE: {e}")
+
+
+# Chamado na inicialização da API para garantir o índice usado no $in
+async def garantir_indices_cve() -> None:
+    """Cria (se necessário) o índice de ``vulnerable_configuration``."""
+    try:
+        await db.cves.create_index("vulnerable_configuration")
+    except Exception as e:
+        print(f"[ERRO] Falha ao criar índice de CVEs: {e}")
+
+
+def _rotulo(chave) -> str:
+    """Identificador textual de um CPE ou de uma faixa (piso, teto)."""
+    return chave if isinstance(chave, str) else "|".join(chave)
+
+
+def _cpe_consultado(chave) -> str:
+    """CPE que precisa constar em ``vulnerable_configuration``. Para uma
+    faixa é o piso: a CVE afeta o release anterior e a correção só pode vir
+    na própria versão ou depois, inclusive no teto (CVE corrigida no teto
+    ainda afeta a versão intermediária)."""
+    return chave if isinstance(chave, str) else chave[0]
+
+
+# Resolve as CVEs de todos os CPEs de um scan em uma única agregação
+async def consultar_cves_em_lote(chaves, limite: int = CVE_TOP_N) -> dict:
+    """Recebe CPEs (``str``) e faixas ``(piso, teto)`` e retorna
+    ``{chave: [cve, ...]}`` com as ``limite`` CVEs de maior CVSS de cada
+    uma, ordenadas no próprio MongoDB."""
+    chaves = list(dict.fromkeys(chaves))  # remove duplicatas mantendo a ordem
+    if not chaves:
+        return {}
+    cpes = list(dict.fromkeys(_cpe_consultado(c) for c in chaves))
+
+    pipeline = [
+        {"$match": {"vulnerable_configuration": {"$in": cpes}}},
+        {
+            "$project": {
+                "_id": 0,
+                "id": 1,
+                "cvss": 1,
+                "cvss3": 1,
+                "severidade": {"$ifNull": ["$cvss3", "$cvss"]},
+                "chaves": {"$setIntersection": ["$vulnerable_configuration", cpes]},
+            }
+        },
+        {"$unwind": "$chaves"},
+        {
+            "$group": {
+                "_id": "$chaves",
+                "cves": {
+                    "$topN": {
+                        "n": limite,
+                        "sortBy": {"severidade": -1, "id": 1},
+                        "output": {"id": "$id", "cvss": "$cvss", "cvss3": "$cvss3"},
+                    }
+                },
+            }
+        },
     ]
-    resultados_cpe = await asyncio.gather(*tarefas_cpe)  # espera resolução
-    softwares_com_cpe = [r for r in resultados_cpe if r]  # mantém apenas válidos
+    por_cpe = {}
+    async for doc in db.cves.aggregate(pipeline):
+        por_cpe[doc["_id"]] = doc["cves"]
+    return {c: por_cpe.get(_cpe_consultado(c), []) for c in chaves}
+
+
+def _geracao_cve_db() -> str:
+    """Identificador da última atualização da base de CVEs."""
+    try:
+        with open(CVE_DB_STAMP) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+# Camada de cache acima de consultar_cves_em_lote
+async def consultar_cves_com_cache(chaves) -> dict:
+    """Consulta o cache do processo, depois (se habilitado) a tabela
+    compartilhada no PostgreSQL e só então o MongoDB. O cache é descartado
+    sempre que o carimbo de atualização do cve-search muda."""
+    global _cve_geracao
+    geracao = _geracao_cve_db()
+    if geracao != _cve_geracao:  # base de CVEs atualizada desde o último scan
+        if _cve_geracao is not None:
+            print("[CVE] Base atualizada, invalidando cache de CVEs")
+        cve_cache.limpar()
+        if CACHE_BACKEND == "postgres":
+            await limpar_compartilhado("cve", geracao)
+        _cve_geracao = geracao
+
+    resultado = {}
+    faltantes = {}  # rótulo -> chave original
+    for chave in dict.fromkeys(chaves):
+        cves = cve_cache.get(_rotulo(chave))
+        if cves is None:
+            faltantes[_rotulo(chave)] = chave
+        else:
+            resultado[chave] = cves
+
+    if faltantes and CACHE_BACKEND == "postgres":
+        for rotulo, cves in (await ler_compartilhado("cve", list(faltantes), geracao)).items():
+            cve_cache.set(rotulo, cves)
+            resultado[faltantes.pop(rotulo)] = cves
+
+    if faltantes:
+        novos = await consultar_cves_em_lote(faltantes.values())
+        for chave, cves in novos.items():
+            cve_cache.set(_rotulo(chave), cves)
+            resultado[chave] = cves
+        if CACHE_BACKEND == "postgres":
+            await gravar_compartilhado(
+                "cve", {_rotulo(c): v for c, v in novos.items()}, CVE_CACHE_TTL, geracao
+            )
+    return resultado
+
+
+# Função principal que recebe a lista de softwares detectados
+async def buscar_cves_para_softwares(lista_softwares):
+    """Recebe uma lista ``[(ip, porta, banner)]`` e retorna
+    alertas de CVE ordenados por severidade.
+    A resolução banner -> CPE é memorizada entre scans e as CVEs de
+    todos os CPEs são buscadas de uma só vez."""
+    print("\n=== COLETANDO SOFTWARES E CPEs ===")  # informativo inicial
+    await asyncio.to_thread(_load_cpe_index)
+
+    softwares_com_cpe = []  # (ip, porta, software/versão, cpe, faixa)
+    for ip, porta, software_raw in lista_softwares:
+        for item, cpe, faixa in resolver_banner(software_raw):
+            print(f"[EXTRAÇÃO] {ip}:{porta} {item}")
+            if cpe:
+                softwares_com_cpe.append((ip, porta, item, cpe, faixa))
+    if _banner_cache_alterado:
+        await asyncio.to_thread(_gravar_cache_banners, _copiar_cache_banners())  # só a escrita sai do loop
 
     print("\n=== BUSCANDO CVEs ===")  # etapa seguinte
     alertas_cves = []
-    sem = asyncio.Semaphore(10)  # até dez consultas simultâneas
-    cve_cache = {}  # evita consultas repetidas
-
-    # Consulta assíncrona das CVEs relacionadas a um CPE
-    async def consultar_cves(ip, porta, software, cpe):
-        """Realiza consulta no banco e monta estrutura de alerta"""
-        async with sem:
-            if cpe not in cve_cache:
-                query = {"vulnerable_configuration": cpe}
-                cursor = db.cves.find(query, {"id": 1, "cvss": 1, "cvss3": 1}).limit(5)
-                cve_cache[cpe] = await cursor.to_list(length=5)
-            cves = cve_cache[cpe]
+    # Para versões não catalogadas, consideram-se as CVEs cuja faixa de
+    # versões (expandida pelo cve-search em CPEs explícitos) contém o
+    # release anterior (ver _cpe_consultado).
+    cves_por_chave = await consultar_cves_com_cache(
+        faixa or cpe for _, _, _, cpe, faixa in softwares_com_cpe
+    )  # no máximo uma ida ao MongoDB para todo o scan
+
+    for ip, porta, software, cpe, faixa in softwares_com_cpe:  # monta os alertas
+        cves = cves_por_chave.get(faixa or cpe, [])
         if not cves:
             print(f"[CVE] Nenhuma CVE para {cpe}")
-            return []
-        return [
+            continue
+        alertas = [
             {
                 "ip": ip,
                 "porta": porta,
@@ -193,14 +418,8 @@ async def buscar_cves_para_softwares(lista_softwares):
             }
             for cve in cves
         ]
+        publicar("alertas_cve", {"ip": ip, "porta": porta, "software": software, "alertas": alertas})
+        alertas_cves.extend(alertas)
 
-    tarefas = [  # tarefas de consulta para cada CPE detectado
-        consultar_cves(ip, porta, software, cpe)
-        for ip, porta, software, cpe in softwares_com_cpe
-    ]
-    resultados = await asyncio.gather(*tarefas)  # executa em paralelo
-    for r in resultados:  # une todos os alertas
-        alertas_cves.extend(r)
-
-    alertas_cves.sort(key=lambda a: a.get("cvss", 0), reverse=True)  # ordena por CVSS
+    alertas_cves.sort(key=lambda a: a.get("cvss") or 0, reverse=True)  # ordena por CVSS
     return alertas_cves
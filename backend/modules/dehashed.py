@@ -1,17 +1,86 @@
+import asyncio  # páginas buscadas em paralelo e espera entre tentativas
+import math  # número de páginas
 import os  # módulo para acessar variáveis de ambiente e arquivos
-import json  # biblioteca para manipular dados em formato JSON
+import random  # jitter do backoff
+import time  # pausa global após limite de requisições
+from datetime import datetime  # instante da consulta, informado no resultado
+from email.utils import parsedate_to_datetime  # Retry-After em formato de data
+
 import httpx  # cliente HTTP assíncrono usado para fazer requisições
+from sqlalchemy.future import select  # credenciais guardadas do domínio
+
+from database import AsyncSessionLocal  # sessão assíncrona do banco
+from models import LeakedCredential, Report  # credenciais ficam só em leaked_credentials
+from modules.cache import gravar_compartilhado, ler_compartilhado  # tabela cache_entries
 
 DEHASHED_API_KEY = os.getenv("DEHASHED_API_KEY", "")  # chave da API do DeHashed
+DEHASHED_URL = "https://api.dehashed.com/v2/search"  # endpoint da API
+DEHASHED_PAGE_SIZE = int(os.getenv("DEHASHED_PAGE_SIZE", "1000"))  # registros por página
+DEHASHED_MAX_PAGES = int(os.getenv("DEHASHED_MAX_PAGES", "30"))  # páginas por consulta (cota)
+DEHASHED_CONCURRENCY = int(os.getenv("DEHASHED_CONCURRENCY", "3"))  # requisições simultâneas
+DEHASHED_RETRIES = int(os.getenv("DEHASHED_RETRIES", "4"))  # novas tentativas por página
+DEHASHED_BACKOFF = float(os.getenv("DEHASHED_BACKOFF", "1"))  # segundos, base do backoff exponencial
+DEHASHED_TIMEOUT = float(os.getenv("DEHASHED_TIMEOUT", "30"))  # segundos por requisição
+STATUS_TRANSITORIOS = {429, 500, 502, 503, 504}  # respostas que valem nova tentativa
+LEAK_CACHE_TTL = int(os.getenv("LEAK_CACHE_TTL", "86400"))  # segundos em que o resultado é reaproveitado
+LEAK_SNAPSHOT_TTL = int(os.getenv("LEAK_SNAPSHOT_TTL", "2592000"))  # segundos, base da atualização incremental
+
+_cliente: httpx.AsyncClient | None = None  # pool de conexões compartilhado
+_limite = asyncio.Semaphore(DEHASHED_CONCURRENCY)  # requisições em voo no processo
+_pausa_ate = 0.0  # instante (monotônico) liberado pelo último Retry-After
+
+
+def _obter_cliente() -> httpx.AsyncClient:
+    global _cliente
+    if _cliente is None or _cliente.is_closed:
+        _cliente = httpx.AsyncClient(
+            timeout=DEHASHED_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=DEHASHED_CONCURRENCY,
+                max_keepalive_connections=DEHASHED_CONCURRENCY,
+            ),
+            headers={
+                "Content-Type": "application/json",  # tipo de conteúdo enviado
+                "DeHashed-Api-Key": DEHASHED_API_KEY,  # chave de autenticação
+            },
+        )
+    return _cliente
+
+
+async def fechar_cliente() -> None:
+    """Fecha o pool de conexões (encerramento da aplicação)."""
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    """Segundos pedidos pelo servidor em ``Retry-After`` (número ou data HTTP)."""
+    valor = resp.headers.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 
-async def search_dehashed(query: str, page: int = 1, size: int = 10000,
+async def search_dehashed(query: str, page: int = 1, size: int = DEHASHED_PAGE_SIZE,
                           wildcard: bool = False, regex: bool = False,
                           de_dupe: bool = True) -> dict:
-    """Realiza consulta na API do DeHashed."""  # descrição da função
-    headers = {
-        "Content-Type": "application/json",  # tipo de conteúdo enviado
-        "DeHashed-Api-Key": DEHASHED_API_KEY,  # chave de autenticação
-    }
+    """Busca uma página na API do DeHashed.
+
+    Respostas 429/5xx e falhas de conexão são repetidas com backoff
+    exponencial; um ``Retry-After`` pausa todas as requisições do processo
+    pelo tempo pedido. Esgotadas as tentativas, a exceção do httpx é
+    propagada.
+    """
+    global _pausa_ate
     payload = {
         "query": query,  # consulta realizada
         "page": page,  # página dos resultados
@@ -20,60 +89,232 @@ async def search_dehashed(query: str, page: int = 1, size: int = 10000,
         "regex": regex,  # permite regex na consulta
         "de_dupe": de_dupe,  # remove duplicidades
     }
-    async with httpx.AsyncClient(timeout=30) as client:  # cliente HTTP assíncrono
+    for tentativa in range(DEHASHED_RETRIES + 1):
+        espera = _pausa_ate - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
         try:
-            resp = await client.post(
-                "https://api.dehashed.com/v2/search",  # endpoint da API
-                json=payload,
-                headers=headers,
-            )
+            async with _limite:
+                resp = await _obter_cliente().post(DEHASHED_URL, json=payload)
             resp.raise_for_status()  # levanta erro para códigos não 2xx
-            return resp.json()  # retorna resposta em JSON
+            return resp.json()
         except httpx.HTTPStatusError as e:
-            print(f"[HTTPStatusError] Código: {e.response.status_code}")  # código de erro HTTP
-            print(f"Resposta: {e.response.text}")  # corpo da resposta
+            status = e.response.status_code
+            print(f"[HTTPStatusError] Código: {status} (página {page})")  # código de erro HTTP
+            if status not in STATUS_TRANSITORIOS or tentativa == DEHASHED_RETRIES:
+                print(f"Resposta: {e.response.text}")  # corpo da resposta
+                raise
+            pedido = _retry_after(e.response)
+            if pedido is not None:  # o servidor diz quando voltar: vale para todos
+                _pausa_ate = max(_pausa_ate, time.monotonic() + pedido)
+                continue
         except httpx.RequestError as e:
-            print(f"[RequestError] Falha ao conectar: {e}")  # falha de conexão
-        return {}  # retorno vazio em caso de falha
-
-def _contar_vazamentos(data: dict) -> tuple[int, int, int]:
-    """Conta quantos emails, senhas e hashes foram vazados."""
-    emails = 0  # total de emails encontrados
-    senhas = 0  # total de senhas em texto
-    hashes = 0  # total de hashes de senha
-    for entry in data.get("entries", []):  # percorre cada entrada retornada
-        if entry.get("email"):
-            emails += 1  # incrementa emails
-        if entry.get("password"):
-            senhas += 1  # incrementa senhas em texto
-        if entry.get("hashed_password"):
-            hashes += 1  # incrementa hashes
-    return emails, senhas, hashes  # retorna a contagem
-
-async def verificar_vazamentos(dominio: str) -> dict:
-    """Executa a busca de vazamentos para um domínio."""
+            print(f"[RequestError] Falha ao conectar: {e} (página {page})")  # falha de conexão
+            if tentativa == DEHASHED_RETRIES:
+                raise
+        await asyncio.sleep(DEHASHED_BACKOFF * 2 ** tentativa * (1 + random.random()))
+
+
+def _texto(valor) -> str:
+    """Campos da API v2 podem vir como lista de valores."""
+    if isinstance(valor, list):
+        valor = ", ".join(str(v) for v in valor if v)
+    return valor or ""
+
+
+class _Agregador:
+    """Acumula contagens e credenciais página a página, sem duplicatas.
+
+    Com ``snapshot`` (contagens e entradas de uma consulta anterior) e as
+    ``credenciais`` já guardadas, as entradas novas são somadas às conhecidas.
+    """
+
+    def __init__(self, snapshot: dict | None = None, credenciais: list | None = None):
+        snapshot = snapshot or {}
+        self.emails = snapshot.get("num_emails", 0)  # total de emails encontrados
+        self.senhas = snapshot.get("num_passwords", 0)  # total de senhas em texto
+        self.hashes = snapshot.get("num_hashes", 0)  # total de hashes de senha
+        self.credenciais = list(credenciais or [])  # credenciais vazadas
+        self._entradas = set(snapshot.get("entradas", []))  # entradas já contadas
+        self._credenciais = {
+            (c["email"], c["password"], c["hash"]) for c in self.credenciais
+        }  # (email, senha, hash) já listados
+
+    def acrescentar(self, data: dict) -> int:
+        """Soma as entradas de uma página; retorna quantas eram novas."""
+        novas = 0
+        for entry in data.get("entries") or []:  # percorre cada entrada retornada
+            email = _texto(entry.get("email"))  # email vazado
+            senha_texto = _texto(entry.get("password"))  # senha em texto
+            senha_hash = _texto(entry.get("hashed_password"))  # senha em hash
+            chave = (email, senha_texto, senha_hash)
+            id_entrada = str(entry.get("id") or "|".join(chave))  # páginas podem se sobrepor
+            if id_entrada in self._entradas:
+                continue
+            self._entradas.add(id_entrada)
+            novas += 1
+            self.emails += bool(email)
+            self.senhas += bool(senha_texto)
+            self.hashes += bool(senha_hash)
+            if any(chave) and chave not in self._credenciais:
+                self._credenciais.add(chave)
+                self.credenciais.append(
+                    {"email": email, "password": senha_texto, "hash": senha_hash}
+                )  # adiciona a lista somente se houver algum dado
+        return novas
+
+    def entradas(self) -> list[str]:
+        """Identificadores já contados, guardados para a próxima atualização."""
+        return sorted(self._entradas)
+
+    def resultado(self) -> dict:
+        return {
+            "num_emails": self.emails,  # quantidade de emails vazados
+            "num_passwords": self.senhas,  # quantidade de senhas em texto
+            "num_hashes": self.hashes,  # quantidade de hashes de senha
+            "leaked_data": self.credenciais,  # lista de credenciais vazadas
+        }
+
+
+async def _credenciais_guardadas(dominio: str) -> list[dict] | None:
+    """Credenciais do relatório do domínio em ``leaked_credentials``."""
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(LeakedCredential.email, LeakedCredential.password, LeakedCredential.hash)
+                .join(Report, Report.id == LeakedCredential.report_id)
+                .where(Report.dominio == dominio)
+                .order_by(LeakedCredential.id)
+            )
+            return [
+                {"email": email or "", "password": senha or "", "hash": hash_ or ""}
+                for email, senha, hash_ in result.all()
+            ]
+    except Exception as exc:
+        print(f"[ERRO] Falha ao ler credenciais de {dominio}: {exc}")
+        return None
+
+
+async def _ler_cache(dominio: str) -> tuple[dict, list[dict]] | None:
+    """Snapshot guardado (sem credenciais) e as credenciais do relatório.
+
+    O snapshot só vale se o relatório tiver exatamente as credenciais que ele
+    contou; caso contrário (relatório não gravado, removido ou snapshot
+    antigo) a consulta é refeita do zero."""
+    try:
+        snapshot = (await ler_compartilhado("vazamentos", [dominio])).get(dominio)
+    except Exception as exc:  # cache indisponível não impede a consulta
+        print(f"[ERRO] Falha ao ler cache de vazamentos de {dominio}: {exc}")
+        return None
+    if snapshot is None:
+        return None
+    credenciais = await _credenciais_guardadas(dominio)
+    if credenciais is None or len(credenciais) != snapshot.get("num_credenciais"):
+        print(f"[CACHE] Vazamentos de {dominio} sem credenciais correspondentes, consulta completa")
+        return None
+    return snapshot, credenciais
+
+
+async def _gravar_cache(dominio: str, snapshot: dict) -> None:
+    try:
+        await gravar_compartilhado("vazamentos", {dominio: snapshot}, LEAK_SNAPSHOT_TTL)
+    except Exception as exc:
+        print(f"[ERRO] Falha ao gravar cache de vazamentos de {dominio}: {exc}")
+
+
+async def verificar_vazamentos(dominio: str, atualizar: bool = False) -> dict:
+    """Executa a busca de vazamentos para um domínio.
+
+    A primeira página informa o total; as demais (até ``DEHASHED_MAX_PAGES``)
+    são buscadas em paralelo e somadas às contagens conforme chegam.
+    ``completo`` indica se todas as páginas foram obtidas e ``erro`` descreve
+    a falha quando não foram.
+
+    Contagens e identificadores das entradas ficam guardados por domínio em
+    ``cache_entries`` (as credenciais ficam só em ``leaked_credentials``, com o
+    relatório) e são reaproveitados por ``LEAK_CACHE_TTL`` segundos. Depois disso, ou com ``atualizar``, a
+    consulta parte do resultado guardado: se o total informado pela API não
+    mudou e a primeira página não traz entradas novas, nenhuma outra página é
+    buscada; caso contrário, as entradas novas são somadas às guardadas.
+    ``vazamentos_em`` é o instante (UTC) da consulta que originou os dados.
+    """
+    anterior, credenciais = await _ler_cache(dominio) or (None, None)
+    if anterior and not atualizar and time.time() - anterior["consultado_em"] < LEAK_CACHE_TTL:
+        print(f"[CACHE] Vazamentos de {dominio} reaproveitados")
+        return {
+            **_Agregador(anterior, credenciais).resultado(),
+            "total": anterior["total"],
+            "completo": anterior["completo"],
+            "erro": None,
+            "vazamentos_em": datetime.utcfromtimestamp(anterior["consultado_em"]),
+            "em_cache": True,
+        }
+
     query = f"domain:{dominio}"  # monta a consulta por domínio
-    resposta = await search_dehashed(query)  # realiza a chamada
-
-    n_emails, n_senhas, n_hashes = _contar_vazamentos(resposta)  # contabiliza resultados
-
-    credenciais = []  # lista que armazenará as credenciais vazadas
-    for entry in resposta.get("entries", []):  # percorre cada entrada retornada
-        email = entry.get("email") or ""  # email vazado
-        senha_texto = entry.get("password") or ""  # senha em texto
-        senha_hash = entry.get("hashed_password") or ""  # senha em hash
-        if email or senha_texto or senha_hash:
-            credenciais.append(
-                {
-                    "email": email,
-                    "password": senha_texto,
-                    "hash": senha_hash,
-                }
-            )  # adiciona a lista somente se houver algum dado
+    agregador = _Agregador(anterior, credenciais)
+    total, paginas, obtidas, erro = 0, 1, 0, None
+    inalterado = False  # nada novo desde a consulta guardada
+    consultado_em = time.time()
+    if not DEHASHED_API_KEY:
+        erro = "DEHASHED_API_KEY não configurada"
+    else:
+        try:
+            primeira = await search_dehashed(query)
+            novas = agregador.acrescentar(primeira)
+            obtidas = 1
+            total = int(primeira.get("total") or 0)
+            paginas = max(1, min(math.ceil(total / DEHASHED_PAGE_SIZE), DEHASHED_MAX_PAGES))
+            if anterior and not novas and total == anterior["total"]:
+                print(f"[CACHE] Nenhum vazamento novo para {dominio}")
+                inalterado = True
+                paginas = 1
+            restantes = [
+                asyncio.create_task(search_dehashed(query, page=p)) for p in range(2, paginas + 1)
+            ]
+            try:
+                for pagina in asyncio.as_completed(restantes):
+                    try:
+                        agregador.acrescentar(await pagina)
+                        obtidas += 1
+                    except httpx.HTTPError as e:  # segue com as demais páginas
+                        erro = f"{type(e).__name__}: {e}"
+            finally:
+                for tarefa in restantes:  # cancelamento do job não deixa requisições soltas
+                    tarefa.cancel()
+        except httpx.HTTPError as e:
+            erro = f"{type(e).__name__}: {e}"
+    if erro:
+        print(f"[DeHashed] {dominio}: {obtidas}/{paginas} páginas ({erro})")
+        if anterior:  # os dados mais recentes continuam sendo os guardados
+            consultado_em = anterior["consultado_em"]
+            total = max(total, anterior["total"])
+    if inalterado:
+        completo = anterior["completo"]
+    else:
+        completo = erro is None and total <= paginas * DEHASHED_PAGE_SIZE
+        if erro is None and not completo:
+            print(f"[DeHashed] {dominio}: {total} registros, limitado a {paginas} páginas")
+    resultado = agregador.resultado()
+    if erro is None:
+        await _gravar_cache(
+            dominio,
+            {  # sem leaked_data: a lista é refeita a partir de leaked_credentials
+                "num_emails": resultado["num_emails"],
+                "num_passwords": resultado["num_passwords"],
+                "num_hashes": resultado["num_hashes"],
+                "num_credenciais": len(resultado["leaked_data"]),
+                "entradas": agregador.entradas(),
+                "total": total,
+                "completo": completo,
+                "consultado_em": consultado_em,
+            },
+        )
 
     return {
-        "num_emails": n_emails,  # quantidade de emails vazados
-        "num_passwords": n_senhas,  # quantidade de senhas em texto
-        "num_hashes": n_hashes,  # quantidade de hashes de senha
-        "leaked_data": credenciais,  # lista de credenciais vazadas
-    }
\ No newline at end of file
+        **resultado,
+        "total": total,  # registros informados pela API
+        "completo": completo,
+        "erro": erro,
+        "vazamentos_em": datetime.utcfromtimestamp(consultado_em),
+        "em_cache": False,
+    }
@@ -0,0 +1,81 @@
+# Eventos de progresso dos scans. Cada job tem um ``CanalEventos`` com
+# histórico limitado (assinantes que chegam depois recebem o que já foi
+# publicado) e filas para os assinantes conectados. ``publicar`` usa o canal
+# do job em execução, propagado por ContextVar para as tarefas do scan, de
+# modo que ``risk_mapper`` e ``cve_lookup`` publiquem sem conhecer o job.
+
+import asyncio  # filas dos assinantes
+import os  # parâmetros via variáveis de ambiente
+from contextvars import ContextVar  # canal do job em execução
+
+EVENTOS_HISTORICO = int(os.getenv("EVENTOS_HISTORICO", "5000"))  # eventos guardados por job
+
+
+class CanalEventos:
+    """Distribui os eventos de um job para quem estiver assinando."""
+
+    def __init__(self, max_historico: int = EVENTOS_HISTORICO):
+        self.max_historico = max_historico
+        self.historico: list[tuple[int, str, dict]] = []  # (seq, tipo, dados)
+        self.fechado = False
+        self._seq = 0
+        self._assinantes: set[asyncio.Queue] = set()
+
+    def publicar(self, tipo: str, dados: dict) -> None:
+        if self.fechado:
+            return
+        self._seq += 1
+        evento = (self._seq, tipo, dados)
+        self.historico.append(evento)
+        if len(self.historico) > self.max_historico:  # descarta os mais antigos
+            del self.historico[: len(self.historico) - self.max_historico]
+        for fila in self._assinantes:
+            fila.put_nowait(evento)
+
+    def fechar(self) -> None:
+        """Encerra o canal; assinantes terminam após o último evento."""
+        if self.fechado:
+            return
+        self.fechado = True
+        for fila in self._assinantes:
+            fila.put_nowait(None)
+
+    async def assinar(self, desde: int = 0, espera: float | None = None):
+        """Gera os eventos com ``seq > desde``, primeiro do histórico e depois
+        ao vivo. Com ``espera``, gera ``None`` a cada ``espera`` segundos sem
+        eventos (para manter a conexão viva)."""
+        fila: asyncio.Queue = asyncio.Queue()
+        for evento in self.historico:
+            if evento[0] > desde:
+                fila.put_nowait(evento)
+        if self.fechado:
+            fila.put_nowait(None)
+        else:
+            self._assinantes.add(fila)
+        try:
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=espera)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if evento is None:
+                    return
+                yield evento
+        finally:
+            self._assinantes.discard(fila)
+
+
+_canal_atual: ContextVar[CanalEventos | None] = ContextVar("canal_eventos", default=None)
+
+
+def usar_canal(canal: CanalEventos) -> None:
+    """Define o canal do contexto atual (herdado pelas tarefas criadas depois)."""
+    _canal_atual.set(canal)
+
+
+def publicar(tipo: str, dados: dict) -> None:
+    """Publica no canal do job em execução; sem job, não faz nada."""
+    canal = _canal_atual.get()
+    if canal is not None:
+        canal.publicar(tipo, dados)
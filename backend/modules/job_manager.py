@@ -0,0 +1,329 @@
+# Gerenciador de scans. As submissões entram em uma fila por usuário e são
+# despachadas em rodízio entre usuários, com no máximo ``MAX_CONCURRENT_SCANS``
+# executando ao mesmo tempo. Cada job roda com o próprio orçamento (tempo
+# limite e limites de conexões/IPs simultâneos) e pode ser cancelado sem
+# afetar os demais. Estado e resultados são gravados em ``ARMAZEM_JOBS``:
+# jobs finalizados deixam a memória do processo e continuam consultáveis
+# por qualquer worker até expirarem. O progresso de cada job é publicado no
+# seu ``CanalEventos`` e transmitido aos clientes conectados.
+
+import asyncio  # tarefas e futures dos jobs
+import os  # parâmetros via variáveis de ambiente
+import time  # instantes de criação/início/fim
+import uuid  # identificadores dos jobs
+from collections import deque  # filas por usuário e ordem de rodízio
+from contextlib import asynccontextmanager  # reserva de recursos do orçamento
+from contextvars import ContextVar  # orçamento do job em execução
+
+from modules.eventos import CanalEventos, usar_canal  # progresso transmitido aos clientes
+from modules.job_store import ARMAZEM_JOBS, JOB_STORE  # registros compartilhados entre workers
+
+MAX_CONCURRENT_SCANS = int(os.getenv("MAX_CONCURRENT_SCANS", "2"))  # jobs executando ao mesmo tempo
+SCAN_JOB_TIMEOUT = int(os.getenv("SCAN_JOB_TIMEOUT", "1800"))  # segundos para a fase de portas
+SCAN_JOB_CONNECTIONS = int(os.getenv("SCAN_JOB_CONNECTIONS", "25"))  # conexões simultâneas por job
+SCAN_JOB_IPS = int(os.getenv("SCAN_JOB_IPS", "10"))  # IPs analisados em paralelo por job
+SCAN_JOB_TLS_ADIADO = int(os.getenv("SCAN_JOB_TLS_ADIADO", "2"))  # IPs na fase TLS adiada por job
+JOB_CANCEL_POLL = float(os.getenv("JOB_CANCEL_POLL", "2"))  # segundos entre checagens de cancelamento remoto
+
+ESTADOS_FINAIS = {"concluido", "cancelado", "erro"}
+CAMPOS_SENSIVEIS = {"leaked_data"}  # credenciais: ficam só em leaked_credentials, nunca em scan_jobs
+
+
+class Orcamento:
+    """Limites de recursos de um job, somados aos limites globais do processo."""
+
+    def __init__(self, conexoes: int = SCAN_JOB_CONNECTIONS, ips: int = SCAN_JOB_IPS,
+                 tempo: int = SCAN_JOB_TIMEOUT, tls_adiado: int = SCAN_JOB_TLS_ADIADO):
+        self.tempo = tempo
+        self._semaforos = {
+            "conexoes": asyncio.Semaphore(conexoes),
+            "ips": asyncio.Semaphore(ips),
+            "tls_adiado": asyncio.Semaphore(tls_adiado),
+        }
+
+    def semaforo(self, recurso: str) -> asyncio.Semaphore:
+        return self._semaforos[recurso]
+
+
+_orcamento_atual: ContextVar[Orcamento | None] = ContextVar("orcamento_job", default=None)
+
+
+@asynccontextmanager
+async def reservar(recurso: str, limite_global: asyncio.Semaphore):
+    """Adquire o limite do job em execução (se houver) e depois o global."""
+    orcamento = _orcamento_atual.get()
+    if orcamento is None:  # fora de um job (ex.: chamadas diretas)
+        async with limite_global:
+            yield
+        return
+    async with orcamento.semaforo(recurso):
+        async with limite_global:
+            yield
+
+
+class Job:
+    """Um scan submetido: estado, dados consultados pela API e tarefas."""
+
+    def __init__(self, usuario: str, executar, descricao: dict | None = None):
+        self.id = str(uuid.uuid4())
+        self.usuario = usuario
+        self.descricao = descricao or {}  # ex.: domínio e opções do scan
+        self.estado = "na_fila"  # na_fila, executando, softwares, concluido, cancelado, erro
+        self.criado_em = time.time()
+        self.iniciado_em: float | None = None
+        self.finalizado_em: float | None = None
+        self.erro: str | None = None
+        self.dados: dict = {}  # resultados parciais/finais lidos pelos endpoints
+        self.tarefas: dict[str, asyncio.Task] = {}  # tarefas em segundo plano do job
+        self.resultado: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.eventos = CanalEventos()  # estado, alertas e resultado em tempo real
+        self.eventos.publicar("estado", {"estado": self.estado})
+        self._executar = executar  # corrotina ``executar(job)`` da fase principal
+        self._gravando = asyncio.Lock()  # gravações do mesmo job em ordem
+
+    def avancar(self, estado: str) -> None:
+        """Muda para uma etapa não final e avisa quem acompanha o job."""
+        self.estado = estado
+        self.eventos.publicar("estado", {"estado": estado})
+        GERENCIADOR_JOBS.agendar_gravacao(self)
+
+    def finalizar(self, estado: str, erro: str | None = None) -> None:
+        if self.estado in ESTADOS_FINAIS:
+            return
+        self.estado = estado
+        self.erro = erro
+        self.finalizado_em = time.time()
+        self.eventos.publicar("estado", {"estado": estado, "erro": erro})
+        GERENCIADOR_JOBS.agendar_gravacao(self)
+
+    def registro(self) -> dict:
+        dados = {k: v for k, v in self.dados.items() if k not in CAMPOS_SENSIVEIS}
+        return {**self.resumo(), "dados": dados}
+
+    def resumo(self) -> dict:
+        return {
+            "job_id": self.id,
+            "usuario": self.usuario,
+            "estado": self.estado,
+            "criado_em": self.criado_em,
+            "iniciado_em": self.iniciado_em,
+            "finalizado_em": self.finalizado_em,
+            "erro": self.erro,
+            **self.descricao,
+        }
+
+
+class GerenciadorJobs:
+    """Fila justa por usuário com ``max_concorrentes`` jobs em execução."""
+
+    def __init__(self, max_concorrentes: int = MAX_CONCURRENT_SCANS):
+        self.max_concorrentes = max_concorrentes
+        self.jobs: dict[str, Job] = {}
+        self._filas: dict[str, deque] = {}  # usuário -> jobs aguardando
+        self._vez: deque = deque()  # usuários com jobs na fila, em ordem de rodízio
+        self._executando: dict[str, asyncio.Task] = {}  # job_id -> fase principal
+        self._vigia: asyncio.Task | None = None  # pedidos de cancelamento remotos
+        self._gravacoes: set[asyncio.Task] = set()  # gravações pendentes (evita coleta pelo GC)
+
+    def submeter(self, usuario: str, executar, descricao: dict | None = None) -> Job:
+        """Enfileira ``executar(job)`` e despacha se houver vaga."""
+        job = Job(usuario or "anonimo", executar, descricao)
+        self.jobs[job.id] = job
+        if job.usuario not in self._filas:
+            self._filas[job.usuario] = deque()
+            self._vez.append(job.usuario)
+        self._filas[job.usuario].append(job)
+        self.agendar_gravacao(job)
+        self._despachar()
+        self._vigiar_cancelamentos()
+        return job
+
+    def obter(self, job_id: str) -> Job | None:
+        """Job deste processo (ainda na fila, executando ou com tarefas pendentes)."""
+        return self.jobs.get(job_id)
+
+    async def ler(self, job_id: str) -> dict | None:
+        """Registro do job, deste processo ou do armazenamento compartilhado."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return {**job.registro(), "posicao": self.posicao(job)}
+        registro = await ARMAZEM_JOBS.ler(job_id)
+        return {**registro, "posicao": None} if registro else None
+
+    async def remover(self, job_id: str) -> None:
+        """Esquece um job cujo resultado já foi entregue ao cliente."""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            await ARMAZEM_JOBS.remover(job_id)
+            return
+        async with job._gravando:  # espera uma gravação em andamento antes de apagar
+            await ARMAZEM_JOBS.remover(job_id)
+
+    async def gravar(self, job: Job) -> None:
+        """Grava o estado atual do job; libera a memória quando nada mais o altera."""
+        terminou = job.estado in ESTADOS_FINAIS and all(t.done() for t in job.tarefas.values())
+        if terminou:
+            job.eventos.fechar()  # nada mais será publicado
+        async with job._gravando:
+            if self.jobs.get(job.id) is not job:  # removido ou já gravado no estado final
+                return
+            try:
+                await ARMAZEM_JOBS.salvar(job.registro())
+            except Exception as exc:
+                print(f"[JOB] Falha ao gravar job {job.id}: {exc}")
+                return
+        if terminou:
+            self.jobs.pop(job.id, None)
+
+    def agendar_gravacao(self, job: Job) -> None:
+        tarefa = asyncio.get_running_loop().create_task(self.gravar(job))
+        self._gravacoes.add(tarefa)
+        tarefa.add_done_callback(self._gravacoes.discard)
+
+    def acompanhar(self, job: Job, nome: str, tarefa: asyncio.Task) -> None:
+        """Registra uma tarefa em segundo plano do job e grava ao terminar."""
+        job.tarefas[nome] = tarefa
+        tarefa.add_done_callback(lambda _: self.agendar_gravacao(job))
+
+    def posicao(self, job: Job) -> int | None:
+        """Posição aproximada na fila simulando o rodízio entre usuários (1 = próximo)."""
+        if job.estado != "na_fila":
+            return None
+        filas = {u: list(self._filas[u]) for u in self._vez}
+        ordem = deque(self._vez)
+        posicao = 0
+        while ordem:
+            usuario = ordem.popleft()
+            posicao += 1
+            if filas[usuario].pop(0) is job:
+                return posicao
+            if filas[usuario]:
+                ordem.append(usuario)
+        return None
+
+    async def estado(self, job_id: str) -> dict | None:
+        registro = await self.ler(job_id)
+        if registro is None:
+            return None
+        registro.pop("dados", None)
+        return registro
+
+    def profundidade(self) -> dict:
+        return {
+            "na_fila": sum(len(f) for f in self._filas.values()),
+            "executando": len(self._executando),
+            "max_concorrentes": self.max_concorrentes,
+            "por_usuario": {u: len(f) for u, f in self._filas.items()},
+        }
+
+    async def cancelar(self, job_id: str) -> bool:
+        """Cancela apenas o job informado, esteja na fila ou em execução.
+        Jobs de outro worker recebem um pedido de cancelamento."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            registro = await ARMAZEM_JOBS.ler(job_id)
+            if registro is None or registro.get("estado") in ESTADOS_FINAIS:
+                return False
+            return await ARMAZEM_JOBS.solicitar_cancelamento(job_id)
+        return self.cancelar_local(job)
+
+    def cancelar_local(self, job: Job) -> bool:
+        """Cancela um job executado por este processo."""
+        if job.estado in ESTADOS_FINAIS:
+            return False
+        fila = self._filas.get(job.usuario)
+        if fila and job in fila:  # ainda não começou
+            fila.remove(job)
+            if not fila:
+                del self._filas[job.usuario]
+                self._vez.remove(job.usuario)
+        tarefa = self._executando.get(job.id)
+        if tarefa is not None:
+            tarefa.cancel()
+        for tarefa in job.tarefas.values():
+            tarefa.cancel()
+        job.finalizar("cancelado")
+        if not job.resultado.done():
+            job.resultado.cancel()
+        return True
+
+    async def cancelar_do_usuario(self, usuario: str) -> bool:
+        """Cancela os jobs de ``usuario`` que ainda não terminaram, inclusive
+        os executados por outros workers."""
+        locais = [j for j in list(self.jobs.values()) if j.usuario == usuario]
+        cancelados = [self.cancelar_local(j) for j in locais]
+        remotos = await ARMAZEM_JOBS.solicitar_cancelamento_do_usuario(usuario)
+        return any(cancelados) or remotos
+
+    def _vigiar_cancelamentos(self) -> None:
+        """Com armazenamento compartilhado, acompanha pedidos de outros workers."""
+        if JOB_STORE != "postgres" or (self._vigia and not self._vigia.done()):
+            return
+        self._vigia = asyncio.get_running_loop().create_task(self._vigiar())
+
+    async def _vigiar(self) -> None:
+        while True:
+            ativos = [j.id for j in self.jobs.values() if j.estado not in ESTADOS_FINAIS]
+            if not ativos:
+                return
+            try:
+                for job_id in await ARMAZEM_JOBS.cancelamentos(ativos):
+                    job = self.jobs.get(job_id)
+                    if job is not None:
+                        print(f"[JOB] Cancelamento de {job_id} solicitado por outro worker")
+                        self.cancelar_local(job)
+            except Exception as exc:
+                print(f"[JOB] Falha ao consultar cancelamentos: {exc}")
+            await asyncio.sleep(JOB_CANCEL_POLL)
+
+    def _despachar(self) -> None:
+        while len(self._executando) < self.max_concorrentes and self._vez:
+            # vez do usuário com menos jobs executando; empate segue o rodízio
+            rodando = {}
+            for job_id in self._executando:
+                dono = self.jobs[job_id].usuario if job_id in self.jobs else None
+                rodando[dono] = rodando.get(dono, 0) + 1
+            usuario = min(self._vez, key=lambda u: rodando.get(u, 0))
+            self._vez.remove(usuario)
+            fila = self._filas[usuario]
+            job = fila.popleft()
+            if fila:
+                self._vez.append(usuario)  # volta ao fim do rodízio
+            else:
+                del self._filas[usuario]
+            self._executando[job.id] = asyncio.create_task(self._executar(job))
+
+    async def _executar(self, job: Job) -> None:
+        job.iniciado_em = time.time()
+        job.avancar("executando")
+        orcamento = Orcamento()
+        _orcamento_atual.set(orcamento)  # herdado pelas tarefas criadas pelo job
+        usar_canal(job.eventos)  # idem para os eventos de progresso
+        try:
+            resultado = await asyncio.wait_for(job._executar(job), timeout=orcamento.tempo)
+            if job.estado == "executando":  # sem fase em segundo plano
+                job.finalizar("concluido")
+            else:
+                self.agendar_gravacao(job)  # resultados da fase principal
+            if not job.resultado.done():
+                job.resultado.set_result(resultado)
+        except asyncio.TimeoutError:
+            print(f"[JOB] {job.id} excedeu {orcamento.tempo}s e foi abortado")
+            job.finalizar("erro", "Tempo limite da análise excedido.")
+            if not job.resultado.done():
+                job.resultado.set_result({"erro": job.erro})
+        except asyncio.CancelledError:
+            job.finalizar("cancelado")
+            if not job.resultado.done():
+                job.resultado.cancel()
+        except Exception as exc:
+            print(f"[JOB] {job.id} falhou: {exc}")
+            job.finalizar("erro", "Falha na análise.")
+            if not job.resultado.done():
+                job.resultado.set_result({"erro": job.erro})
+        finally:
+            self._executando.pop(job.id, None)
+            self._despachar()
+
+
+GERENCIADOR_JOBS = GerenciadorJobs()  # instância compartilhada pelos endpoints
@@ -0,0 +1,146 @@
+# Armazenamento compartilhado dos jobs de scan. Com ``JOB_STORE=postgres``
+# o estado e os resultados de cada job ficam na tabela ``scan_jobs``, de
+# modo que qualquer worker do uvicorn responda ao polling e repasse pedidos
+# de cancelamento ao worker que executa o scan. ``memory`` (padrão) mantém
+# o mesmo contrato em um ``TTLCache`` local, para uma única instância.
+# Nos dois casos os registros expiram após ``JOB_TTL`` segundos sem
+# atualização e o total é limitado a ``JOB_STORE_MAX``.
+
+import os  # variáveis de ambiente
+from datetime import datetime, timedelta  # expiração persistida no banco
+
+from sqlalchemy import delete, update  # limpeza e pedidos de cancelamento
+from sqlalchemy.dialects.postgresql import insert  # upsert do registro
+from sqlalchemy.future import select  # consultas assíncronas
+
+from database import AsyncSessionLocal  # sessão assíncrona do banco
+from models import ScanJob  # tabela de jobs
+from modules.cache import TTLCache  # armazenamento local com LRU/TTL
+
+JOB_STORE = os.getenv("JOB_STORE", "memory")  # "memory" ou "postgres"
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))  # segundos sem atualização até expirar
+JOB_STORE_MAX = int(os.getenv("JOB_STORE_MAX", "1000"))  # registros mantidos no máximo
+
+
+class ArmazemMemoria:
+    """Registros no próprio processo; suficiente com um único worker."""
+
+    def __init__(self):
+        self._registros = TTLCache("jobs", JOB_STORE_MAX, JOB_TTL)  # LRU limita o total
+        self._cancelar: set[str] = set()
+
+    async def salvar(self, registro: dict) -> None:
+        self._registros.set(registro["job_id"], registro)
+
+    async def ler(self, job_id: str) -> dict | None:
+        return self._registros.get(job_id)
+
+    async def remover(self, job_id: str) -> None:
+        self._registros.pop(job_id)
+        self._cancelar.discard(job_id)
+
+    async def solicitar_cancelamento(self, job_id: str) -> bool:
+        if self._registros.get(job_id) is None:
+            return False
+        self._cancelar.add(job_id)
+        return True
+
+    async def solicitar_cancelamento_do_usuario(self, usuario: str) -> bool:
+        return False  # um único processo: os jobs do usuário já são locais
+
+    async def cancelamentos(self, job_ids: list[str]) -> set[str]:
+        return self._cancelar.intersection(job_ids)
+
+
+class ArmazemPostgres:
+    """Registros na tabela ``scan_jobs``, visíveis a todos os workers."""
+
+    _limpezas = 0  # limpa expirados/excedentes a cada algumas gravações
+
+    async def salvar(self, registro: dict) -> None:
+        agora = datetime.utcnow()
+        valores = {
+            "job_id": registro["job_id"],
+            "usuario": registro.get("usuario"),
+            "estado": registro.get("estado"),
+            "resumo": {k: v for k, v in registro.items() if k != "dados"},
+            "dados": registro.get("dados") or {},
+            "atualizado_em": agora,
+            "expira_em": agora + timedelta(seconds=JOB_TTL),
+        }
+        stmt = insert(ScanJob).values(**valores)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ScanJob.job_id],
+            set_={k: stmt.excluded[k] for k in valores if k != "job_id"},
+        )
+        async with AsyncSessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+        ArmazemPostgres._limpezas += 1
+        if ArmazemPostgres._limpezas % 50 == 1:
+            await self.limpar()
+
+    async def ler(self, job_id: str) -> dict | None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(ScanJob.resumo, ScanJob.dados).where(
+                    ScanJob.job_id == job_id, ScanJob.expira_em > datetime.utcnow()
+                )
+            )
+            linha = result.first()
+        if linha is None:
+            return None
+        return {**(linha.resumo or {}), "dados": linha.dados or {}}
+
+    async def remover(self, job_id: str) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(ScanJob).where(ScanJob.job_id == job_id))
+            await session.commit()
+
+    async def solicitar_cancelamento(self, job_id: str) -> bool:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(ScanJob)
+                .where(ScanJob.job_id == job_id, ScanJob.expira_em > datetime.utcnow())
+                .values(cancelar=True)
+            )
+            await session.commit()
+        return result.rowcount > 0
+
+    async def solicitar_cancelamento_do_usuario(self, usuario: str) -> bool:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(ScanJob)
+                .where(
+                    ScanJob.usuario == usuario,
+                    ScanJob.estado.notin_(["concluido", "cancelado", "erro"]),
+                    ScanJob.expira_em > datetime.utcnow(),
+                )
+                .values(cancelar=True)
+            )
+            await session.commit()
+        return result.rowcount > 0
+
+    async def cancelamentos(self, job_ids: list[str]) -> set[str]:
+        if not job_ids:
+            return set()
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(ScanJob.job_id).where(ScanJob.job_id.in_(job_ids), ScanJob.cancelar.is_(True))
+            )
+            return set(result.scalars().all())
+
+    async def limpar(self) -> None:
+        """Remove registros expirados e os mais antigos além de ``JOB_STORE_MAX``."""
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(ScanJob).where(ScanJob.expira_em <= datetime.utcnow()))
+            excedentes = (
+                select(ScanJob.job_id)
+                .order_by(ScanJob.atualizado_em.desc())
+                .offset(JOB_STORE_MAX)
+            )
+            await session.execute(delete(ScanJob).where(ScanJob.job_id.in_(excedentes)))
+            await session.commit()
+
+
+ARMAZEM_JOBS = ArmazemPostgres() if JOB_STORE == "postgres" else ArmazemMemoria()
@@ -1,63 +1,193 @@
-import asyncio  # operações assíncronas
+import asyncio  # varreduras em andamento compartilhadas entre scans
+import os  # parâmetros via variáveis de ambiente
 import subprocess  # execução de comandos externos
+import time  # duração de cada execução
+from modules.cache import (  # portas abertas recentes por IP
+    CACHE_BACKEND,
+    TTLCache,
+    gravar_compartilhado,
+    ler_compartilhado,
+)
+from modules.connect_scan import escanear_connect  # TCP connect sem root
+from modules.controle_naabu import CONTROLE_NAABU  # rate/timeout adaptativos
+from modules.processo import stream_linhas  # leitura do stdout linha a linha
+from parsers.parse_naabu import parse_naabu  # (ip, porta) de cada linha JSON
 
-async def _run(cmd: list[str], timeout: int | None = None):  # executa comando assíncrono
-    proc = await asyncio.create_subprocess_exec(*cmd)  # cria processo
+PORTAS_PADRAO = [  # portas verificadas quando nenhuma lista é informada
+    "21",   # FTP
+    "22",   # SSH
+    "23",   # Telnet
+    "80",   # HTTP
+    "443",  # HTTPS
+    "3389", # RDP
+    "3306", # MySQL
+    "25",   # SMTP
+    "465",  # SMTPS
+    "587",  # SMTP Submission
+    "5432", # PostgreSQL
+    "1433", # SQL Server
+    "110",  # POP3
+    "143",  # IMAP
+    "161",  # SNMP
+    "500",  # IKE
+    "4500", # IPSec NAT-T
+    "1723", # PPTP
+    "1521", # Oracle
+]
+
+NAABU_ARGS = [
+    "-s", "s",              # Tipo de varredura (SYN); rate, retries e timeout vêm de CONTROLE_NAABU
+]
+
+# naabu: só o Naabu; connect: só o scanner TCP connect embutido; auto: Naabu e,
+# se ele falhar, o connect scan nos mesmos IPs
+PORT_SCAN_ENGINE = os.getenv("PORT_SCAN_ENGINE", "auto").lower()
+
+PORT_CACHE_TTL = int(os.getenv("PORT_CACHE_TTL", "900"))  # segundos em que o resultado de um IP é reaproveitado
+PORTAS_CACHE = TTLCache("portas_ip", int(os.getenv("PORT_CACHE_SIZE", "50000")), PORT_CACHE_TTL)
+_em_andamento: dict[str, asyncio.Future] = {}  # chave -> portas abertas de um IP em varredura
+
+
+def _chave(ip: str, ports) -> str:  # a lista de portas consultadas faz parte do resultado
+    return f"{','.join(ports)}|{ip}"
+
+
+async def escanear_ips(
+    ips: list[str], ports=None, timeout: int | None = None, cwd: str | None = None
+) -> dict[str, list[int]]:  # Naabu só para IPs sem resultado recente
+    """Portas abertas de cada IP de ``ips`` (apenas IPs com alguma porta).
+
+    IPs varridos há menos de ``PORT_CACHE_TTL`` segundos (por qualquer scan)
+    vêm do cache, IPs que outro scan está varrendo aguardam aquele resultado e
+    só o restante vai ao Naabu (ou ao connect scan, conforme
+    ``PORT_SCAN_ENGINE``). Se a varredura aguardada falhar, o IP é varrido
+    aqui. Sem ``timeout``, o limite do processo é dimensionado por
+    ``CONTROLE_NAABU``."""
+    if ports is None:
+        ports = PORTAS_PADRAO
+    chaves = {ip: _chave(ip, ports) for ip in ips}
+    achados = await _consultar_cache(list(chaves.values()))
+    resultados: dict[str, list[int]] = {}
+    aguardar, executar = {}, []
+    for ip, chave in chaves.items():
+        if chave in achados:
+            if achados[chave]:
+                resultados[ip] = list(achados[chave])
+        elif chave in _em_andamento:
+            aguardar[ip] = _em_andamento[chave]
+        else:
+            executar.append(ip)
+    if achados or aguardar:
+        print(f"[Naabu] {len(achados)} IPs do cache, {len(aguardar)} em varredura por outro scan")
+    if executar:
+        resultados.update(await _varrer_compartilhando(executar, ports, timeout, cwd))
+    refazer = []
+    for ip, futuro in aguardar.items():
+        portas = await asyncio.shield(futuro)  # nosso cancelamento não afeta o outro scan
+        if portas is None:  # a varredura do outro scan falhou
+            refazer.append(ip)
+        elif portas:
+            resultados[ip] = list(portas)
+    if refazer:
+        resultados.update(await _varrer_compartilhando(refazer, ports, timeout, cwd))
+    return resultados
+
+
+async def _consultar_cache(chaves: list[str]) -> dict:
+    achados = {}
+    faltam = []
+    for chave in chaves:
+        portas = PORTAS_CACHE.get(chave)
+        if portas is None:
+            faltam.append(chave)
+        else:
+            achados[chave] = portas
+    if faltam and CACHE_BACKEND == "postgres":
+        try:
+            lidos = await ler_compartilhado("portas_ip", faltam)
+        except Exception as exc:
+            print(f"[ERRO] Falha ao ler cache de portas: {exc}")
+            lidos = {}
+        for chave, portas in lidos.items():
+            PORTAS_CACHE.set(chave, portas)
+            achados[chave] = portas
+    return achados
+
+
+async def _varrer_compartilhando(ips, ports, timeout, cwd) -> dict[str, list[int]]:
+    """Executa a varredura publicando um future por IP para scans concorrentes.
+    Os futures recebem ``None`` se a varredura falhar ou for cancelada."""
+    loop = asyncio.get_running_loop()
+    futuros = {}
+    for ip in ips:
+        futuros[ip] = _em_andamento[_chave(ip, ports)] = loop.create_future()
+    resultados, completo = {}, False
     try:
-        await asyncio.wait_for(proc.communicate(), timeout=timeout)  # aguarda dentro do limite
-    except asyncio.TimeoutError:
-        proc.kill()  # mata o processo no timeout
-        await proc.communicate()
-        raise subprocess.TimeoutExpired(cmd, timeout)
-    except asyncio.CancelledError:
-        proc.kill()  # encerra se a tarefa for cancelada
-        await proc.communicate()
-        raise
-    if proc.returncode != 0:  # verifica código de saída
-        raise subprocess.CalledProcessError(proc.returncode, cmd)
-
-async def run_naabu(ip_list_path: str, output_path: str, ports=None, timeout: int = 300):  # executa o Naabu
-    if ports is None:  # utiliza conjunto padrão se nada for informado
-        ports = [
-            "21",   # FTP
-            "22",   # SSH
-            "23",   # Telnet
-            "80",   # HTTP
-            "443",  # HTTPS
-            "3389", # RDP
-            "3306", # MySQL
-            "25",   # SMTP
-            "465",  # SMTPS
-            "587",  # SMTP Submission
-            "5432", # PostgreSQL
-            "1433", # SQL Server
-            "110",  # POP3
-            "143",  # IMAP
-            "161",  # SNMP
-            "500",  # IKE
-            "4500", # IPSec NAT-T
-            "1723", # PPTP
-            "1521", # Oracle
-        ]
-
-    ports_str = ",".join(ports)  # converte a lista para string
+        resultados, completo = await _executar(ips, ports, timeout, cwd)
+    finally:
+        for ip, futuro in futuros.items():
+            chave = _chave(ip, ports)
+            if _em_andamento.get(chave) is futuro:
+                del _em_andamento[chave]
+            futuro.set_result(resultados.get(ip, []) if completo else None)
+    if completo:  # resultado parcial não vai para o cache
+        novos = {_chave(ip, ports): resultados.get(ip, []) for ip in ips}
+        for chave, portas in novos.items():
+            PORTAS_CACHE.set(chave, portas)
+        if CACHE_BACKEND == "postgres":
+            try:
+                await gravar_compartilhado("portas_ip", novos, PORT_CACHE_TTL)
+            except Exception as exc:
+                print(f"[ERRO] Falha ao gravar cache de portas: {exc}")
+    return resultados
+
+
+async def _executar(ips, ports, timeout, cwd) -> tuple[dict[str, list[int]], bool]:
+    """Varre ``ips`` com o motor de ``PORT_SCAN_ENGINE``."""
+    if PORT_SCAN_ENGINE == "connect":
+        return await escanear_connect(ips, ports, timeout)
+    async with CONTROLE_NAABU.vez:  # lotes simultâneos somariam suas taxas
+        resultados, completo = await _executar_naabu(ips, ports, timeout, cwd)
+    if completo or PORT_SCAN_ENGINE != "auto":
+        return resultados, completo
+    print(f"[Naabu] Falhou; repetindo {len(ips)} IPs com connect scan")
+    conectados, completo = await escanear_connect(ips, ports, timeout)
+    for ip, portas in resultados.items():  # soma o que o Naabu chegou a encontrar
+        conectados[ip] = sorted(set(conectados.get(ip, [])) | set(portas))
+    return conectados, completo
+
+
+async def _executar_naabu(ips, ports, timeout, cwd) -> tuple[dict[str, list[int]], bool]:
+    """Envia ``ips`` ao Naabu pelo stdin e lê o resultado em JSON lines do
+    stdout, sem arquivos intermediários. Retorna as portas e se terminou bem."""
+    resultados: dict[str, list[int]] = {}
+    params = await CONTROLE_NAABU.parametros(len(ips), len(ports))
+    inicio = time.monotonic()
+    completo = False
     try:
-        print(f"[Naabu] Escaneando IPs em {ip_list_path} nas portas: {ports_str}")  # informa no console
-        await _run(
+        print(f"[Naabu] Escaneando lote de {len(ips)} IPs")
+        async for linha in stream_linhas(
             [
-                "sudo", "naabu",        # Comando a ser executado
-                "-list", ip_list_path,   # Arquivo contendo os IPs
-                "-p", ports_str,         # Portas a serem testadas
-                "-rate", "500",          # Taxa de envio de pacotes
-                "-retries", "2",        # Número de tentativas
-                "-timeout", "8000",     # Tempo limite de cada conexão
-                "-o", output_path,       # Caminho para o arquivo de saída
-                "-s", "s",              # Tipo de varredura (SYN)
-                "-v", "-debug",        # Verbosidade e modo de depuração
+                "sudo", "naabu", "-silent", "-json", "-p", ",".join(ports), *NAABU_ARGS,
+                "-rate", str(params["rate"]),
+                "-retries", str(params["retries"]),
+                "-timeout", str(params["timeout_ms"]),
             ],
-            timeout=timeout,
-        )
-        print(f"[OK] Resultado salvo em: {output_path}")  # sucesso
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
-        print(f"[ERRO] Falha ao executar Naabu: {e}")  # erro durante execução
-        
\ No newline at end of file
+            entrada=ips,
+            timeout=timeout or params["limite"],
+            cwd=cwd,
+        ):
+            par = parse_naabu(linha)
+            if par and par[1] not in resultados.get(par[0], []):
+                resultados.setdefault(par[0], []).append(par[1])
+        completo = True
+    except subprocess.TimeoutExpired as e:
+        print(f"[ERRO] Falha ao executar Naabu: {e}")  # mantém as portas já lidas
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"[ERRO] Falha ao executar Naabu: {e}")  # não diz nada sobre a rede
+        return resultados, False
+    execucao = CONTROLE_NAABU.registrar(
+        params, {ip: _chave(ip, ports) for ip in ips}, resultados, time.monotonic() - inicio, completo
+    )
+    CONTROLE_NAABU.agendar_gravacao(execucao)  # histórico sem atrasar o scan
+    return resultados, completo
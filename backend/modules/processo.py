@@ -0,0 +1,69 @@
+import asyncio  # subprocessos assíncronos
+import subprocess  # exceções compatíveis com os wrappers existentes
+
+
+async def _alimentar(stdin: asyncio.StreamWriter, entrada) -> None:  # envia linhas ao processo
+    """Escreve cada item de ``entrada`` (iterável síncrono ou assíncrono) no stdin."""
+    try:
+        if hasattr(entrada, "__aiter__"):
+            async for item in entrada:
+                stdin.write(f"{item}\n".encode())
+                await stdin.drain()  # respeita o buffer do processo
+        else:
+            for item in entrada:
+                stdin.write(f"{item}\n".encode())
+            await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # processo encerrou antes de consumir tudo
+    finally:
+        stdin.close()  # EOF sinaliza o fim da entrada
+        if hasattr(entrada, "aclose"):
+            await entrada.aclose()  # encerra o estágio anterior (ex.: outro processo)
+
+
+async def stream_linhas(
+    cmd: list[str], entrada=None, timeout: int | None = None, cwd: str | None = None
+):
+    """Executa ``cmd`` e gera cada linha não vazia do stdout assim que é escrita.
+
+    ``entrada`` é enviada ao stdin em paralelo, permitindo encadear ferramentas.
+    O processo é encerrado em caso de timeout (``TimeoutExpired``), cancelamento
+    ou quando o consumidor interrompe a iteração. ``cwd`` isola arquivos que a
+    ferramenta eventualmente crie no diretório de trabalho.
+    """
+    loop = asyncio.get_running_loop()
+    prazo = loop.time() + timeout if timeout else None
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if entrada is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        cwd=cwd,
+    )
+    alimentador = (
+        asyncio.create_task(_alimentar(proc.stdin, entrada)) if entrada is not None else None
+    )
+    try:
+        while True:
+            restante = prazo - loop.time() if prazo else None
+            if restante is not None and restante <= 0:
+                raise asyncio.TimeoutError
+            linha = await asyncio.wait_for(proc.stdout.readline(), timeout=restante)
+            if not linha:  # EOF
+                break
+            linha = linha.decode(errors="ignore").strip()
+            if linha:
+                yield linha
+        restante = prazo - loop.time() if prazo else None
+        await asyncio.wait_for(proc.wait(), timeout=restante)
+        if alimentador is not None:
+            await alimentador  # propaga falhas do iterável de entrada
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+    except asyncio.TimeoutError:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    finally:
+        if alimentador is not None and not alimentador.done():
+            alimentador.cancel()
+        if proc.returncode is None:  # timeout, cancelamento ou consumidor desistiu
+            proc.kill()
+            await proc.wait()
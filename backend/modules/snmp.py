@@ -0,0 +1,201 @@
+# Sonda SNMP v2c nativa em asyncio. Todas as consultas do processo usam um
+# único socket UDP (``DatagramProtocol``); as respostas são entregues à
+# corrotina correta pelo request-id, sem thread ou loop extra por host.
+# Implementa apenas o necessário para um GET: codificação BER da mensagem
+# e leitura do PDU de resposta.
+
+import asyncio  # endpoint UDP e futures de resposta
+import os  # parâmetros via variáveis de ambiente
+import random  # request-id inicial imprevisível
+
+SNMP_TIMEOUT = float(os.getenv("SNMP_TIMEOUT", "2"))  # segundos por tentativa
+SNMP_RETRIES = int(os.getenv("SNMP_RETRIES", "1"))  # reenvios após o primeiro
+SNMP_MAX_PENDENTES = int(os.getenv("SNMP_MAX_PENDENTES", "2000"))  # consultas em voo
+
+OID_SYS_DESCR = "1.3.6.1.2.1.1.1.0"  # sysDescr
+
+_INTEGER = 0x02
+_OCTET_STRING = 0x04
+_NULL = 0x05
+_OID = 0x06
+_SEQUENCE = 0x30
+_GET_REQUEST = 0xA0
+_RESPONSE = 0xA2
+
+
+def _tlv(tipo: int, valor: bytes) -> bytes:
+    """Codifica tipo/tamanho/valor em BER (tamanho na forma longa se preciso)."""
+    n = len(valor)
+    if n < 0x80:
+        return bytes((tipo, n)) + valor
+    tamanho = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return bytes((tipo, 0x80 | len(tamanho))) + tamanho + valor
+
+
+def _inteiro(valor: int) -> bytes:
+    return _tlv(_INTEGER, valor.to_bytes(max(1, (valor.bit_length() + 8) // 8), "big", signed=True))
+
+
+def _oid(oid: str) -> bytes:
+    partes = [int(p) for p in oid.strip(".").split(".")]
+    corpo = bytearray((40 * partes[0] + partes[1],))
+    for p in partes[2:]:  # base 128, bit alto indica continuação
+        grupo = [p & 0x7F]
+        p >>= 7
+        while p:
+            grupo.append(0x80 | (p & 0x7F))
+            p >>= 7
+        corpo.extend(reversed(grupo))
+    return _tlv(_OID, bytes(corpo))
+
+
+def montar_get(request_id: int, comunidade: str, oid: str) -> bytes:
+    """Mensagem SNMP v2c GetRequest para um único OID."""
+    varbind = _tlv(_SEQUENCE, _oid(oid) + _tlv(_NULL, b""))
+    pdu = _tlv(
+        _GET_REQUEST,
+        _inteiro(request_id) + _inteiro(0) + _inteiro(0) + _tlv(_SEQUENCE, varbind),
+    )
+    return _tlv(_SEQUENCE, _inteiro(1) + _tlv(_OCTET_STRING, comunidade.encode()) + pdu)
+
+
+def _ler_tlv(dados: bytes, pos: int) -> tuple[int, bytes, int]:
+    """Lê um elemento BER a partir de ``pos``; retorna (tipo, valor, próxima posição)."""
+    tipo = dados[pos]
+    n = dados[pos + 1]
+    pos += 2
+    if n & 0x80:
+        qtd = n & 0x7F
+        n = int.from_bytes(dados[pos : pos + qtd], "big")
+        pos += qtd
+    if pos + n > len(dados):
+        raise ValueError("elemento BER truncado")
+    return tipo, dados[pos : pos + n], pos + n
+
+
+def ler_resposta(dados: bytes) -> tuple[int, int, int | None, bytes] | None:
+    """Extrai (request_id, error_status, tipo do valor, valor) de um
+    GetResponse. Retorna ``None`` se o datagrama não for uma resposta válida."""
+    try:
+        tipo, mensagem, _ = _ler_tlv(dados, 0)
+        if tipo != _SEQUENCE:
+            return None
+        _, _, pos = _ler_tlv(mensagem, 0)  # versão
+        _, _, pos = _ler_tlv(mensagem, pos)  # community
+        tipo, pdu, _ = _ler_tlv(mensagem, pos)
+        if tipo != _RESPONSE:
+            return None
+        _, request_id, pos = _ler_tlv(pdu, 0)
+        _, status, pos = _ler_tlv(pdu, pos)
+        _, _, pos = _ler_tlv(pdu, pos)  # error-index
+        _, varbinds, _ = _ler_tlv(pdu, pos)
+        tipo_valor, valor = None, b""
+        if varbinds:
+            _, varbind, _ = _ler_tlv(varbinds, 0)
+            _, _, pos = _ler_tlv(varbind, 0)  # OID
+            tipo_valor, valor, _ = _ler_tlv(varbind, pos)
+        return (
+            int.from_bytes(request_id, "big", signed=True),
+            int.from_bytes(status, "big", signed=True),
+            tipo_valor,
+            valor,
+        )
+    except (IndexError, ValueError):
+        return None
+
+
+class ClienteSNMP(asyncio.DatagramProtocol):
+    """Endpoint UDP compartilhado que multiplexa consultas pelo request-id."""
+
+    def __init__(self):
+        self._transporte: asyncio.DatagramTransport | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._abrindo: asyncio.Lock | None = None
+        self._pendentes: dict[int, tuple[asyncio.Future, str]] = {}  # request-id -> (futuro, ip)
+        self._proximo_id = random.randrange(1, 2**30)
+        self._limite: asyncio.Semaphore | None = None
+
+    # --- DatagramProtocol -------------------------------------------------
+    def datagram_received(self, dados: bytes, origem) -> None:
+        resposta = ler_resposta(dados)
+        if resposta is None:
+            return
+        pendente = self._pendentes.get(resposta[0])
+        if pendente is None or pendente[1] != origem[0]:  # resposta atrasada ou forjada
+            return
+        futuro = pendente[0]
+        if not futuro.done():
+            futuro.set_result(resposta[1:])
+
+    def error_received(self, exc: Exception) -> None:
+        pass  # ICMP port unreachable etc.: a consulta expira pelo timeout
+
+    def connection_lost(self, exc) -> None:
+        self._transporte = None
+
+    # --- API --------------------------------------------------------------
+    async def _garantir_endpoint(self) -> asyncio.DatagramTransport:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # novo loop (reinício, testes): recria o estado
+            self._loop = loop
+            self._transporte = None
+            self._abrindo = asyncio.Lock()
+            self._limite = asyncio.Semaphore(SNMP_MAX_PENDENTES)
+            self._pendentes.clear()
+        async with self._abrindo:
+            if self._transporte is None or self._transporte.is_closing():
+                self._transporte, _ = await loop.create_datagram_endpoint(
+                    lambda: self, local_addr=("0.0.0.0", 0)
+                )
+        return self._transporte
+
+    def _novo_id(self) -> int:
+        while True:
+            self._proximo_id = self._proximo_id % (2**31 - 1) + 1
+            if self._proximo_id not in self._pendentes:
+                return self._proximo_id
+
+    async def get(
+        self,
+        ip: str,
+        oid: str = OID_SYS_DESCR,
+        comunidade: str = "public",
+        porta: int = 161,
+        timeout: float = SNMP_TIMEOUT,
+        tentativas: int = SNMP_RETRIES,
+    ) -> tuple[int, int | None, bytes] | None:
+        """Envia um GET e retorna (error_status, tipo do valor, valor), ou
+        ``None`` se o host não responder após ``tentativas`` reenvios."""
+        transporte = await self._garantir_endpoint()
+        async with self._limite:
+            request_id = self._novo_id()
+            futuro = self._loop.create_future()
+            self._pendentes[request_id] = (futuro, ip)
+            mensagem = montar_get(request_id, comunidade, oid)
+            try:
+                for _ in range(tentativas + 1):
+                    transporte.sendto(mensagem, (ip, porta))
+                    try:
+                        return await asyncio.wait_for(asyncio.shield(futuro), timeout)
+                    except asyncio.TimeoutError:
+                        continue
+                return None
+            finally:
+                self._pendentes.pop(request_id, None)
+                futuro.cancel()
+
+    def fechar(self) -> None:
+        if self._transporte is not None:
+            self._transporte.close()
+            self._transporte = None
+
+
+CLIENTE_SNMP = ClienteSNMP()  # socket compartilhado por todos os scans do processo
+
+
+async def comunidade_aceita(ip: str, comunidade: str = "public", porta: int = 161) -> bool:
+    """``True`` se o agente responder ao GET do sysDescr com ``comunidade``.
+    Agentes descartam em silêncio pedidos com community incorreta, então
+    qualquer resposta sem erro indica acesso de leitura."""
+    resposta = await CLIENTE_SNMP.get(ip, OID_SYS_DESCR, comunidade, porta)
+    return resposta is not None and resposta[0] == 0
@@ -1,30 +1,139 @@
-import asyncio  # Biblioteca para operacoes assincronas
+import asyncio  # Leituras do cache em paralelo
+import os  # Validades configuráveis
 import subprocess  # Permite executar comandos externos
+import time  # Instante em que cada resultado foi obtido
+from modules.cache import gravar_compartilhado, ler_compartilhado  # Tabela cache_entries
+from modules.processo import stream_linhas  # Leitura do stdout linha a linha
+from parsers.parse_dnsx import parse_dnsx_registro  # Host e IPs de cada linha JSON do dnsx
+from parsers.parse_subfinder import parse_subfinder  # Subdominio de cada linha JSON
 
-async def _run(cmd: list[str], timeout: int | None = None):  # Executa comando assincronamente
-    proc = await asyncio.create_subprocess_exec(*cmd)  # Inicializa processo
-    try:  # Tenta executar o comando com tempo limite
-        await asyncio.wait_for(proc.communicate(), timeout=timeout)  # Aguarda termino
-    except asyncio.TimeoutError:  # Caso o comando demore demais
-        proc.kill()  # Encerra processo
-        await proc.communicate()  # Garante fechamento
-        raise subprocess.TimeoutExpired(cmd, timeout)  # Propaga timeout
-    except asyncio.CancelledError:  # Caso a tarefa seja cancelada
-        proc.kill()  # Encerra processo
-        await proc.communicate()  # Garante fechamento
-        raise  # Repassa excecao
-    if proc.returncode != 0:  # Se retorno diferente de zero
-        raise subprocess.CalledProcessError(proc.returncode, cmd)  # Erro de execucao
-
-async def run_subfinder(domain: str, subs_out: str, resolved_out: str, timeout: int = 300):  # Coleta subdominios
-    try:  # Protege execucao contra erros
-        print(f"[Subfinder] Coletando subdomínios de: {domain}")  # Informa inicio
-        await _run(["subfinder", "-d", domain, "-silent", "-o", subs_out], timeout)  # Executa subfinder
-
-        print("[DNSx] Resolvendo subdomínios para IPs")  # Mensagem de resolucao
-        await _run(["dnsx", "-l", subs_out, "-a", "-resp-only", "-o", resolved_out], timeout)  # Executa dnsx
-
-        print(f"[OK] Dados salvos em: {resolved_out}")  # Finalizacao
+SUBDOMAIN_CACHE_TTL = int(os.getenv("SUBDOMAIN_CACHE_TTL", "86400"))  # segundos, lista de subdomínios
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", "3600"))  # segundos, registros A resolvidos
+
+
+async def _ler_cache(domain: str) -> tuple[dict | None, dict | None]:
+    """Subdomínios e registros A guardados para ``domain`` (``None`` se expirados)."""
+    try:
+        subs, dns = await asyncio.gather(
+            ler_compartilhado("subdominios", [domain]), ler_compartilhado("dns_a", [domain])
+        )
+    except Exception as exc:  # cache indisponível não impede o scan
+        print(f"[ERRO] Falha ao ler cache DNS de {domain}: {exc}")
+        return None, None
+    return subs.get(domain), dns.get(domain)
+
+
+async def _gravar_cache(domain: str, subs: dict | None, dns: dict) -> None:
+    try:
+        if subs is not None:
+            await gravar_compartilhado("subdominios", {domain: subs}, SUBDOMAIN_CACHE_TTL)
+        await gravar_compartilhado("dns_a", {domain: dns}, DNS_CACHE_TTL)
+    except Exception as exc:
+        print(f"[ERRO] Falha ao gravar cache DNS de {domain}: {exc}")
+
+
+async def enumerar_ips(
+    domain: str,
+    contagem: dict | None = None,
+    timeout: int = 300,
+    cwd: str | None = None,
+    atualizar: bool = False,
+):  # Subdominios -> IPs em fluxo
+    """Encadeia subfinder e dnsx por pipes e gera cada IP novo assim que é resolvido.
+
+    As duas ferramentas usam saída JSON lines, interpretada em memória linha a
+    linha. ``contagem["subdominios"]`` acompanha quantos subdomínios já foram
+    enviados ao dnsx. Falhas das ferramentas são registradas e encerram a
+    enumeração com o que já foi produzido.
+
+    Subdomínios e registros A ficam guardados por domínio no PostgreSQL
+    (``SUBDOMAIN_CACHE_TTL`` / ``DNS_CACHE_TTL``): com registros válidos
+    nenhuma ferramenta roda; com apenas a lista de subdomínios válida, só o
+    dnsx. ``atualizar`` ignora o cache. ``contagem["subdominios_em"]`` e
+    ``contagem["resolucao_em"]`` recebem o instante (epoch) em que cada
+    resultado foi obtido.
+    """
+    if contagem is None:
+        contagem = {}
+    contagem["subdominios"] = 0
+    cache_subs, cache_dns = (None, None) if atualizar else await _ler_cache(domain)
+
+    vistos = set()  # um IP pode responder por vários subdomínios
+    if cache_dns is not None:  # resolução recente: dispensa subfinder e dnsx
+        contagem["subdominios"] = cache_dns["num_subdominios"]
+        contagem["subdominios_em"] = cache_dns["subdominios_em"]
+        contagem["resolucao_em"] = cache_dns["resolucao_em"]
+        print(f"[CACHE] Registros DNS de {domain} reaproveitados")
+        for ips in cache_dns["registros"].values():
+            for ip in ips:
+                if ip not in vistos:
+                    vistos.add(ip)
+                    yield ip
+        return
+
+    lista = []  # subdomínios enviados ao dnsx, para o cache
+    if cache_subs is not None:
+        print(f"[CACHE] Subdomínios de {domain} reaproveitados")
+        contagem["subdominios_em"] = cache_subs["subdominios_em"]
+    else:
+        contagem["subdominios_em"] = time.time()
+
+    enviados = set()
+
+    def novo(sub) -> bool:  # registra cada subdomínio uma única vez
+        if not sub or sub in enviados:
+            return False
+        enviados.add(sub)
+        lista.append(sub)
+        contagem["subdominios"] += 1
+        return True
+
+    async def subdominios():  # Saída do subfinder (ou o cache) alimenta o dnsx
+        if cache_subs is not None:
+            for sub in cache_subs["subdominios"]:
+                if novo(sub):
+                    yield sub
+            return
+        async for linha in stream_linhas(
+            ["subfinder", "-d", domain, "-silent", "-json"], timeout=timeout, cwd=cwd
+        ):
+            sub = parse_subfinder(linha)
+            if novo(sub):
+                yield sub
+
+    registros = {}  # subdomínio -> IPs
+    contagem["resolucao_em"] = time.time()
+    try:
+        if cache_subs is None:
+            print(f"[Subfinder] Coletando subdomínios de: {domain}")  # Informa inicio
+        print("[DNSx] Resolvendo subdomínios para IPs conforme chegam")
+        async for linha in stream_linhas(
+            ["dnsx", "-silent", "-a", "-json"], entrada=subdominios(), timeout=timeout, cwd=cwd
+        ):
+            registro = parse_dnsx_registro(linha)
+            if not registro:
+                continue
+            host, ips = registro
+            registros.setdefault(host, []).extend(ips)
+            for ip in ips:
+                if ip not in vistos:
+                    vistos.add(ip)
+                    yield ip
+        print(f"[OK] {contagem['subdominios']} subdomínios, {len(vistos)} IPs")  # Finalizacao
     except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:  # Captura falhas
         print(f"[ERRO] Falha ao executar subfinder ou dnsx: {e}")  # Exibe erro
-        
\ No newline at end of file
+        return  # resultado parcial não vai para o cache
+    if registros:  # enumeração vazia costuma ser falha transitória
+        await _gravar_cache(
+            domain,
+            None if cache_subs is not None else {
+                "subdominios": lista, "subdominios_em": contagem["subdominios_em"]
+            },
+            {
+                "registros": registros,
+                "num_subdominios": contagem["subdominios"],
+                "subdominios_em": contagem["subdominios_em"],
+                "resolucao_em": contagem["resolucao_em"],
+            },
+        )
+
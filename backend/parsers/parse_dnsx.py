@@ -1,16 +1,19 @@
-import aiofiles  # biblioteca para trabalhar com arquivos de forma assíncrona
+import json  # saída do dnsx em JSON lines (-json)
 
-async def parse_dnsx(filepath: str) -> list[str]:
-    """Lê o arquivo de saída do dnsx de forma assíncrona."""
-    ips_unicos = set()  # conjunto para garantir que cada IP apareça uma única vez
 
-    try:  # tenta ler o arquivo gerado pelo dnsx
-        async with aiofiles.open(filepath, "r") as f:  # abre o arquivo de forma assíncrona
-            async for line in f:  # percorre cada linha do arquivo
-                ip = line.strip()  # remove espaços e quebras de linha
-                if ip:  # somente processa se a linha não estiver vazia
-                    ips_unicos.add(ip)  # adiciona o IP ao conjunto
-    except FileNotFoundError:  # se o arquivo não existir
-        print(f"[ERRO] Arquivo {filepath} não encontrado.")  # informa erro ao usuário
+def parse_dnsx_registro(linha: str) -> tuple[str, list[str]] | None:
+    """Extrai ``(host, ips)`` (registros A) de uma linha JSON do dnsx."""
+    try:  # linhas que não são JSON (avisos, lixo) são ignoradas
+        registro = json.loads(linha)
+    except ValueError:
+        return None
+    if not isinstance(registro, dict):  # apenas objetos descrevem um host
+        return None
+    ips = [ip for ip in registro.get("a") or [] if ip]  # pode vir sem resolução
+    return registro.get("host") or "", ips
 
-    return list(ips_unicos)  # converte o conjunto para lista e devolve
+
+def parse_dnsx(linha: str) -> list[str]:
+    """Extrai os IPs (registros A) de uma linha JSON do dnsx."""
+    registro = parse_dnsx_registro(linha)
+    return registro[1] if registro else []
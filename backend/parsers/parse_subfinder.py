@@ -0,0 +1,12 @@
+import json  # saída do subfinder em JSON lines (-json)
+
+
+def parse_subfinder(linha: str) -> str | None:
+    """Extrai o subdomínio de uma linha JSON do subfinder."""
+    try:  # linhas que não são JSON são ignoradas
+        registro = json.loads(linha)
+    except ValueError:
+        return None
+    if not isinstance(registro, dict):
+        return None
+    return registro.get("host") or None  # subdomínio encontrado
@@ -0,0 +1,6 @@
+# Os módulos do backend são importados como no uvicorn (``from modules.x``),
+# a partir do diretório backend/.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
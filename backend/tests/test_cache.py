@@ -0,0 +1,31 @@
+import asyncio
+
+from modules import cache, cve_lookup
+
+
+class _SessaoQuebrada:
+    """Sessão cujo uso falha como uma conexão perdida com o PostgreSQL."""
+
+    async def __aenter__(self):
+        raise ConnectionError("conexão perdida")
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_cves_retornadas_mesmo_com_falha_ao_gravar_cache(monkeypatch):
+    cpe = "cpe:2.3:a:nginx:nginx:1.18.0:*:*:*:*:*:*:*"
+    cves = [{"id": "CVE-2021-23017", "cvss": 7.5}]
+
+    async def consultar_mongo(chaves):
+        return {chave: cves for chave in chaves}
+
+    monkeypatch.setattr(cache, "AsyncSessionLocal", _SessaoQuebrada)
+    monkeypatch.setattr(cve_lookup, "CACHE_BACKEND", "postgres")
+    monkeypatch.setattr(cve_lookup, "consultar_cves_em_lote", consultar_mongo)
+    cve_lookup.cve_cache.limpar()
+
+    resultado = asyncio.run(cve_lookup.consultar_cves_com_cache([cpe]))
+
+    assert resultado == {cpe: cves}
+    assert cve_lookup.cve_cache.get(cpe) == cves  # cache do processo continua valendo
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from modules import cve_lookup
+from modules.cpe_index import IndiceCPE, chave_versao, compilar_indice
+
+OPENSSL = "cpe:2.3:a:openssl:openssl:{}:*:*:*:*:*:*:*"
+
+
+@pytest.fixture
+def indice(tmp_path):
+    itens = "".join(
+        f'<cpe-item name="x"><title>OpenSSL {v}</title>'
+        f'<cpe-23:cpe23-item name="{OPENSSL.format(v)}"/></cpe-item>'
+        for v in ("1.0.2", "1.0.2a", "1.0.2b", "1.1.0")
+    )
+    xml = tmp_path / "cpe.xml"
+    xml.write_text(
+        '<?xml version="1.0"?><cpe-list xmlns="http://cpe.mitre.org/dictionary/2.0" '
+        f'xmlns:cpe-23="http://scap.nist.gov/schema/cpe-extension/2.3">{itens}</cpe-list>'
+    )
+    destino = str(tmp_path / "cpe-index.bin")
+    assert compilar_indice(str(xml), destino) == 4
+    return IndiceCPE(destino)
+
+
+def test_letra_de_patch_sucede_o_release():
+    assert chave_versao("1.0.2rc1") < chave_versao("1.0.2") < chave_versao("1.0.2a")
+
+
+def test_versao_entre_releases_usa_faixa(indice):
+    piso, teto = OPENSSL.format("1.0.2b"), OPENSSL.format("1.1.0")
+    assert indice.versoes_vizinhas("openssl", "1.0.2k", "openssl") == (piso, (piso, teto))
+
+
+def test_versao_mais_nova_que_o_catalogo_nao_herda_o_ultimo_release(indice):
+    cpe, faixa = indice.versoes_vizinhas("openssl", "3.0.7", "openssl")
+    assert cpe == OPENSSL.format("*")  # não 1.1.0: a versão nova pode corrigir suas CVEs
+    assert faixa is None
+
+
+class _ColecaoCves:
+    """Avalia o pipeline de ``consultar_cves_em_lote`` sobre documentos em memória."""
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    async def aggregate(self, pipeline):
+        cpes = pipeline[0]["$match"]["vulnerable_configuration"]["$in"]
+        for cpe in cpes:
+            cves = [
+                {"id": d["id"], "cvss": d["cvss"], "cvss3": None}
+                for d in self.documentos
+                if cpe in d["vulnerable_configuration"]
+            ]
+            if cves:
+                yield {"_id": cpe, "cves": cves}
+
+
+def test_cve_corrigida_no_teto_afeta_a_versao_intermediaria(monkeypatch):
+    piso, teto = OPENSSL.format("1.0.2b"), OPENSSL.format("1.1.0")
+    documentos = [
+        {"id": "CVE-CORRIGIDA-NO-TETO", "cvss": 7.5, "vulnerable_configuration": [piso]},
+        {"id": "CVE-AMBOS", "cvss": 5.0, "vulnerable_configuration": [piso, teto]},
+        {"id": "CVE-SO-TETO", "cvss": 9.8, "vulnerable_configuration": [teto]},
+    ]
+    monkeypatch.setattr(cve_lookup, "db", type("Db", (), {"cves": _ColecaoCves(documentos)}))
+
+    resultado = asyncio.run(cve_lookup.consultar_cves_em_lote([(piso, teto)]))
+
+    ids = {c["id"] for c in resultado[(piso, teto)]}
+    assert ids == {"CVE-CORRIGIDA-NO-TETO", "CVE-AMBOS"}
@@ -0,0 +1,36 @@
+import asyncio
+
+import main
+from modules.eventos import usar_canal
+from modules.job_manager import Job
+
+
+def test_historico_apos_tls_adiado_nao_repete_alertas(monkeypatch):
+    async def tls_adiado(portas_abertas):
+        return [("203.0.113.10", 443, "ROBOT")]
+
+    monkeypatch.setattr(main, "avaliar_tls_adiado", tls_adiado)
+
+    async def cenario():
+        job = Job("ana", None)
+        usar_canal(job.eventos)
+        job.dados.update(
+            {
+                "dominio": "exemplo.com",
+                "software_alertas": [],
+                "port_alertas": [{"ip": "203.0.113.10", "porta": 80, "mensagem": "HTTP"}],
+                "tls_adiado": "pendente",
+            }
+        )
+        job.eventos.publicar("resultado", main.montar_resultado(job.dados))
+        softwares = asyncio.get_running_loop().create_future()
+        softwares.set_exception(RuntimeError("sem relatório"))  # não grava em reports
+        await main.processar_tls_adiado(job, "exemplo.com", {}, 1, softwares)
+        job.eventos.fechar()
+        return [evento async for evento in job.eventos.assinar(desde=0)]
+
+    eventos = asyncio.run(cenario())
+
+    por_tipo = {tipo: dados for _, tipo, dados in eventos}
+    assert [a["porta"] for a in por_tipo["resultado"]["port_alertas"]] == [80]
+    assert [a["mensagem"] for a in por_tipo["tls_adiado"]["alertas"]] == ["ROBOT"]
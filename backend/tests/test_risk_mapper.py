@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from intelligence import risk_mapper
+from intelligence.probe import Captura
+
+
+def _https(status: int, cabecalhos: dict) -> Captura:
+    captura = Captura("203.0.113.10", 443)
+    captura.conectou = True
+    captura.status = status
+    captura.cabecalhos = cabecalhos
+    return captura
+
+
+def _alertas_443(monkeypatch, captura: Captura) -> list[str]:
+    async def scan_tls(ip, perfil, impressao=None):
+        return [risk_mapper.ALERTA_SEM_HSTS]  # como em alertas cacheados antes da sonda
+
+    monkeypatch.setattr(risk_mapper, "scan_tls", scan_tls)
+
+    async def analisar():
+        risk_mapper._softwares_detectados.set([])
+        return await risk_mapper.analisar_ip(captura.ip, [443], capturas={443: captura})
+
+    return [msg for _, _, msg in asyncio.run(analisar())]
+
+
+@pytest.mark.parametrize("status", [301, 302, 307, 308])
+def test_redirecionamento_https_nao_gera_alerta_de_hsts(monkeypatch, status):
+    captura = _https(status, {"location": "https://www.exemplo.com/"})
+    assert risk_mapper.ALERTA_SEM_HSTS not in _alertas_443(monkeypatch, captura)
+
+
+def test_resposta_final_sem_hsts_gera_alerta(monkeypatch):
+    captura = _https(200, {"server": "nginx"})
+    assert _alertas_443(monkeypatch, captura).count(risk_mapper.ALERTA_SEM_HSTS) == 1
+
+
+def test_resposta_final_com_hsts_nao_gera_alerta(monkeypatch):
+    captura = _https(200, {"strict-transport-security": "max-age=31536000"})
+    assert risk_mapper.ALERTA_SEM_HSTS not in _alertas_443(monkeypatch, captura)
@@ -29,6 +29,10 @@ export default function EmailForm() {
   const [telefone, setTelefone] = useState('');
   const [mensagem, setMensagem] = useState('');
   const [performLeak, setPerformLeak] = useState(true);
+  const [incremental, setIncremental] = useState(false);
+  const [refreshDns, setRefreshDns] = useState(false);
+  const [refreshLeaks, setRefreshLeaks] = useState(false);
+  const [leaksAt, setLeaksAt] = useState(null);
   const jobRef = useRef(null);
   const abortRef = useRef(null);
   const token = getCookie('userToken');
@@ -43,6 +47,7 @@ export default function EmailForm() {
     setNumEmails(rep.num_emails ?? 0);
     setNumPasswords(rep.num_passwords ?? 0);
     setNumHashes(rep.num_hashes ?? 0);
+    setLeaksAt(rep.vazamentos_em ?? null);
     setPortScore(rep.port_score || 0);
     setSoftScore(rep.software_score || 0);
     setLeakScore(rep.leak_score || 0);
@@ -84,6 +89,7 @@ export default function EmailForm() {
     setNumEmails(0);
     setNumPasswords(0);
     setNumHashes(0);
+    setLeaksAt(null);
     setPortScore(0);
     setSoftScore(0);
     setLeakScore(0);
@@ -92,31 +98,33 @@ export default function EmailForm() {
     jobRef.current = null;
 
     try {
-      const res = await fetch('/api/port-analysis', {
+      const res = await fetch('/api/jobs', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
           Authorization: `Bearer ${token}`,
         },
-        body: JSON.stringify({ alvo, leak_analysis: performLeak }),
+        body: JSON.stringify({
+          alvo,
+          leak_analysis: performLeak,
+          incremental,
+          refresh_dns: refreshDns,
+          refresh_leaks: refreshLeaks,
+        }),
         signal: abortRef.current.signal
       });
 
       const data = await res.json();
-      if (data.erro) {
-        alert(`Erro: ${data.erro}`);
+      if (!res.ok) {
+        alert(`Erro: ${data.detail || 'Entrada inválida.'}`);
         setLoadingPort(false);
         setLoadingSoft(false);
+        setLoadingLeak(false);
         return;
       }
       setDominio(data.dominio || '');
-      setNumSubs(data.num_subdominios || 0);
-      setNumIps(data.num_ips || 0);
-      setPortAlerts(data.alertas || []);
-      setPortScore(data.port_score || 0);
-      setLoadingPort(false);
-    jobRef.current = data.job_id;
-    pollSoftware(data.job_id);
+      jobRef.current = data.job_id;
+      streamEvents(data.job_id, abortRef.current.signal);
     } catch (err) {
       if (err.name !== 'AbortError') alert('Erro ao conectar ao backend');
       setLoadingPort(false);
@@ -125,6 +133,115 @@ export default function EmailForm() {
     }
   };
 
+  const stopLoading = () => {
+    setLoadingPort(false);
+    setLoadingSoft(false);
+    setLoadingLeak(false);
+    jobRef.current = null;
+  };
+
+  const applyResult = (data) => {
+    setDominio(data.dominio || dominio);
+    setNumSubs(data.num_subdominios || numSubs);
+    setNumIps(data.num_ips || numIps);
+    if (data.port_alertas) setPortAlerts(data.port_alertas);
+    if (data.port_score) setPortScore(data.port_score);
+    setSoftAlerts(data.alertas);
+    setSoftScore(data.software_score || 0);
+    setLeakScore(data.leak_score || leakScore);
+    setNumEmails(data.num_emails ?? numEmails);
+    setNumPasswords(data.num_passwords ?? numPasswords);
+    setNumHashes(data.num_hashes ?? numHashes);
+    if (data.vazamentos) setLeaksAt(data.vazamentos.consultado_em);
+    setFinalScore(data.final_score ?? null);
+    setLoadingPort(false);
+    setLoadingSoft(false);
+    setLoadingLeak(false);
+  };
+
+  const handleEvent = (id, tipo, data) => {
+    if (jobRef.current !== id) return;
+    switch (tipo) {
+      case 'progresso':
+        setNumSubs(data.subdominios);
+        setNumIps(data.ips);
+        break;
+      case 'alertas_porta':
+        setPortAlerts((prev) => [...prev, ...data.alertas]);
+        break;
+      case 'score':
+        setPortScore(data.port_score || 0);
+        if (!data.parcial) {
+          setSoftScore(data.software_score || 0);
+          setLeakScore(data.leak_score || 0);
+          setFinalScore(data.final_score ?? null);
+        }
+        break;
+      case 'portas':
+        setDominio(data.dominio || '');
+        setNumSubs(data.num_subdominios || 0);
+        setNumIps(data.num_ips || 0);
+        setPortAlerts(data.alertas || []);
+        setPortScore(data.port_score || 0);
+        setLoadingPort(false);
+        break;
+      case 'alertas_cve':
+        setSoftAlerts((prev) =>
+          [...prev, ...data.alertas].sort((a, b) => (b.cvss || 0) - (a.cvss || 0))
+        );
+        break;
+      case 'resultado':
+        applyResult(data);
+        break;
+      case 'tls_adiado':
+        setPortAlerts((prev) => [...prev, ...(data.alertas || [])]);
+        break;
+      case 'estado':
+        if (data.estado === 'erro') alert(`Erro: ${data.erro || 'Falha na análise.'}`);
+        if (data.estado === 'erro' || data.estado === 'cancelado') stopLoading();
+        break;
+      case 'fim':
+        stopLoading();
+        break;
+      default:
+        break;
+    }
+  };
+
+  // Acompanha o job pelo stream de eventos; se a conexão falhar, volta a consultar periodicamente
+  const streamEvents = async (id, signal) => {
+    try {
+      const res = await fetch(`/api/jobs/${id}/eventos`, {
+        headers: { Authorization: `Bearer ${token}` },
+        signal,
+      });
+      if (!res.ok || !res.body) throw new Error('stream indisponível');
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let fim;
+        while ((fim = buffer.indexOf('\n\n')) !== -1) {
+          const bloco = buffer.slice(0, fim);
+          buffer = buffer.slice(fim + 2);
+          let tipo = 'message';
+          let dados = '';
+          for (const linha of bloco.split('\n')) {
+            if (linha.startsWith('event: ')) tipo = linha.slice(7);
+            else if (linha.startsWith('data: ')) dados += linha.slice(6);
+          }
+          if (dados) handleEvent(id, tipo, JSON.parse(dados));
+        }
+      }
+      if (jobRef.current === id) pollSoftware(id); // stream encerrado antes do fim
+    } catch (err) {
+      if (err.name !== 'AbortError') pollSoftware(id);
+    }
+  };
+
   const pollSoftware = async (id) => {
     if (!id || jobRef.current !== id) return;
     try {
@@ -133,19 +250,10 @@ export default function EmailForm() {
       });
       const data = await res.json();
       if (data.alertas) {
-        setDominio(data.dominio || dominio);
-        setNumSubs(data.num_subdominios || numSubs);
-        setNumIps(data.num_ips || numIps);
-        setSoftAlerts(data.alertas);
-        setSoftScore(data.software_score || 0);
-        setLeakScore(data.leak_score || leakScore);
-        setNumEmails(data.num_emails ?? numEmails);
-        setNumPasswords(data.num_passwords ?? numPasswords);
-        setNumHashes(data.num_hashes ?? numHashes);
-        setFinalScore(data.final_score ?? null);
-        setLoadingSoft(false);
-        setLoadingLeak(false);
+        applyResult(data);
         jobRef.current = null;
+      } else if (data.erro) {
+        stopLoading();
       } else {
         setTimeout(() => pollSoftware(id), 2000);
       }
@@ -282,6 +390,48 @@ export default function EmailForm() {
               />
             </button>
           </div>
+          <div className="flex items-center gap-2">
+            <span className="text-sm">Incremental</span>
+            <button
+              type="button"
+              role="switch"
+              aria-checked={incremental}
+              onClick={() => setIncremental(!incremental)}
+              className={`${incremental ? 'bg-green-600' : 'bg-gray-600'} relative inline-flex h-6 w-11 items-center rounded-full transition-colors focus:outline-none`}
+            >
+              <span
+                className={`${incremental ? 'translate-x-6' : 'translate-x-1'} inline-block h-4 w-4 transform rounded-full bg-white transition-transform`}
+              />
+            </button>
+          </div>
+          <div className="flex items-center gap-2">
+            <span className="text-sm">Atualizar DNS</span>
+            <button
+              type="button"
+              role="switch"
+              aria-checked={refreshDns}
+              onClick={() => setRefreshDns(!refreshDns)}
+              className={`${refreshDns ? 'bg-green-600' : 'bg-gray-600'} relative inline-flex h-6 w-11 items-center rounded-full transition-colors focus:outline-none`}
+            >
+              <span
+                className={`${refreshDns ? 'translate-x-6' : 'translate-x-1'} inline-block h-4 w-4 transform rounded-full bg-white transition-transform`}
+              />
+            </button>
+          </div>
+          <div className="flex items-center gap-2">
+            <span className="text-sm">Atualizar vazamentos</span>
+            <button
+              type="button"
+              role="switch"
+              aria-checked={refreshLeaks}
+              onClick={() => setRefreshLeaks(!refreshLeaks)}
+              className={`${refreshLeaks ? 'bg-green-600' : 'bg-gray-600'} relative inline-flex h-6 w-11 items-center rounded-full transition-colors focus:outline-none`}
+            >
+              <span
+                className={`${refreshLeaks ? 'translate-x-6' : 'translate-x-1'} inline-block h-4 w-4 transform rounded-full bg-white transition-transform`}
+              />
+            </button>
+          </div>
         </div>
       </form>
 
@@ -382,9 +532,16 @@ export default function EmailForm() {
                   ))}
                 </ul>
               ) : selectedDetail === 'leak' && performLeak ? (
-                <p className="text-sm">
-                  Encontramos {numEmails} vazamentos de emails em seu dominio, destes {numPasswords} vazaram com a senha em plain text e {numHashes} vazaram com a senha em hash
-                </p>
+                <>
+                  <p className="text-sm">
+                    Encontramos {numEmails} vazamentos de emails em seu dominio, destes {numPasswords} vazaram com a senha em plain text e {numHashes} vazaram com a senha em hash
+                  </p>
+                  {leaksAt && (
+                    <p className="text-xs text-gray-400 mt-1">
+                      Consulta de {new Date(leaksAt + 'Z').toLocaleString()}
+                    </p>
+                  )}
+                </>
               ) : (
                 <p className="text-sm italic text-gray-400">Nenhum alerta encontrado.</p>
               )}
@@ -7,6 +7,21 @@ import { getCookie } from 'cookies-next';
 function ReportCard({ dominio, timestamp, usuario, onDelete }) {
   const [open, setOpen] = useState(false);
   const [info, setInfo] = useState(null);
+  const [leaks, setLeaks] = useState([]);
+  const [leaksTotal, setLeaksTotal] = useState(0);
+  const [nextLeak, setNextLeak] = useState(null);
+
+  const loadLeaks = async (apos = 0) => {
+    const res = await fetch(`/api/reports/${dominio}/leaks?apos=${apos}&limite=100`, {
+      headers: { Authorization: `Bearer ${getCookie('userToken')}` },
+    });
+    if (res.ok) {
+      const data = await res.json();
+      setLeaks((prev) => (apos ? [...prev, ...data.itens] : data.itens));
+      setLeaksTotal(data.total);
+      setNextLeak(data.proximo);
+    }
+  };
 
   const toggle = async () => {
     if (!open && !info) {
@@ -16,6 +31,7 @@ function ReportCard({ dominio, timestamp, usuario, onDelete }) {
       if (res.ok) {
         const data = await res.json();
         setInfo(data);
+        loadLeaks();
       }
     }
     setOpen(!open);
@@ -100,9 +116,9 @@ function ReportCard({ dominio, timestamp, usuario, onDelete }) {
               <p className="text-gray-400 text-xs">Nenhum alerta.</p>
             )}
           </div>
-          {info.leaked_data && info.leaked_data.length > 0 && (
+          {leaks.length > 0 && (
             <div className="mt-2">
-              <p className="font-semibold mb-1">Dados Vazados:</p>
+              <p className="font-semibold mb-1">Dados Vazados ({leaks.length} de {leaksTotal}):</p>
               <table className="w-full table-fixed text-xs border-collapse">
                 <thead>
                   <tr>
@@ -112,7 +128,7 @@ function ReportCard({ dominio, timestamp, usuario, onDelete }) {
                   </tr>
                 </thead>
                 <tbody>
-                  {info.leaked_data.map((row, idx) => (
+                  {leaks.map((row, idx) => (
                     <tr key={idx}>
                       <td className="border px-2 w-2/8 break-all">{row.email}</td>
                       <td className="border px-2 w-1/8 break-all">{row.password}</td>
@@ -121,6 +137,14 @@ function ReportCard({ dominio, timestamp, usuario, onDelete }) {
                   ))}
                 </tbody>
               </table>
+              {nextLeak && (
+                <button
+                  onClick={() => loadLeaks(nextLeak)}
+                  className="bg-gray-700 hover:bg-gray-600 text-white px-2 py-1 rounded mt-2"
+                >
+                  Carregar mais
+                </button>
+              )}
             </div>
           )}
         </div>
@@ -131,8 +155,23 @@ function ReportCard({ dominio, timestamp, usuario, onDelete }) {
 
 export default function RelatoriosPage() {
   const [reports, setReports] = useState([]);
+  const [cursor, setCursor] = useState(null);
+  const [usuario, setUsuario] = useState('');
   const router = useRouter();
 
+  const fetchReports = async (proximo = null) => {
+    const params = new URLSearchParams({ limite: '50' });
+    if (proximo) params.set('cursor', proximo);
+    if (usuario) params.set('usuario', usuario);
+    const res = await fetch(`/api/reports?${params}`, {
+      headers: { Authorization: `Bearer ${getCookie('userToken')}` },
+    });
+    if (!res.ok) return;
+    const data = await res.json();
+    setReports((prev) => (proximo ? [...prev, ...data.itens] : data.itens));
+    setCursor(data.proximo);
+  };
+
   const handleDelete = async (dom) => {
     if (!confirm(`Excluir relatorio de ${dom}?`)) return;
     const res = await fetch(`/api/reports/${dom}`, {
@@ -147,14 +186,6 @@ export default function RelatoriosPage() {
   };
 
   useEffect(() => {
-    const fetchReports = async () => {
-      const res = await fetch('/api/reports/summary', {
-        headers: { Authorization: `Bearer ${getCookie('userToken')}` },
-      });
-      const data = await res.json();
-      data.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-      setReports(data);
-    };
     fetchReports();
   }, []);
 
@@ -165,6 +196,23 @@ export default function RelatoriosPage() {
       <button onClick={() => router.push('/admin')} className="bg-gray-700 px-3 py-1 rounded hover:bg-gray-600">
         Voltar
       </button>
+      <form
+        onSubmit={(e) => {
+          e.preventDefault();
+          fetchReports();
+        }}
+        className="flex gap-2"
+      >
+        <input
+          value={usuario}
+          onChange={(e) => setUsuario(e.target.value)}
+          placeholder="Filtrar por usuário"
+          className="bg-[#1a1a1a] px-2 py-1 rounded text-sm"
+        />
+        <button type="submit" className="bg-gray-700 px-3 py-1 rounded hover:bg-gray-600">
+          Filtrar
+        </button>
+      </form>
       <div className="w-full max-w-5xl flex flex-col gap-4">
         {reports.length === 0 && <p className="text-center">Nenhum relatório disponível.</p>}
         {reports.map((r) => (
@@ -176,6 +224,14 @@ export default function RelatoriosPage() {
             onDelete={handleDelete}
           />
         ))}
+        {cursor && (
+          <button
+            onClick={() => fetchReports(cursor)}
+            className="bg-gray-700 px-3 py-1 rounded hover:bg-gray-600 self-center"
+          >
+            Carregar mais
+          </button>
+        )}
       </div>
     </main>
   );
@@ -4,7 +4,9 @@ set -e
 # Update CVE database if possible
 if [ -d "cve-db/cve-search" ]; then
     echo "Updating CVE database..."
-    cve-db/cve-search/sbin/db_updater.py -f -c || echo "CVE update failed"
+    # The stamp invalidates the CVE result caches (see modules/cve_lookup.py)
+    cve-db/cve-search/sbin/db_updater.py -f -c && date +%s > cve-db/.last_update \
+        || echo "CVE update failed"
 fi
 
 # Download CPE dictionary if missing
@@ -18,4 +20,12 @@ if [ ! -f "$CPE_FILE" ]; then
     cd ..
 fi
 
+# Compile the CPE dictionary into the memory-mapped index used by the workers
+# (rebuilt when missing, older than the XML or written in an older format)
+CPE_INDEX="CPE/cpe-index.bin"
+if ! python -m modules.cpe_index --verificar "$CPE_FILE" "$CPE_INDEX"; then
+    echo "Compiling CPE index..."
+    python -m modules.cpe_index "$CPE_FILE" "$CPE_INDEX" || echo "CPE index build failed"
+fi
+
 exec uvicorn api:app --host 0.0.0.0 --port 8000
\ No newline at end of file